@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+###############################################################################
+# Name: bench_generator.py                                                    #
+# Purpose: Benchmark the document generators on the syntax test samples      #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2009 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Generator Benchmark
+
+Loads each of the files in tests/syntax into a buffer and times the extraction
+of the styled text using the bulk style run extractor against a position by
+position walk of the buffer, as well as the time for each of the Html, LaTeX
+and Rtf generators to produce their documents.
+
+usage: bench_generator.py [repeat]
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id: $"
+__revision__ = "$Revision: $"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+import time
+import wx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from src import ed_glob
+from src import ed_basestc
+from src import generator
+from src import plugin
+
+#-----------------------------------------------------------------------------#
+
+def WalkStyles(stc):
+    """Position by position style walk that the generators used to do
+    @param stc: EditraBaseStc
+    @return: list of (style id, text) runs
+
+    """
+    runs = list()
+    start = 0
+    last = stc.GetLength()
+    last_id = stc.GetStyleAt(0)
+    for pos in range(1, last + 1):
+        curr_id = stc.GetStyleAt(pos)
+        if curr_id != last_id or pos == last:
+            runs.append((last_id, stc.GetTextRange(start, pos)))
+            start = pos
+            last_id = curr_id
+    return runs
+
+def TimeIt(func, *args, **kwargs):
+    """Time a call
+    @param func: callable
+    @return: seconds taken
+
+    """
+    start = time.time()
+    func(*args, **kwargs)
+    return time.time() - start
+
+def RunBenchmark(repeat=1):
+    """Run the benchmark on all the syntax samples and print the results
+    @keyword repeat: number of times to repeat the sample text in the buffer
+
+    """
+    ed_glob.CONFIG['STYLES_DIR'] = os.path.join(ROOT, 'styles')
+    frame = wx.Frame(None)
+    stc = ed_basestc.EditraBaseStc(frame)
+    pmgr = plugin.PluginManager()
+    gens = (('html', generator.Html(pmgr)),
+            ('tex', generator.LaTeX(pmgr)),
+            ('rtf', generator.Rtf(pmgr)))
+
+    sdir = os.path.join(ROOT, 'tests', 'syntax')
+    totals = dict()
+    print("%-30s %8s %8s %8s %8s %8s %8s" % \
+          ("file", "chars", "walk", "runs", "html", "tex", "rtf"))
+    for fname in sorted(os.listdir(sdir)):
+        path = os.path.join(sdir, fname)
+        if not os.path.isfile(path):
+            continue
+
+        if not stc.LoadFile(path):
+            continue
+        if repeat > 1:
+            stc.SetText(stc.GetText() * repeat)
+        stc.FindLexer()
+        stc.Colourise(0, -1)
+
+        times = [TimeIt(WalkStyles, stc),
+                 TimeIt(lambda: list(generator.IterStyleRuns(stc)))]
+        for name, gen in gens:
+            times.append(TimeIt(gen.Generate, stc))
+
+        for idx, val in enumerate(times):
+            totals[idx] = totals.get(idx, 0) + val
+        print("%-30s %8d %8.4f %8.4f %8.4f %8.4f %8.4f" % \
+              tuple([fname, stc.GetLength()] + times))
+
+    print("%-30s %8s %8.4f %8.4f %8.4f %8.4f %8.4f" % \
+          tuple(["total", ""] + [totals.get(idx, 0) for idx in range(5)]))
+    frame.Destroy()
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    APP = wx.App(False)
+    RunBenchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+###############################################################################
+# Name: bench_vim.py                                                          #
+# Purpose: Benchmark keystroke replay through the vi emulation               #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2009 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Vi Emulation Benchmark
+
+Replays sequences of normal mode keystrokes through the vi key handler on a
+large buffer and reports the time taken and the number of calls that were
+made on the text control for each of them.
+
+usage: bench_vim.py [lines]
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id: $"
+__revision__ = "$Revision: $"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+import time
+import wx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from src import ed_glob
+from src import ed_keyh
+from src import ed_stc
+
+#-----------------------------------------------------------------------------#
+
+# Keystroke sequences to replay, each is run from the start of the buffer
+SEQUENCES = ("1000j", "1000k", "G", "gg", "50w", "20}",
+             "1000dd", "u", "500yy", "10p", "u", "200x", "5.", "u",
+             "3d1000j", "u", "100~", "u", "50J", "u")
+
+class CountingProxy(object):
+    """Wraps the text control and counts the calls made on it"""
+    def __init__(self, stc):
+        super(CountingProxy, self).__init__()
+        self._stc = stc
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._stc, name)
+        if not callable(attr):
+            return attr
+
+        def Counted(*args, **kwargs):
+            self.calls += 1
+            return attr(*args, **kwargs)
+        return Counted
+
+def Replay(handler, keys):
+    """Replay a sequence of keystrokes in the handler
+    @param handler: ViKeyHandler
+    @param keys: string
+
+    """
+    for key in keys:
+        handler.ProcessKey(ord(key))
+
+def RunBenchmark(lines=20000):
+    """Replay each of the sequences and print the results
+    @keyword lines: number of lines in the buffer
+
+    """
+    ed_glob.CONFIG['STYLES_DIR'] = os.path.join(ROOT, 'styles')
+    frame = wx.Frame(None)
+    stc = ed_stc.EditraStc(frame)
+    stc.SetText("".join([ "line %d of the vi benchmark\n" % num
+                          for num in range(lines) ]))
+    handler = ed_keyh.ViKeyHandler(stc, use_normal_default=True)
+    proxy = CountingProxy(stc)
+    handler.stc = proxy
+    handler.commander.stc = proxy
+
+    print("%-12s %10s %10s %8s" % ("keys", "seconds", "stc calls", "line"))
+    for keys in SEQUENCES:
+        stc.GotoPos(0)
+        proxy.calls = 0
+        start = time.time()
+        Replay(handler, keys)
+        print("%-12s %10.4f %10d %8d" % (keys, time.time() - start,
+                                         proxy.calls, stc.GetCurrentLine()))
+    frame.Destroy()
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    APP = wx.App(False)
+    RunBenchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -70,6 +70,7 @@ from . import updater
 from . import plugin
 from . import ed_ipc
 from . import ed_session
+from . import ed_export
 from . import ebmlib
 from .syntax import synglob
 
@@ -1005,6 +1006,14 @@ def PrintHelp(err=None):
             '  --auth            Print the ipc server info\n'
             '  --version         Print version number and exit\n'
             '  --profileOut arg  Run Editra in the profiler (arg is output file)\n'
+            '\nBatch Export:\n'
+            '  usage: Editra --export fmt [options] [files/directories... ]\n'
+            '  --export fmt      Export files to html, tex or rtf and exit\n'
+            '  --output dir      Output directory (default current directory)\n'
+            '  --style name      Style sheet to use (default current style)\n'
+            '  --jobs num        Number of processes (default one per cpu)\n'
+            '  --all             Include files without a known file type\n'
+            '  --no-cache        Do not use or update the export cache\n'
             ) % ed_glob.VERSION))
 
     if err is None:
@@ -1022,7 +1031,9 @@ def ProcessCommandLine():
     try:
         items, args = getopt.getopt(sys.argv[1:], 'dg:hp:vDSc:',
                                     ['debug', 'help', 'version', 'auth',
-                                     'confdir=', 'profileOut='])
+                                     'confdir=', 'profileOut=', 'export=',
+                                     'output=', 'style=', 'jobs=', 'all',
+                                     'no-cache'])
     except getopt.GetoptError as msg:
         # Raise error to console and exit
         PrintHelp(str(msg))
@@ -1059,6 +1070,9 @@ def ProcessCommandLine():
             # Validate argument passed to -g
             if not value.isdigit():
                 PrintHelp('error: -g requires a number as an argument!')
+        elif opt == '--export':
+            if value.lower() not in ed_export.EXPORT_FORMATS:
+                PrintHelp('error: unknown export format %s' % value)
         else:
             pass
 
@@ -1075,6 +1089,9 @@ def Main():
     """
     opts, args = ProcessCommandLine()
 
+    if '--export' in opts:
+        _Export(opts, args)
+
     if '-p' in opts:
         p_file = opts['-p']
         opts.pop('-p')
@@ -1091,6 +1108,23 @@ def Main():
         _Main(opts, args)
 
 
+def _Export(opts, args):
+    """
+    Run a batch export of the given files and exit without starting the
+    editor.
+    @param opts: Commandline options
+    @param args: Commandline arguments
+    """
+    export_app = ed_export.ExportApp(False)
+    InitConfig()
+    rval = ed_export.Main(opts, args)
+    export_app.Destroy()
+    # os._exit does not flush the buffered report output
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(rval)
+
+
 def _Main(opts, args):
     """
     Main method
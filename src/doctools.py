@@ -18,6 +18,8 @@ __revision__ = '$Revision: 70230 $'
 # Imports
 import os
 import sys
+import threading
+from collections import OrderedDict
 
 # Editra Libraries
 from . import util
@@ -33,9 +35,17 @@ class DocPositionMgr(object):
     documents positions between sessions. Through the use of an in memory
     dictionary during run time and on disk dictionary to use when starting
     and stopping the editor.
+
+    The on disk book is an append only log of file=pos records that is read
+    the first time a position is needed. New records are appended as they
+    are added and the log is compacted when it has grown to more than twice
+    the number of live records. The number of records is limited to
+    MAX_RECORDS with the least recently used ones being dropped, and the
+    existence of the recorded files is checked on a background thread.
     @note: saves config to ~/.Editra/cache/
     """
     _poscache = ebmlib.HistoryCache(100)
+    MAX_RECORDS = 5000
 
     def __init__(self):
         """
@@ -46,17 +56,58 @@ class DocPositionMgr(object):
         # Attributes
         self._init = False
         self._book = None
-        self._records = dict()
+        self._loaded = True     # Book is loaded (or there is none to load)
+        self._dirty = False     # Log holds records that have been dropped
+        self._loglen = 0        # Number of records in the on disk log
+        self._lock = threading.RLock()
+        self._records = OrderedDict()
 
     def InitPositionCache(self, book_path):
         """
-        Initialize and load the on disk document position cache.
+        Initialize the on disk document position cache. The book is loaded
+        the first time that it is needed.
         @param book_path: path to on disk cache
         """
         self._init = True
         self._book = book_path
-        if Profile_Get('SAVE_POS'):
-            self.LoadBook(book_path)
+        self._loaded = not Profile_Get('SAVE_POS')
+
+    def _EnsureLoaded(self):
+        """Load the book if it has not been loaded yet"""
+        if not self._loaded:
+            self._loaded = True
+            if self.LoadBook(self._book):
+                threading.Thread(target=self._ValidateRecords,
+                                 name='DocPositionValidator',
+                                 daemon=True).start()
+
+    def _Touch(self, fname, pos):
+        """Set a record and mark it as the most recently used one
+        @param fname: file path
+        @param pos: cursor position
+
+        """
+        with self._lock:
+            self._records[fname] = pos
+            self._records.move_to_end(fname)
+            while len(self._records) > DocPositionMgr.MAX_RECORDS:
+                self._records.popitem(last=False)
+                self._dirty = True
+
+    def _ValidateRecords(self):
+        """Drop the records of files that no longer exist. Run on a
+        background thread as the checks may block on unavailable mounts.
+
+        """
+        with self._lock:
+            paths = list(self._records.keys())
+
+        for path in paths:
+            if not os.path.exists(path):
+                with self._lock:
+                    if path in self._records:
+                        del self._records[path]
+                        self._dirty = True
 
     @classmethod
     def AddNaviPosition(cls, fname, pos):
@@ -80,11 +131,30 @@ class DocPositionMgr(object):
         @param vals: (file path, cursor position)
         """
         if len(vals) == 2:
-            self._records[vals[0]] = vals[1]
+            self._EnsureLoaded()
+            self._Touch(vals[0], vals[1])
+            self._AppendRecord(vals[0], vals[1])
             return True
         else:
             return False
 
+    def _AppendRecord(self, fname, pos):
+        """Append a record to the on disk log
+        @param fname: file path
+        @param pos: cursor position
+
+        """
+        if not self._init or not Profile_Get('SAVE_POS'):
+            return
+
+        try:
+            with open(self._book, 'a', encoding=sys.getfilesystemencoding(),
+                      errors='surrogateescape') as writer:
+                writer.write('%s=%d\n' % (fname, pos))
+            self._loglen += 1
+        except (IOError, OSError, UnicodeError) as msg:
+            util.Log('[docpositionmgr][err] %s' % str(msg))
+
     @classmethod
     def CanNavigateNext(cls):
         """
@@ -156,7 +226,13 @@ class DocPositionMgr(object):
         @param name: file name
         @return: position value for the given filename
         """
-        return self._records.get(name, 0)
+        self._EnsureLoaded()
+        with self._lock:
+            pos = self._records.get(name, None)
+            if pos is None:
+                return 0
+            self._records.move_to_end(name)
+            return pos
 
     def IsInitialized(self):
         """
@@ -169,7 +245,7 @@ class DocPositionMgr(object):
         """
         Loads a set of records from an on disk dictionary
         the entries are formated as key=value with one entry
-        per line in the file.
+        per line in the file. Later entries replace earlier ones.
         @param book: path to saved file
         @return: whether book was loaded or not
         """
@@ -185,33 +261,30 @@ class DocPositionMgr(object):
                 util.Log('[docpositionmgr][err] Failed to create: %s' % book)
                 return False
 
-        reader = util.GetFileReader(book, sys.getfilesystemencoding())
-        if reader != -1:
-            lines = list()
-            try:
+        try:
+            with open(book, 'r', encoding=sys.getfilesystemencoding(),
+                      errors='surrogateescape') as reader:
                 lines = reader.readlines()
-            except:
-                reader.close()
-                return False
+        except (IOError, OSError) as msg:
+            util.Log('[docpositionmgr][err] %s' % str(msg))
+            return False
+
+        for line in lines:
+            vals = line.strip().rsplit('=', 1)
+            if len(vals) != 2:
+                continue
+
+            try:
+                pos = int(vals[1])
+            except (TypeError, ValueError) as msg:
+                util.Log('[docpositionmgr][err] %s' % str(msg))
+                continue
             else:
-                reader.close()
-
-            for line in lines:
-                line = line.strip()
-                vals = line.rsplit('=', 1)
-                if len(vals) != 2 or not os.path.exists(vals[0]):
-                    continue
-
-                try:
-                    vals[1] = int(vals[1])
-                except (TypeError, ValueError) as msg:
-                    util.Log('[docpositionmgr][err] %s' % str(msg))
-                    continue
-                else:
-                    self._records[vals[0]] = vals[1]
-
-            util.Log('[docpositionmgr][info] successfully loaded book')
-            return True
+                self._Touch(vals[0], pos)
+
+        self._loglen = len(lines)
+        util.Log('[docpositionmgr][info] successfully loaded book')
+        return True
 
     @classmethod
     def PeekNavi(cls, pre=False):
@@ -230,19 +303,28 @@ class DocPositionMgr(object):
 
     def WriteBook(self):
         """
-        Writes the collection of files=pos to the config file
+        Compacts the on disk log of files=pos records when it holds too many
+        replaced or dropped records. Records are appended to the log as they
+        are added so there is nothing to do otherwise.
         @postcondition: in memory doc data is written out to disk
         """
-        writer = util.GetFileWriter(self.GetBook(), sys.getfilesystemencoding())
-        if writer != -1:
-            try:
-                for key, val in self._records.items():
-                    try:
-                        writer.write('%s=%d\n' % (key, val))
-                    except UnicodeDecodeError:
-                        continue
-                writer.close()
-            except IOError as msg:
-                util.Log('[docpositionmgr][err] %s' % str(msg))
-        else:
-            util.Log('[docpositionmgr][err] Failed to open %s' % self.GetBook())
+        if not self._init or not self._loaded or not Profile_Get('SAVE_POS'):
+            return
+
+        with self._lock:
+            records = list(self._records.items())
+            if not self._dirty and self._loglen <= len(records) * 2:
+                return
+
+        book = self.GetBook()
+        tmp = book + '.tmp'
+        try:
+            with open(tmp, 'w', encoding=sys.getfilesystemencoding(),
+                      errors='surrogateescape') as writer:
+                for key, val in records:
+                    writer.write('%s=%d\n' % (key, val))
+            os.replace(tmp, book)
+            self._loglen = len(records)
+            self._dirty = False
+        except (IOError, OSError, UnicodeError) as msg:
+            util.Log('[docpositionmgr][err] %s' % str(msg))
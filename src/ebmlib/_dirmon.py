@@ -7,7 +7,7 @@
 ###############################################################################
 
 """
-Editra Business Model Library: DirectoryMonitor
+Editra Business Model Library: DirectoryMonitor, FileMonitor
 
 
 """
@@ -16,7 +16,7 @@ __author__ = "Cody Precord <cprecord@editra.org>"
 __cvsid__ = "$Id: _dirmon.py 73166 2012-12-12 04:31:53Z CJP $"
 __revision__ = "$Revision: 73166 $"
 
-__all__ = ['DirectoryMonitor',]
+__all__ = ['DirectoryMonitor', 'FileMonitor', 'FileState']
 
 #-----------------------------------------------------------------------------#
 # Imports
@@ -143,6 +143,7 @@ class WatcherThread(threading.Thread):
 
         """
         super(WatcherThread, self).__init__()
+        self.daemon = True
 
         # Attributes
         assert callable(notifier)
@@ -189,39 +190,30 @@ class WatcherThread(threading.Thread):
                         self._dirs.remove(dobj)
                         continue
 
-                    snapshot = fileutil.GetDirectoryObject(dobj.Path, 
-                                                           False, True)
-
-                    # Check for deletions
-                    dobjFiles = dobj.Files # optimization
-                    dobjIndex = dobjFiles.index # optimization
-                    snapFiles = snapshot.Files # optimization
-                    for tobj in dobjFiles:
-                        if not self._continue:
-                            return
-                        elif self._changePending:
-                            break
-                        if tobj not in snapFiles:
+                    try:
+                        snapshot = fileutil.GetDirectoryObject(dobj.Path,
+                                                               False, True)
+                    except OSError:
+                        continue
+
+                    # Compare the snapshots by path so that only the
+                    # differences are reported to the clients.
+                    known = dict((os.path.normcase(tobj.Path), tobj)
+                                 for tobj in dobj.Files)
+                    current = dict((os.path.normcase(tobj.Path), tobj)
+                                   for tobj in snapshot.Files)
+                    for key, tobj in known.items():
+                        if key not in current:
                             deleted.append(tobj)
-                            dobjFiles.remove(tobj)
-
-                    # Check for additions and modifications
-                    for tobj in snapFiles:
-                        if not self._continue:
-                            return
-                        elif self._changePending:
-                            break
-                        if tobj not in dobjFiles:
+                    for key, tobj in current.items():
+                        existing = known.get(key, None)
+                        if existing is None:
                             # new object was added
                             added.append(tobj)
-                            dobjFiles.append(tobj)
-                        else:
-                            idx = dobjIndex(tobj)
-                            existing = dobjFiles[idx]
+                        elif existing.ModTime < tobj.ModTime:
                             # object was modified
-                            if existing.ModTime < tobj.ModTime:
-                                modified.append(tobj)
-                                existing.ModTime = tobj.ModTime
+                            modified.append(tobj)
+                    dobj.Files[:] = snapshot.Files
 
             # Call Notifier if anything changed
             if any((added, deleted, modified)):
@@ -319,6 +311,339 @@ class WatcherThread(threading.Thread):
     def Shutdown(self):
         """Shut the thread down"""
         self._continue = False
+        # Wake the thread if it is waiting on something to do
+        for cond in (self._listEmptyCond, self._suspendcond,
+                     self._refreshCond):
+            with cond:
+                cond.notify()
+
+    def Suspend(self):
+        """Suspend the thread"""
+        self._suspend = True
+
+    def Continue(self):
+        """Continue the thread"""
+        self._suspend = False
+        with self._suspendcond:
+            self._suspendcond.notify()
+
+#-----------------------------------------------------------------------------#
+
+class FileState(object):
+    """Last known on disk state of a monitored file"""
+    __slots__ = ('path', 'modtime', 'exists', 'readonly')
+    def __init__(self, path, modtime=0, exists=None, readonly=False):
+        """Create the state object, an exists value of None means that
+        the state has not been collected yet. If a modtime is given with
+        it the first check reports changes against that modtime.
+
+        """
+        super(FileState, self).__init__()
+
+        self.path = path
+        self.modtime = modtime
+        self.exists = exists
+        self.readonly = readonly
+
+    Path = property(lambda self: self.path)
+    ModTime = property(lambda self: self.modtime)
+    Exists = property(lambda self: self.exists)
+    ReadOnly = property(lambda self: self.readonly)
+
+    def Update(self):
+        """Refresh the state from disk
+        @return: tuple of bools (modified, deleted, permissions changed)
+
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime
+            exists = True
+            readonly = not os.access(self.path, os.R_OK|os.W_OK)
+        except OSError:
+            mtime = 0
+            exists = False
+            readonly = self.readonly
+
+        if self.exists is None:
+            # First check only collects the initial state unless the
+            # modtime the file was known to have was given.
+            known = bool(self.modtime)
+            modified = known and exists and mtime != self.modtime
+            deleted = known and not exists
+            permissions = False
+            self.modtime = mtime
+            self.exists = exists
+            self.readonly = readonly
+            return modified, deleted, permissions
+
+        modified = exists and mtime != self.modtime
+        deleted = self.exists and not exists
+        permissions = exists and readonly != self.readonly
+        self.modtime = mtime
+        self.exists = exists
+        self.readonly = readonly
+        return modified, deleted, permissions
+
+    def Copy(self):
+        """Get a copy of this state object
+        @return: L{FileState}
+
+        """
+        return FileState(self.path, self.modtime, self.exists, self.readonly)
+
+#-----------------------------------------------------------------------------#
+
+class FileMonitor(object):
+    """Object to manage monitoring a set of individual files for changes
+    to their modification time, existence and access permissions. All file
+    system access is done on a background thread, clients are notified of
+    changes on the main thread.
+
+    """
+    def __init__(self, checkFreq=1000.0):
+        """@keyword checkFreq: check frequency in milliseconds"""
+        super(FileMonitor, self).__init__()
+
+        # Attributes
+        self._watcher = FileWatcherThread(self._ThreadNotifier,
+                                          checkFreq=checkFreq)
+        self._callbacks = list()
+        self._cbackLock = threading.Lock()
+        self._running = False
+
+    def __del__(self):
+        if self._running:
+            self._watcher.Shutdown()
+
+    def _ThreadNotifier(self, modified, deleted, permissions):
+        """Notifier callback from background L{FileWatcherThread}
+        to call notifiers on main thread.
+        @note: this method is invoked from a background thread and
+               is not safe to make direct UI calls from.
+
+        """
+        with self._cbackLock:
+            for cback in self._callbacks:
+                wx.CallAfter(cback, modified, deleted, permissions)
+
+    #---- Properties ----#
+
+    # Is the monitor currently watching any files
+    Monitoring = property(lambda self: self._running)
+    Frequency = property(lambda self: self._watcher.GetFrequency(),
+                         lambda self, freq: self._watcher.SetFrequency(freq))
+
+    #---- End Properties ----#
+
+    def AddFile(self, path, modtime=0):
+        """Add a file to the monitor. Files are reference counted so
+        a file added twice must also be removed twice.
+        @param path: file path
+        @keyword modtime: modtime the file is known to have, if given a
+                          change from it is reported on the first check
+
+        """
+        self._watcher.AddWatchFile(path, modtime)
+
+    def GetFileState(self, path):
+        """Get the last known state of a monitored file. This does not
+        access the file system.
+        @param path: file path
+        @return: L{FileState} or None if the file is not monitored
+
+        """
+        return self._watcher.GetFileState(path)
+
+    def RemoveFile(self, path):
+        """Remove a file from the monitor
+        @param path: file path
+
+        """
+        self._watcher.RemoveWatchFile(path)
+
+    def SubscribeCallback(self, callback):
+        """Subscribe a callback method to be called when changes are
+        detected in one of the watched files.
+        @param callback: callable([modified,], [deleted,], [permissions,])
+                         each argument is a list of L{FileState} objects
+
+        """
+        with self._cbackLock:
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+
+    def UnsubscribeCallback(self, callback):
+        """Remove a callback method from the monitor"""
+        with self._cbackLock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def StartMonitoring(self):
+        """Start monitoring the files in the watch list and
+        notifying target of changes.
+
+        """
+        self._running = True
+        self._watcher.start()
+
+    def Suspend(self, pause=True):
+        """Suspend background processing
+        @keyword pause: True (suspend) False (resume)
+
+        """
+        if pause:
+            self._watcher.Suspend()
+        else:
+            self._watcher.Continue()
+
+    def Refresh(self):
+        """Force a recheck of the monitored files. Only useful when the
+        monitor was created with a check frequency of zero.
+
+        """
+        self._watcher.Refresh()
+
+#-----------------------------------------------------------------------------#
+
+class FileWatcherThread(threading.Thread):
+    """Background thread to monitor a set of files"""
+    def __init__(self, notifier, checkFreq=1000.0):
+        """Create the FileWatcherThread. The notifier will be called in the
+        context of this thread with three lists of L{FileState} objects.
+        @param notifier: callable([modified,], [deleted,], [permissions,])
+        @keyword checkFreq: check frequency in milliseconds. If value is set
+                            to zero or less update checks must be manually
+                            controlled via the Refresh interface.
+
+        """
+        super(FileWatcherThread, self).__init__()
+
+        # Attributes
+        assert callable(notifier)
+        self._notifier = notifier
+        self._files = dict() # path -> [refcount, FileState]
+        self._freq = checkFreq
+        self._continue = True
+        self._lock = threading.Lock()
+        self._suspend = False
+        self._suspendcond = threading.Condition()
+        self._listEmptyCond = threading.Condition()
+        self._refreshCond = threading.Condition()
+        self.daemon = True
+
+    def run(self):
+        """Run the watcher"""
+        while self._continue:
+            # Watch is empty so wait on things to monitor before continuing
+            with self._listEmptyCond:
+                while self._continue and not self._files:
+                    self._listEmptyCond.wait()
+
+            # Suspend processing if requested
+            if self._suspend:
+                with self._suspendcond:
+                    self._suspendcond.wait()
+
+            # Work on a snapshot so that the file system is not accessed
+            # while holding the lock.
+            with self._lock:
+                states = [ entry[1] for entry in self._files.values() ]
+
+            modified = list()
+            deleted = list()
+            permissions = list()
+            for state in states:
+                if not self._continue:
+                    return
+                fmod, fdel, fperm = state.Update()
+                if fmod:
+                    modified.append(state.Copy())
+                if fdel:
+                    deleted.append(state.Copy())
+                if fperm:
+                    permissions.append(state.Copy())
+
+            # Call Notifier if anything changed
+            if any((modified, deleted, permissions)):
+                self._notifier(modified, deleted, permissions)
+
+            # Wait till next check
+            if self._freq > 0:
+                time.sleep(self._freq / 1000.0)
+            else:
+                with self._refreshCond:
+                    self._refreshCond.wait()
+
+    #---- Implementation ----#
+
+    def AddWatchFile(self, path, modtime=0):
+        """Add a file to the watch list
+        @param path: file path
+        @keyword modtime: modtime the file is known to have
+
+        """
+        with self._lock:
+            if path in self._files:
+                self._files[path][0] += 1
+                return
+            # Initial state is collected on the next check
+            self._files[path] = [1, FileState(path, modtime)]
+        with self._listEmptyCond:
+            self._listEmptyCond.notify()
+
+    def GetFileState(self, path):
+        """Get a copy of the last known state of the given file
+        @param path: file path
+        @return: L{FileState} or None
+
+        """
+        with self._lock:
+            entry = self._files.get(path, None)
+            if entry is not None:
+                return entry[1].Copy()
+        return None
+
+    def RemoveWatchFile(self, path):
+        """Remove a file from the watch list
+        @param path: file path
+
+        """
+        with self._lock:
+            entry = self._files.get(path, None)
+            if entry is not None:
+                entry[0] -= 1
+                if entry[0] <= 0:
+                    del self._files[path]
+
+    def GetFrequency(self):
+        """Get the update frequency
+        @return: int (milliseconds)
+
+        """
+        return self._freq
+
+    def SetFrequency(self, milli):
+        """Set the update frequency
+        @param milli: int (milliseconds)
+
+        """
+        self._freq = float(milli)
+
+    def Refresh(self):
+        """Recheck the monitored files. Only useful when manually
+        controlling the refresh cycle of the monitor.
+
+        """
+        with self._refreshCond:
+            self._refreshCond.notify()
+
+    def Shutdown(self):
+        """Shut the thread down"""
+        self._continue = False
+        with self._listEmptyCond:
+            self._listEmptyCond.notify()
+        with self._refreshCond:
+            self._refreshCond.notify()
 
     def Suspend(self):
         """Suspend the thread"""
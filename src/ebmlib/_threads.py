@@ -9,6 +9,12 @@
 """
 Editra Business Model Library: ThreadPool
 
+Priority scheduled pool of worker threads. Jobs are queued with one of the
+PRIORITY_* classes and run in priority order, oldest first within the same
+class. Background jobs are never given the last free worker so that
+interactive and load jobs can always start while long background jobs are
+running. Each queued job is represented by a L{JobFuture} that can be used
+to cancel it, wait for its result and get its timing information.
 
 """
 
@@ -16,12 +22,206 @@ __author__ = "Cody Precord <cprecord@editra.org>"
 __svnid__ = "$Id: _threads.py 67422 2011-04-09 17:23:27Z CJP $"
 __revision__ = "$Revision: 67422 $"
 
-__all__ = [ 'ThreadPool', ]
+__all__ = [ 'ThreadPool', 'JobFuture', 'JobCancelledError',
+            'PRIORITY_INTERACTIVE', 'PRIORITY_LOAD', 'PRIORITY_BACKGROUND',
+            'DefaultThreadCount' ]
 
 #-----------------------------------------------------------------------------#
 # Imports
+import os
+import time
+import heapq
+import itertools
 import threading
-import queue
+import traceback
+from collections import deque
+
+#-----------------------------------------------------------------------------#
+# Globals
+
+# Job priority classes (lower values run first)
+PRIORITY_INTERACTIVE = 0    # Short jobs the user is waiting on
+PRIORITY_LOAD = 1           # File loading
+PRIORITY_BACKGROUND = 2     # Long running jobs (searches, indexing, ...)
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_LOAD, PRIORITY_BACKGROUND)
+
+# Job states
+JOB_QUEUED = 0
+JOB_RUNNING = 1
+JOB_DONE = 2
+JOB_FAILED = 3
+JOB_CANCELLED = 4
+
+# Number of finished jobs to keep in the pools history
+HISTORY_SIZE = 100
+
+#-----------------------------------------------------------------------------#
+
+class JobCancelledError(Exception):
+    """The job was cancelled before it was run"""
+    pass
+
+#-----------------------------------------------------------------------------#
+
+def DefaultThreadCount():
+    """Get the default number of worker threads for the number of cores
+    of the machine. Jobs are mostly waiting on io so there are more
+    threads than cores.
+    @return: int
+
+    """
+    return max(3, min(16, (os.cpu_count() or 1) + 2))
+
+#-----------------------------------------------------------------------------#
+
+class JobFuture(object):
+    """Handle on a job queued in a L{ThreadPool}"""
+    def __init__(self, pool, priority, funct, args, kwargs):
+        """Create the future
+        @param pool: ThreadPool that runs the job
+        @param priority: PRIORITY_* class
+        @param funct: callable
+        @param args: positional arguments to funct
+        @param kwargs: keyword arguments to funct
+
+        """
+        super(JobFuture, self).__init__()
+
+        # Attributes
+        self._pool = pool
+        self._priority = priority
+        self._funct = funct
+        self._args = args
+        self._kwargs = kwargs
+        self._name = getattr(funct, '__qualname__', None) or repr(funct)
+        self._state = JOB_QUEUED
+        self._result = None
+        self._error = None
+        self._tb = ''
+        self._done = threading.Event()
+        self._callbacks = list()
+        self._queued = time.time()
+        self._started = None
+        self._finished = None
+
+    Name = property(lambda self: self._name)
+    Priority = property(lambda self: self._priority)
+    State = property(lambda self: self._state)
+
+    def _Run(self):
+        """Run the job in the current thread
+        @note: only to be called by the pools worker threads
+
+        """
+        self._started = time.time()
+        try:
+            self._result = self._funct(*self._args, **self._kwargs)
+        except Exception as msg:
+            self._error = msg
+            self._tb = traceback.format_exc()
+            self._Finish(JOB_FAILED)
+        else:
+            self._Finish(JOB_DONE)
+
+    def _Finish(self, state):
+        """Set the final state of the job and notify the callbacks"""
+        self._finished = time.time()
+        self._state = state
+        self._funct = self._args = self._kwargs = None
+        self._done.set()
+        for callback in self._callbacks:
+            try:
+                callback(self)
+            except Exception:
+                pass
+
+    def AddDoneCallback(self, callback):
+        """Add a callback to be called with this future when the job has
+        finished, failed or was cancelled. The callback is called on the
+        worker thread or immediately if the job has already finished.
+        @param callback: callable(JobFuture)
+
+        """
+        if self._done.is_set():
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def Cancel(self):
+        """Cancel the job if it has not started running yet
+        @return: bool (True if the job was cancelled)
+
+        """
+        return self._pool._CancelJob(self)
+
+    def GetError(self):
+        """Get the exception raised by the job
+        @return: Exception or None
+
+        """
+        return self._error
+
+    def GetResult(self, timeout=None):
+        """Get the return value of the job, waiting for it to finish
+        @keyword timeout: seconds to wait (None to wait until done)
+        @return: return value of the job
+        @raise: JobCancelledError if the job was cancelled
+        @raise: the exception raised by the job if it failed
+        @raise: RuntimeError if the timeout expired
+
+        """
+        if not self._done.wait(timeout):
+            raise RuntimeError("Timed out waiting for job %s" % self._name)
+        if self._state == JOB_CANCELLED:
+            raise JobCancelledError(self._name)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def GetRunTime(self):
+        """Get the number of seconds the job ran or has been running
+        @return: float
+
+        """
+        if self._started is None:
+            return 0.0
+        return (self._finished or time.time()) - self._started
+
+    def GetTraceback(self):
+        """Get the formatted traceback of the error raised by the job
+        @return: string
+
+        """
+        return self._tb
+
+    def GetWaitTime(self):
+        """Get the number of seconds the job waited in the queue
+        @return: float
+
+        """
+        end = self._started or self._finished or time.time()
+        return end - self._queued
+
+    def IsCancelled(self):
+        """Was the job cancelled
+        @return: bool
+
+        """
+        return self._state == JOB_CANCELLED
+
+    def IsDone(self):
+        """Has the job finished (including failed or cancelled jobs)
+        @return: bool
+
+        """
+        return self._done.is_set()
+
+    def IsRunning(self):
+        """Is the job currently running
+        @return: bool
+
+        """
+        return self._state == JOB_RUNNING
 
 #-----------------------------------------------------------------------------#
 
@@ -30,71 +230,228 @@ class ThreadPool(object):
     to them.
 
     """
-    def __init__(self, tcount, qsize=-1):
+    def __init__(self, tcount=None, qsize=-1):
         """Create the ThreadPool
-        @param tcount: max number of threads to keep in the pool
+        @keyword tcount: max number of threads to keep in the pool (None to
+                         size the pool on the number of cpu cores)
         @keyword qsize: size of job queue (-1 for unlimited)
 
         """
         super(ThreadPool, self).__init__()
 
         # Attributes
-        self._poolsize = tcount
-        self._jobs = queue.Queue(qsize)
-        self._threads = [ _WorkerThread(self._jobs) for t in range(self._poolsize) ]
+        self._poolsize = tcount or DefaultThreadCount()
+        self._qsize = qsize
+        self._cond = threading.Condition()
+        self._heap = list()                 # (priority, sequence, JobFuture)
+        self._seq = itertools.count()
+        self._busy = 0
+        self._bgbusy = 0
+        self._unfinished = 0
+        self._stats = dict((pri, dict(submitted=0, completed=0, failed=0,
+                                      cancelled=0, wait=0.0, run=0.0,
+                                      max_wait=0.0, max_run=0.0))
+                           for pri in PRIORITIES)
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._threads = [ _WorkerThread(self) for t in range(self._poolsize) ]
 
     ThreadCount = property(lambda self: self._poolsize)
-    JobCount = property(lambda self: self._jobs.qsize())
+    JobCount = property(lambda self: self.GetQueueDepth())
+
+    def _CancelJob(self, job):
+        """Cancel a queued job
+        @param job: JobFuture
+        @return: bool
+
+        """
+        with self._cond:
+            if job.State != JOB_QUEUED:
+                return False
+            job._state = JOB_CANCELLED
+            for idx, item in enumerate(self._heap):
+                if item[2] is job:
+                    del self._heap[idx]
+                    heapq.heapify(self._heap)
+                    break
+
+        job._Finish(JOB_CANCELLED)
+        with self._cond:
+            self._JobFinished(job)
+        return True
+
+    def _GetJob(self):
+        """Wait for the next job that may be started
+        @return: JobFuture
+        @note: called by the worker threads
+
+        """
+        with self._cond:
+            while True:
+                # Keep a thread free for higher priority jobs
+                if self._heap and (self._heap[0][0] < PRIORITY_BACKGROUND or \
+                                   self._bgbusy < max(1, self._poolsize - 1)):
+                    job = heapq.heappop(self._heap)[2]
+                    job._state = JOB_RUNNING
+                    self._busy += 1
+                    if job.Priority >= PRIORITY_BACKGROUND:
+                        self._bgbusy += 1
+                    self._cond.notify_all()
+                    return job
+                self._cond.wait()
+
+    def _JobDone(self, job):
+        """Update the pools accounting when a job has been run
+        @param job: JobFuture
+        @note: called by the worker threads
+
+        """
+        with self._cond:
+            self._busy -= 1
+            if job.Priority >= PRIORITY_BACKGROUND:
+                self._bgbusy -= 1
+            self._JobFinished(job)
+
+        try:
+            self.OnJobDone(job)
+        except Exception:
+            pass
+
+    def _JobFinished(self, job):
+        """Record the statistics of a finished job
+        @note: must be called with the lock held
+
+        """
+        stats = self._stats[job.Priority]
+        if job.State == JOB_FAILED:
+            stats['failed'] += 1
+        elif job.State in (JOB_QUEUED, JOB_CANCELLED):
+            stats['cancelled'] += 1
+        else:
+            stats['completed'] += 1
+
+        wait = job.GetWaitTime()
+        run = job.GetRunTime()
+        stats['wait'] += wait
+        stats['run'] += run
+        stats['max_wait'] = max(stats['max_wait'], wait)
+        stats['max_run'] = max(stats['max_run'], run)
+        self._history.append((job.Name, job.Priority, job.State, wait, run))
+
+        self._unfinished -= 1
+        self._cond.notify_all()
+
+    def GetHistory(self):
+        """Get the records of the most recently finished jobs
+        @return: list of (name, priority, state, wait time, run time)
+
+        """
+        with self._cond:
+            return list(self._history)
+
+    def GetQueueDepth(self, priority=None):
+        """Get the number of jobs waiting to be run
+        @keyword priority: only count jobs of this priority class
+        @return: int
+
+        """
+        with self._cond:
+            return len([ item for item in self._heap
+                         if priority is None or item[0] == priority ])
+
+    def GetStats(self):
+        """Get the statistics of the pool
+        @return: dict with threads, busy and queued counts and a dict of
+                 job statistics for each priority class (submitted,
+                 completed, failed and cancelled counts and the total and
+                 maximum wait and run times)
+
+        """
+        with self._cond:
+            queued = dict((pri, 0) for pri in PRIORITIES)
+            for item in self._heap:
+                queued[item[0]] += 1
+            return dict(threads=self._poolsize, busy=self._busy,
+                        queued=queued,
+                        jobs=dict((pri, dict(stats))
+                                  for pri, stats in self._stats.items()))
+
+    def OnJobDone(self, job):
+        """Called on the worker thread after each job has run. Override in
+        subclasses to report failed or slow jobs.
+        @param job: JobFuture
+
+        """
+        pass
 
     def QueueJob(self, funct, *args, **kwargs):
         """Add a job to be processed
         @param funct: callable
         @param args: list of any positional arguments to funct
         @param kwargs: map of any keyword arguments to funct
+        @return: JobFuture
 
         """
-        assert callable(funct)
-        self._jobs.put((funct, args, kwargs))
+        return self.SubmitJob(PRIORITY_LOAD, funct, *args, **kwargs)
 
     def Shutdown(self):
         """Shutdown the ThreadPool
         @note: Blocking call until all threads have exited
 
         """
-        self._jobs.join()
+        with self._cond:
+            while self._unfinished:
+                self._cond.wait()
+
+    def SubmitJob(self, priority, funct, *args, **kwargs):
+        """Add a job to be processed with the given priority
+        @param priority: PRIORITY_* class
+        @param funct: callable
+        @param args: list of any positional arguments to funct
+        @param kwargs: map of any keyword arguments to funct
+        @return: JobFuture
+
+        """
+        assert callable(funct)
+        assert priority in PRIORITIES, "Invalid priority: %s" % priority
+        job = JobFuture(self, priority, funct, args, kwargs)
+        with self._cond:
+            while self._qsize > 0 and len(self._heap) >= self._qsize:
+                self._cond.wait()
+            heapq.heappush(self._heap, (priority, next(self._seq), job))
+            self._stats[priority]['submitted'] += 1
+            self._unfinished += 1
+            self._cond.notify_all()
+        return job
 
 #-----------------------------------------------------------------------------#
 
 class _WorkerThread(threading.Thread):
     """Worker thread class to be used by the ThreadPool"""
-    def __init__(self, jobs):
+    def __init__(self, pool):
         """Create the Thread object
-        @param jobs: Queue object
+        @param pool: ThreadPool to get the jobs from
 
         """
         super(_WorkerThread, self).__init__()
 
         # Attributes
-        self._jobs = jobs
+        self._pool = pool
         self.daemon = True
         self.start()
 
     def run(self):
         """Run and process jobs until requested to exit"""
         while True:
-            funct, args, kwargs = self._jobs.get()
+            job = self._pool._GetJob()
             try:
-                funct(*args, **kwargs)
-            except Exception as msg:
-                pass # TODO add error to result data?
+                job._Run()
             finally:
-                self._jobs.task_done()
+                self._pool._JobDone(job)
 
 #-----------------------------------------------------------------------------#
 # Unittest
 if __name__ == '__main__':
     pool = ThreadPool(5)
-    import time
     import random
     def Job(id_, length):
         print("JOB: %d, begin" % id_)
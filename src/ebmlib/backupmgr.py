@@ -11,23 +11,52 @@ Editra Business Model Library: FileBackupMgr
 
 Helper class for managing and creating backups of files.
 
+Besides plain backup copies the manager can keep chunked backups of a
+buffer's text. The text is split into chunks at content defined line
+boundaries and the chunks are kept in a L{ChunkStore} by the hash of their
+contents. The backup file itself is only a small manifest listing the
+chunks, so a backup after an edit only writes the few chunks around the
+edit and a backup of unchanged text writes nothing at all. The store keeps
+a list of the manifests that use it so that pruning it never removes a
+chunk that a backup still needs.
+
 """
 
 __author__ = "Cody Precord <cprecord@editra.org>"
 __cvsid__ = "$Id: backupmgr.py 67646 2011-04-29 03:07:20Z CJP $"
 __revision__ = "$Revision: 67646 $"
 
-__all__ = [ 'FileBackupMgr', ]
+__all__ = [ 'FileBackupMgr', 'ChunkStore', 'SplitChunks' ]
 
 #-----------------------------------------------------------------------------#
 # Imports
 import os
+import json
+import time
+import zlib
 import shutil
+import hashlib
 
 # Local Imports
 from . import fileutil
 from . import fchecker
 
+#-----------------------------------------------------------------------------#
+# Globals
+
+# First line of a chunked backup manifest
+MANIFEST_HEADER = b"EDITRA_BACKUP 1\n"
+
+# Chunk size limits, chunks end at a line boundary chosen by the content of
+# the following line once they are over the minimum size.
+CHUNK_MIN_SIZE = 16384
+CHUNK_MAX_SIZE = 262144
+CHUNK_MASK = 0x3f   # one in 64 lines is a chunk boundary
+
+# Backups hold the text of the users files so only the user can read them
+BACKUP_FILE_MODE = 0o600
+BACKUP_DIR_MODE = 0o700
+
 #-----------------------------------------------------------------------------#
 
 class FileBackupMgr(object):
@@ -153,6 +182,40 @@ class FileBackupMgr(object):
         else:
             return True
 
+    def ReadChunkedBackup(self, fname, store):
+        """Reassemble the text of a chunked backup
+        @param fname: string (file path)
+        @param store: L{ChunkStore} the backup was written to
+        @return: (bytes, info dict) or None if there is no chunked backup
+        @throws: IOError if the backups chunks are missing or damaged
+
+        """
+        manifest = _ReadManifest(self.GetBackupFilename(fname))
+        if manifest is None:
+            return None
+
+        data = b''.join([store.GetChunk(key) for key in manifest['chunks']])
+        if len(data) != manifest['size']:
+            raise IOError("Backup of %s is incomplete" % fname)
+        return data, manifest['info']
+
+    def RemoveChunkedBackup(self, fname, store):
+        """Remove the chunked backup of a file, its chunks are left for
+        L{ChunkStore.Prune} to remove once no other backup uses them.
+        @param fname: string (file path)
+        @param store: L{ChunkStore} the backup was written to
+        @return: bool (False if there was no chunked backup)
+        @throws: OSError
+
+        """
+        backup = os.path.abspath(self.GetBackupFilename(fname))
+        if _ReadManifest(backup) is None:
+            store.RemoveManifest(backup)
+            return False
+        os.remove(backup)
+        store.RemoveManifest(backup)
+        return True
+
     def SetBackupDirectory(self, path):
         """Set the backup directory to use for all backups created by this
         manager instance. Setting the path to an empty string will set the
@@ -170,6 +233,37 @@ class FileBackupMgr(object):
         assert tstr.count("%s") == 1, "Format statment must only have one arg"
         self.template = tstr
 
+    def WriteChunkedBackup(self, fname, data, store, info=None):
+        """Create a chunked backup of the given text. Only the chunks that
+        are not in the store yet are written and nothing is written when
+        the backup already holds the same text.
+        @param fname: string (file path)
+        @param data: bytes
+        @param store: L{ChunkStore} to keep the chunks in
+        @keyword info: dict of extra (json) data to keep with the backup
+        @return: bool (False if the backup was already up to date)
+        @throws: IOError, OSError
+
+        """
+        view = memoryview(data)
+        ranges = SplitChunks(data)
+        keys = [ChunkStore.GetKey(view[start:end]) for start, end in ranges]
+        manifest = dict(size=len(data), chunks=keys, info=info or dict())
+        backup = os.path.abspath(self.GetBackupFilename(fname))
+        store.AddManifest(backup)
+        if _ReadManifest(backup) == manifest:
+            return False
+
+        for key, (start, end) in zip(keys, ranges):
+            store.PutChunk(key, view[start:end])
+        if os.path.exists(backup):
+            # The rewritten backup keeps the permissions of the old one
+            os.chmod(backup, BACKUP_FILE_MODE)
+        fileutil.AtomicWrite(backup, MANIFEST_HEADER + \
+                                     json.dumps(manifest).encode('utf-8'),
+                             mode=BACKUP_FILE_MODE)
+        return True
+
     def SetHeader(self, header):
         """Set the header string for identifying a file as a backup
         @param header: string (single line only)
@@ -177,3 +271,184 @@ class FileBackupMgr(object):
         """
         assert '\n' not in header, "Header must only be a single line"
         self.header = header
+
+#-----------------------------------------------------------------------------#
+
+class ChunkStore(object):
+    """Content addressed store for the chunks of chunked backups. Chunks
+    are saved under the hash of their contents so each distinct chunk is
+    only stored once no matter how many backups refer to it. The paths of
+    the manifests of the backups are recorded in the manifests directory
+    of the store.
+
+    """
+    MANIFEST_DIR = 'manifests'
+
+    def __init__(self, path):
+        """Create the store
+        @param path: directory to keep the chunks in
+
+        """
+        super(ChunkStore, self).__init__()
+
+        # Attributes
+        self.path = path
+
+    def _GetPath(self, key):
+        """Get the path of a chunk"""
+        return os.path.join(self.path, key[:2], key)
+
+    def _GetManifestRef(self, path):
+        """Get the path of the record of a manifest"""
+        key = hashlib.sha1(path.encode('utf-8', 'surrogateescape')).hexdigest()
+        return os.path.join(self.path, ChunkStore.MANIFEST_DIR, key)
+
+    def AddManifest(self, path):
+        """Record a manifest that uses the chunks of the store
+        @param path: absolute path of the manifest
+
+        """
+        ref = self._GetManifestRef(path)
+        if not os.path.exists(ref):
+            os.makedirs(os.path.dirname(ref), BACKUP_DIR_MODE, exist_ok=True)
+            fileutil.AtomicWrite(ref, path.encode('utf-8', 'surrogateescape'),
+                                 mode=BACKUP_FILE_MODE)
+
+    def GetManifests(self):
+        """Get the paths of the recorded manifests
+        @return: list of paths
+
+        """
+        paths = list()
+        mdir = os.path.join(self.path, ChunkStore.MANIFEST_DIR)
+        if os.path.isdir(mdir):
+            for fname in os.listdir(mdir):
+                try:
+                    with open(os.path.join(mdir, fname), 'rb') as handle:
+                        paths.append(handle.read().decode('utf-8',
+                                                          'surrogateescape'))
+                except (IOError, OSError):
+                    pass
+        return paths
+
+    def RemoveManifest(self, path):
+        """Remove the record of a manifest
+        @param path: absolute path of the manifest
+
+        """
+        try:
+            os.remove(self._GetManifestRef(path))
+        except OSError:
+            pass
+
+    @staticmethod
+    def GetKey(data):
+        """Get the key of a chunk
+        @param data: bytes
+        @return: string
+
+        """
+        return hashlib.sha1(data).hexdigest()
+
+    def GetChunk(self, key):
+        """Get a chunk from the store
+        @param key: chunk key
+        @return: bytes
+        @throws: IOError if the chunk is missing or damaged
+
+        """
+        with open(self._GetPath(key), 'rb') as handle:
+            data = handle.read()
+        if self.GetKey(data) != key:
+            raise IOError("Backup chunk %s is damaged" % key)
+        return data
+
+    def PutChunk(self, key, data):
+        """Add a chunk to the store. Chunks that are already stored are
+        only marked as being in use.
+        @param key: chunk key (see L{GetKey})
+        @param data: bytes
+
+        """
+        path = self._GetPath(key)
+        if os.path.exists(path):
+            os.utime(path, None)
+        else:
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path), BACKUP_DIR_MODE,
+                            exist_ok=True)
+            fileutil.AtomicWrite(path, data, mode=BACKUP_FILE_MODE)
+
+    def Prune(self, max_age):
+        """Remove the chunks that have not been used by a backup in the
+        given amount of time. Chunks that are used by one of the recorded
+        manifests are always kept.
+        @param max_age: age in seconds
+
+        """
+        if not os.path.isdir(self.path):
+            return
+
+        used = set()
+        for path in self.GetManifests():
+            manifest = _ReadManifest(path)
+            if manifest is None:
+                self.RemoveManifest(path)
+            else:
+                used.update(manifest['chunks'])
+
+        cutoff = time.time() - max_age
+        for root, dirs, files in os.walk(self.path):
+            if root == self.path and ChunkStore.MANIFEST_DIR in dirs:
+                dirs.remove(ChunkStore.MANIFEST_DIR)
+            for fname in files:
+                if fname in used:
+                    continue
+                path = os.path.join(root, fname)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+#-----------------------------------------------------------------------------#
+
+def _ReadManifest(path):
+    """Read the manifest of a chunked backup
+    @param path: backup file path
+    @return: dict or None if the file is not a chunked backup
+
+    """
+    try:
+        with open(path, 'rb') as handle:
+            if handle.readline() != MANIFEST_HEADER:
+                return None
+            return json.loads(handle.read().decode('utf-8'))
+    except (IOError, OSError, ValueError):
+        return None
+
+def SplitChunks(data, min_size=CHUNK_MIN_SIZE, max_size=CHUNK_MAX_SIZE):
+    """Split data into chunks for a chunked backup. Once a chunk is over
+    the minimum size it ends at the first line whose leading bytes hash to
+    a boundary, so after an edit the chunks soon line up with the chunks
+    of the previous backup again.
+    @param data: bytes
+    @keyword min_size: minimum chunk size
+    @keyword max_size: maximum chunk size
+    @return: list of (start, end)
+
+    """
+    chunks = list()
+    start = 0
+    total = len(data)
+    while start < total:
+        end = min(start + max_size, total)
+        pos = data.find(b'\n', start + min_size, end)
+        while pos != -1:
+            if not zlib.crc32(data[pos + 1:pos + 33]) & CHUNK_MASK:
+                end = pos + 1
+                break
+            pos = data.find(b'\n', pos + 1, end)
+        chunks.append((start, end))
+        start = end
+    return chunks
@@ -27,8 +27,7 @@ import os
 
 class FileTypeChecker(object):
     """File type checker and recognizer"""
-    TXTCHARS = ''.join(map(chr, [7, 8, 9, 10, 12, 13, 27] + list(range(0x20, 0x100))))
-    ALLBYTES = ''.join(map(chr, list(range(256))))
+    TXTCHARS = bytes([7, 8, 9, 10, 12, 13, 27] + list(range(0x20, 0x100)))
 
     def __init__(self, preread=4096):
         """Create the FileTypeChecker
@@ -69,11 +68,10 @@ class FileTypeChecker(object):
 
     def IsBinaryBytes(self, bytes):
         """Check if the given string is composed of binary bytes
-        @param bytes: string
+        @param bytes: bytes
 
         """
-        nontext = bytes.translate(FileTypeChecker.ALLBYTES,
-                                  FileTypeChecker.TXTCHARS)
+        nontext = bytes.translate(None, FileTypeChecker.TXTCHARS)
         return bool(nontext)
 
     def IsReadableText(self, fname):
@@ -17,7 +17,7 @@ __author__ = "Cody Precord <cprecord@editra.org>"
 __svnid__ = "$Id: fileutil.py 71689 2012-06-07 18:55:45Z CJP $"
 __revision__ = "$Revision: 71689 $"
 
-__all__ = [ 'GetAbsPath', 'GetFileExtension', 'GetFileModTime', 'GetFileName',
+__all__ = [ 'AtomicWrite', 'GetAbsPath', 'GetFileExtension', 'GetFileModTime', 'GetFileName',
             'GetFileSize', 'GetPathName', 'GetPathFromURI', 'GetUniqueName', 
             'IsLink', 'MakeNewFile', 'MakeNewFolder', 'PathExists',
             'ResolveRealPath', 'IsExecutable', 'Which', 'ComparePaths',
@@ -32,6 +32,8 @@ import os
 import platform
 import urllib.request, urllib.error, urllib.parse
 import stat
+import shutil
+import tempfile
 import subprocess
 
 UNIX = WIN = False
@@ -51,6 +53,19 @@ if wx.Platform == '__WXMSW__':
 else:
     UNIX = True
 
+def _GetUmask():
+    """Get the file mode creation mask of the process. It can only be read
+    by setting it so it is read once at startup.
+    @return: int
+
+    """
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+# Permissions of files that are created by the process
+_NEW_FILE_MODE = 0o666 & ~_GetUmask()
+
 #-----------------------------------------------------------------------------#
 
 def uri2path(func):
@@ -82,6 +97,60 @@ def AddFileExtension(path, ext):
         path = path + ext
     return path
 
+def AtomicWrite(path, data, progress=None, chunk=262144, mode=None):
+    """Write data to a file by writing it to a temporary file in the same
+    directory, flushing it to disk and then renaming it over the original.
+    The original file is written in place if no temporary file can be
+    created next to it (i.e. the directory is not writable).
+    @param path: file path (symbolic links are followed)
+    @param data: bytes
+    @keyword progress: callable(bytes written, total bytes)
+    @keyword chunk: number of bytes written at a time
+    @keyword mode: permissions of the file if it does not exist yet
+                   (default is the same as open gives it, 0666 less the
+                   umask)
+    @return: bool (False if the file was written in place)
+    @throws: IOError, OSError
+
+    """
+    path = os.path.realpath(path)
+    dname, fname = os.path.split(path)
+    try:
+        fdesc, tmp = tempfile.mkstemp(prefix='.%s.' % fname,
+                                      suffix='.edtmp', dir=dname)
+    except (IOError, OSError):
+        fdesc, tmp = None, None
+
+    total = len(data)
+    view = memoryview(data)
+    try:
+        if fdesc is None:
+            handle = open(path, 'wb')
+        else:
+            handle = os.fdopen(fdesc, 'wb')
+
+        with handle:
+            for pos in range(0, total, chunk):
+                handle.write(view[pos:pos + chunk])
+                if progress is not None:
+                    progress(min(pos + chunk, total), total)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        if tmp is not None:
+            if os.path.exists(path):
+                shutil.copymode(path, tmp)
+            elif mode is None:
+                os.chmod(tmp, _NEW_FILE_MODE)
+            else:
+                os.chmod(tmp, mode)
+            os.replace(tmp, path)
+    except:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return tmp is not None
+
 def ComparePaths(path1, path2):
     """Determine whether the two given paths are equivalent
     @param path1: unicode
@@ -328,19 +397,22 @@ def GetDirectoryObject(path, recurse=True, includedot=False):
     assert os.path.isdir(path)
     def _BuildDir(thedir):
         dirAddFile = thedir.Files.append
-        isdir = os.path.isdir
-        pjoin = os.path.join
-        for fname in os.listdir(thedir.Path):
-            if not includedot and fname.startswith('.'):
-                continue
-            fpath = pjoin(thedir.Path, fname)
-            if isdir(fpath):
-                newobj = Directory(fpath)
-                if recurse:
-                    _BuildDir(newobj)
-            else:
-                newobj = File(fpath)
-            dirAddFile(newobj)
+        # The entries from scandir know their type without another stat
+        with os.scandir(thedir.Path) as entries:
+            for entry in entries:
+                if not includedot and entry.name.startswith('.'):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    mtime = 0
+                if entry.is_dir():
+                    newobj = Directory(entry.path, mtime)
+                    if recurse:
+                        _BuildDir(newobj)
+                else:
+                    newobj = File(entry.path, mtime)
+                dirAddFile(newobj)
 
     dobj = Directory(path)
     _BuildDir(dobj)
@@ -351,11 +423,13 @@ def GetDirectoryObject(path, recurse=True, includedot=False):
 class File(object):
     """Basic file data structure"""
     __slots__ = ('path', 'modtime')
-    def __init__(self, path):
+    def __init__(self, path, modtime=None):
         super(File, self).__init__()
 
         self.path = path
-        self.modtime = GetFileModTime(self.path)
+        if modtime is None:
+            modtime = GetFileModTime(self.path)
+        self.modtime = modtime
 
     Path = property(lambda self: self.path)
     Name = property(lambda self: os.path.basename(self.Path))
@@ -376,8 +450,8 @@ class Directory(File):
 
     """
     __slots__ = ('files',)
-    def __init__(self, path):
-        super(Directory, self).__init__(path)
+    def __init__(self, path, modtime=None):
+        super(Directory, self).__init__(path, modtime)
 
         self.files = list()
 
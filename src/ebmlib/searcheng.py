@@ -268,15 +268,22 @@ class SearchEngine(object):
         """
         raise NotImplementedError
 
-    def SearchInDirectory(self, directory, recursive=True):
-        """Search in all the files found in the given directory
-        @param directory: directory path
-        @keyword recursive: search recursivly
+    def GetFileEncoding(self, fname):
+        """Get the encoding to decode the lines of a file with when the
+        query is a unicode string. Override to detect the encoding.
+        @param fname: file path
+        @return: encoding name
 
         """
-        if self._regex is None:
-            return
+        return 'utf-8'
+
+    def IterDirectoryFiles(self, directory, recursive=True):
+        """Iterate over the files in the given directory that match the
+        current file filters.
+        @param directory: directory path
+        @keyword recursive: decend into sub directories
 
+        """
         # Get all files in the directories
         paths = [os.path.join(directory, fname)
                 for fname in os.listdir(directory) if not fname.startswith('.')]
@@ -292,24 +299,59 @@ class SearchEngine(object):
                 for pat in self._filters:
                     if fnmatch.fnmatch(fname, pat):
                         filtered.append(fname)
+                        break
             paths = filtered
 
-        # Begin searching in the paths
         for path in paths:
-            if recursive and os.path.isdir(path):
-                # Recursive call to decend into directories
-                for match in self.SearchInDirectory(path, recursive):
-                    yield match
+            if os.path.isdir(path):
+                if recursive:
+                    # Recursive call to decend into directories
+                    for fname in self.IterDirectoryFiles(path, recursive):
+                        yield fname
             else:
-                for match in self.SearchInFile(path):
-                    yield match
+                yield path
+
+    def ReplaceAll(self, text, rstring):
+        """Replace all matches of the query in a string
+        @param text: string to do the replacements in
+        @param rstring: replacement string, group references are expanded
+                        for regular expression searches
+        @return: tuple (new string, number of replacements)
+
+        """
+        if self._regex is None:
+            return (text, 0)
+
+        def GetSub(match):
+            """replace substitution callable for re.subn"""
+            value = rstring
+            if self._isregex:
+                try:
+                    value = match.expand(rstring)
+                except (re.error, IndexError):
+                    pass
+            return value
+        return self._regex.subn(GetSub, text)
+
+    def SearchInDirectory(self, directory, recursive=True):
+        """Search in all the files found in the given directory
+        @param directory: directory path
+        @keyword recursive: search recursivly
+
+        """
+        if self._regex is None:
+            return
+
+        # Begin searching in the paths
+        for path in self.IterDirectoryFiles(directory, recursive):
+            for match in self.SearchInFile(path):
+                yield match
         return
 
     def SearchInFile(self, fname):
         """Search in a file for all lines with matches of the set query and
         yield the results as they are found.
         @param fname: filename
-        @todo: unicode handling
 
         """
         if self._regex is None:
@@ -318,8 +360,14 @@ class SearchEngine(object):
         checker = fchecker.FileTypeChecker()
         if checker.IsReadableText(fname):
             try:
-                fobj = open(fname, 'rb')
-            except (IOError, OSError):
+                # Lines are matched as text when the query is unicode, they
+                # are split at \n only either way.
+                if isinstance(self._regex.pattern, str):
+                    fobj = open(fname, 'r', newline='\n', errors='replace',
+                                encoding=self.GetFileEncoding(fname))
+                else:
+                    fobj = open(fname, 'rb')
+            except (IOError, OSError, LookupError):
                 return
             else:
                 # Special token to signify start of a search
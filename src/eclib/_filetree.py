@@ -11,6 +11,12 @@ Editra Control Library: FileTree
 
 Base class control for displaying a file system in a hierarchical manor.
 
+Directories are listed with os.scandir on a background thread when they are
+expanded and their nodes are added to the tree in batches, so expanding a
+directory with a very large number of entries does not block the UI.
+Changes reported by a directory monitor can be applied to the shown nodes
+with L{FileTree.UpdateFileNodes} instead of rescanning the directories.
+
 """
 
 __author__ = "Cody Precord <cprecord@editra.org>"
@@ -21,13 +27,18 @@ __all__ = ['FileTree',]
 
 #-----------------------------------------------------------------------------#
 # Imports
-import sys
 import os
 import types
+import threading
 import wx
 
 #-----------------------------------------------------------------------------#
 
+# Number of nodes added to the tree at a time when populating a directory
+POPULATE_BATCH_SIZE = 500
+
+#-----------------------------------------------------------------------------#
+
 class FileTree(wx.TreeCtrl):
     """Simple base control for displaying directories and files in a
     hierarchical view.
@@ -46,6 +57,8 @@ class FileTree(wx.TreeCtrl):
         self._watch = list() # Root directories to watch
         self._il = None
         self._editlabels = True
+        self._scans = dict() # Directories being populated -> scan id
+        self._scanid = 0
 
         # Setup
         self.SetupImageList()
@@ -164,9 +177,15 @@ class FileTree(wx.TreeCtrl):
         """
         d = self.GetPyData(item)
         if d and os.path.exists(d):
-            contents = FileTree.GetDirContents(d)
-            for p in contents:
-                self.AppendFileNode(item, p)
+            self.PopulateDirectory(item, d)
+
+    def DoDirectoryPopulated(self, item):
+        """Called when all the nodes of a directory that was populated by
+        L{PopulateDirectory} have been added to the tree.
+        @param item: TreeItem
+
+        """
+        pass
 
     def DoShowMenu(self, item):
         """Context menu has been requested for the given item.
@@ -206,6 +225,45 @@ class FileTree(wx.TreeCtrl):
 
     #---- End Overrides ----#
 
+    def _GetImageGetter(self):
+        """Get a callable(path, isdir) that returns the image for a node.
+        When L{DoGetFileImage} is not overridden the image is picked from
+        the known type of the path so that no file system access is needed
+        for files.
+
+        """
+        if type(self).DoGetFileImage is not FileTree.DoGetFileImage:
+            return lambda path, isdir: self.DoGetFileImage(path)
+
+        def GetImage(path, isdir):
+            if isdir:
+                return 0 if os.access(path, os.R_OK) else 2
+            return 1
+        return GetImage
+
+    def _AppendBatch(self, path, scanid, entries, start):
+        """Add the next batch of nodes for a directory that is being
+        populated by L{PopulateDirectory} and schedule the batch after it.
+        The node of the directory is looked up again for each batch as it
+        may have been deleted in the meantime.
+
+        """
+        if not self or self._scans.get(path, None) != scanid:
+            return
+
+        item = self.FindNode(path)
+        if item is None:
+            del self._scans[path]
+            return
+
+        end = start + POPULATE_BATCH_SIZE
+        self.AppendFileEntries(item, entries[start:end])
+        if end < len(entries):
+            wx.CallAfter(self._AppendBatch, path, scanid, entries, end)
+        else:
+            del self._scans[path]
+            self.DoDirectoryPopulated(item)
+
     #---- Properties ----#
 
     WatchDirs = property(lambda self: self._watch)
@@ -277,20 +335,164 @@ class FileTree(wx.TreeCtrl):
         @return: None
 
         """
-        getBaseName = os.path.basename
         isDir = os.path.isdir
-        getImg = self.DoGetFileImage
+        self.AppendFileEntries(item, [ (path, isDir(path)) for path in paths ])
+
+    def AppendFileEntries(self, item, entries):
+        """Append a list of child nodes whose types are already known
+        to the tree (see L{ScanDirectory}).
+        @param item: TreeItem parent node
+        @param entries: list of (path, isdir)
+        @return: None
+
+        """
+        getBaseName = os.path.basename
+        getImg = self._GetImageGetter()
         appendNode = self.AppendItem
         setData = self.SetPyData
-        for path in paths:
-            img = getImg(path)
-            name = getBaseName(path)
-            if not name:
-                name = path
-            child = appendNode(item, name, img)
-            setData(child, path)
-            if isDir(path):
-                self.SetItemHasChildren(child, True)
+        setHasChildren = self.SetItemHasChildren
+        self.Freeze()
+        try:
+            for path, isdir in entries:
+                name = getBaseName(path)
+                if not name:
+                    name = path
+                child = appendNode(item, name, getImg(path, isdir))
+                setData(child, path)
+                if isdir:
+                    setHasChildren(child, True)
+        finally:
+            self.Thaw()
+
+    def CancelPopulate(self, path):
+        """Stop populating a directory and its sub directories
+        @param path: directory path
+
+        """
+        if path:
+            prefix = os.path.join(path, '')
+            for dname in list(self._scans.keys()):
+                if dname == path or dname.startswith(prefix):
+                    del self._scans[dname]
+
+    def Delete(self, item):
+        """Delete a node, stopping any population of its directory
+        @param item: TreeItem
+
+        """
+        self.CancelPopulate(self.GetPyData(item))
+        super(FileTree, self).Delete(item)
+
+    def DeleteAllItems(self):
+        """Delete all the nodes, stopping any directory population"""
+        self._scans.clear()
+        super(FileTree, self).DeleteAllItems()
+
+    def DeleteChildren(self, item):
+        """Delete the children of a node, stopping any population of its
+        directory.
+        @param item: TreeItem
+
+        """
+        if item == self.RootItem:
+            self._scans.clear()
+        else:
+            self.CancelPopulate(self.GetPyData(item))
+        super(FileTree, self).DeleteChildren(item)
+
+    def FindNode(self, path):
+        """Find the node of a path among the nodes that are currently
+        in the tree.
+        @param path: file path
+        @return: TreeItem or None
+
+        """
+        for node in self.GetChildNodes(self.RootItem):
+            root = self.GetPyData(node)
+            if not root:
+                continue
+            elif path == root:
+                return node
+            elif not path.startswith(os.path.join(root, '')):
+                continue
+
+            for name in path[len(root):].strip(os.sep).split(os.sep):
+                for child in self.GetChildNodes(node):
+                    if self.GetItemText(child) == name:
+                        node = child
+                        break
+                else:
+                    return None
+            return node
+        return None
+
+    def IsPopulating(self, path):
+        """Is a directory being populated by L{PopulateDirectory}
+        @param path: directory path
+        @return: bool
+
+        """
+        return path in self._scans
+
+    def PopulateDirectory(self, item, path):
+        """Add the contents of a directory to its node. The directory is
+        listed on a background thread and the nodes are added in batches
+        on the main thread as they become available.
+        @param item: TreeItem of the directory
+        @param path: directory path
+
+        """
+        self._scanid += 1
+        scanid = self._scanid
+        self._scans[path] = scanid
+
+        def ScanJob():
+            entries = FileTree.ScanDirectory(path)
+            wx.CallAfter(self._AppendBatch, path, scanid, entries, 0)
+
+        scanner = threading.Thread(target=ScanJob)
+        scanner.daemon = True
+        scanner.start()
+
+    def UpdateFileNodes(self, added=(), deleted=()):
+        """Apply the changes reported by a directory monitor to the nodes
+        of the directories that are currently expanded.
+        @keyword added: list of paths or L{ebmlib.File} objects
+        @keyword deleted: list of paths or L{ebmlib.File} objects
+
+        """
+        changes = dict()
+        for obj in added:
+            path = getattr(obj, 'Path', obj)
+            if hasattr(obj, 'Files'):
+                isdir = True # ebmlib.Directory
+            else:
+                isdir = os.path.isdir(path)
+            dname = os.path.dirname(path)
+            changes.setdefault(dname, (list(), set()))[0].append((path, isdir))
+        for obj in deleted:
+            path = getattr(obj, 'Path', obj)
+            dname = os.path.dirname(path)
+            changes.setdefault(dname, (list(), set()))[1].add(path)
+
+        for dname, (adds, dels) in changes.items():
+            # Directories that are being populated will be up to date
+            # and ones that are not expanded have no nodes to update.
+            parent = self.FindNode(dname)
+            if parent is None or self.IsPopulating(dname) or \
+               not self.IsExpanded(parent):
+                continue
+
+            nodes = dict()
+            for node in self.GetChildNodes(parent):
+                nodes[self.GetPyData(node)] = node
+            for path in dels:
+                node = nodes.pop(path, None)
+                if node is not None:
+                    self.Delete(node)
+            self.AppendFileEntries(parent, [ (path, isdir)
+                                             for path, isdir in adds
+                                             if path not in nodes ])
 
     def GetChildNodes(self, parent):
         """Get all the TreeItemIds under the given parent
@@ -394,19 +596,30 @@ class FileTree(wx.TreeCtrl):
     def GetDirContents(directory):
         """Get the list of files contained in the given directory"""
         assert os.path.isdir(directory)
-        files = list()
+        return [ path for path, isdir in FileTree.ScanDirectory(directory) ]
+
+    @staticmethod
+    def ScanDirectory(directory):
+        """Get the contents of the given directory along with whether each
+        entry is a directory. The type comes from the directory listing
+        itself so no extra file system calls are made for most entries.
+        @param directory: directory path
+        @return: list of (path, isdir)
+
+        """
+        entries = list()
         try:
-            joinPath = os.path.join
-            fappend = files.append
-            fs_encoding = sys.getfilesystemencoding()
-            for p in os.listdir(directory):
-                fullpath = joinPath(directory, p)
-                if type(fullpath) != str:
-                    fullpath = fullpath.decode(fs_encoding)
-                fappend(fullpath)
+            fappend = entries.append
+            with os.scandir(directory) as listing:
+                for entry in listing:
+                    try:
+                        isdir = entry.is_dir()
+                    except OSError:
+                        isdir = False
+                    fappend((entry.path, isdir))
         except OSError:
             pass
-        return files
+        return entries
 
     def GetNodePaths(self, dirNode):
         """Get a list of paths contained below the given
@@ -24,6 +24,8 @@ __revision__ = '$Revision: 66815 $'
 # Dependancies
 import wx
 from . import ed_glob
+from . import ed_msg
+from . import ebmlib
 from .profiler import Profile_Get
 from .syntax import syntax
 from . import ed_theme
@@ -69,6 +71,51 @@ DEFAULT = {
 }
 
 
+# --------------------------------------------------------------------------
+class BitmapCache(object, metaclass=ebmlib.Singleton):
+    """
+    Cache of the bitmaps created by the L{EditraArt} provider so that
+    repeated requests for the same icon do not need to load and scale it
+    again. Entries are keyed on (theme, art id, client, size) and the cache
+    is cleared whenever the icon theme changes.
+    """
+    def __init__(self):
+        super(BitmapCache, self).__init__()
+
+        # Attributes
+        self._bitmaps = dict()
+
+        # Message Handlers
+        ed_msg.Subscribe(self.OnThemeChanged, ed_msg.EDMSG_THEME_CHANGED)
+
+    def Clear(self):
+        """Remove all bitmaps from the cache"""
+        self._bitmaps.clear()
+        ed_theme.TangoTheme.ResetIndex()
+
+    def Get(self, key):
+        """
+        Get a bitmap from the cache
+        @param key: (theme, art id, client, size)
+        @return: wx.Bitmap or None if not cached
+        """
+        return self._bitmaps.get(key, None)
+
+    def Set(self, key, bmp):
+        """
+        Add a bitmap to the cache
+        @param key: (theme, art id, client, size)
+        @param bmp: wx.Bitmap
+        """
+        self._bitmaps[key] = bmp
+
+    def OnThemeChanged(self, msg):
+        """Clear the cache when the icon theme or icon size changes
+        @param msg: Message Object
+
+        """
+        self.Clear()
+
 # --------------------------------------------------------------------------
 class EditraArt(wx.ArtProvider):
     """
@@ -85,6 +132,7 @@ class EditraArt(wx.ArtProvider):
         """
         super(EditraArt, self).__init__()
         self._library = ed_theme.BitmapProvider(wx.GetApp().GetPluginManager())
+        self._cache = BitmapCache()
 
     def CreateBitmap(self, art_id, client, size):
         """
@@ -102,6 +150,24 @@ class EditraArt(wx.ArtProvider):
         except ValueError:
             return wx.NullBitmap
 
+        if client == wx.ART_TOOLBAR and size == wx.DefaultSize:
+            size = Profile_Get('ICON_SZ', default=(24, 24))
+        key = (Profile_Get('ICONS', 'str'), art_id, client, tuple(size))
+        bmp = self._cache.Get(key)
+        if bmp is None:
+            bmp = self._CreateBitmap(art_id, client, size)
+            self._cache.Set(key, bmp)
+        return bmp
+
+    def _CreateBitmap(self, art_id, client, size):
+        """
+        Create the bitmap for a theme art resource
+        @param art_id: object id
+        @param client: wx.ART_MENU, wx.ART_TOOLBAR, wx.ART_OTHER
+        @param size: requested size
+        @return: wx.Bitmap
+
+        """
         # If using default theme let the system provide the art when possible
         # this is mostly for GTK where there is a native art provider that can
         # provide theme icons.
@@ -119,9 +185,6 @@ class EditraArt(wx.ArtProvider):
             # Dont scale toolbar icons on wxMac as the toolbar handles it
             # internally and produces much nicer results.
             if client == wx.ART_TOOLBAR and not wx.Platform == '__WXMAC__':
-                if size == wx.DefaultSize:
-                    size = Profile_Get('ICON_SZ', default=(24, 24))
-
                 img_sz = bmp.GetSize()
                 if size[0] < img_sz[0]:
                     img = wx.ImageFromBitmap(bmp)
@@ -29,6 +29,7 @@ from . import eclib
 from . import ebmlib
 from . import ed_msg
 from . import ed_txt
+from . import ed_bracket
 from .syntax import syntax
 from .syntax import synglob
 from . import autocomp
@@ -75,10 +76,12 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
                           keywords=[' '],
                           comment=list(),
                           clexer=None,      # Container lexer method
+                          clexrange=[-1, 0],# Container lexer dirty range
                           indenter=None,    # Auto indenter
                           lang_id=0)        # Language ID from syntax module
 
         self.vert_edit = vertedit.VertEdit(self, markerNumber=MARKER_VERT_EDIT)
+        self._brackets = ed_bracket.BracketIndex(self)
         self._line_num = True # Show line numbers
         self._last_cwidth = 1 # one pixel
 
@@ -232,6 +235,49 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
             self.InsertText(self.GetCurrentPos(), self.GetEOLChar())
             self.LineDown()
 
+    def ApplyEdits(self, edits, text=None, offset=0):
+        """
+        Apply a list of replacements to the buffer as targeted edits in a
+        single undo action. Only the replaced ranges are changed so markers
+        and folding outside of them are kept and the cost depends on the
+        number of edits instead of the size of the buffer.
+        @param edits: list of (start, end, replacement) character offsets
+                      into text, sorted and not overlapping
+        @keyword text: text the offsets refer to (default is the buffers text)
+        @keyword offset: buffer position that the start of text is at
+        @return: change in the length of the document
+        """
+        if not edits:
+            return 0
+
+        if text is None:
+            text = self.GetText()
+
+        # Buffer positions are byte offsets into the utf-8 document so
+        # convert the character offsets by encoding the text between edits.
+        ranges = list()
+        bpos = offset
+        last = 0
+        delta = 0
+        for start, end, value in edits:
+            bpos += len(text[last:start].encode('utf-8'))
+            bstart = bpos
+            bpos += len(text[start:end].encode('utf-8'))
+            ranges.append((bstart, bpos, value))
+            delta += len(value.encode('utf-8')) - (bpos - bstart)
+            last = end
+
+        # Replace from the back so the positions of earlier edits stay valid
+        self.BeginUndoAction()
+        try:
+            for bstart, bend, value in reversed(ranges):
+                self.SetTargetStart(bstart)
+                self.SetTargetEnd(bend)
+                self.ReplaceTarget(value)
+        finally:
+            self.EndUndoAction()
+        return delta
+
     def AutoIndent(self):
         """
         Indent from the current position to match the indentation
@@ -255,7 +301,7 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
                 self.EnsureCaretVisible()
                 return
             indent = self.GetLineIndentation(line)
-            i_space = indent / self.GetTabWidth()
+            i_space = indent // self.GetTabWidth()
             ndent = self.GetEOLChar() + self.GetIndentChar() * i_space
             txt = ndent + ((indent - (self.GetTabWidth() * i_space)) * ' ')
             self.AddText(txt)
@@ -643,6 +689,15 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
         self.OnChanged(wx.stc.StyledTextEvent(wx.stc.wxEVT_STC_CHANGE,
                                               self.GetId()))
 
+    def GetBracketDepth(self, pos):
+        """
+        Get the number of brackets that are open at the given position.
+        Brackets in comments and strings are not counted.
+        @param pos: buffer position
+        @return: int
+        """
+        return self._brackets.GetDepth(pos)
+
     def GetCommandStr(self, line=None, col=None):
         """
         Gets the command string to the left of the autocomp
@@ -674,6 +729,36 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
         """
         return self._code['compsvc']
 
+    def GetContainerStyleRange(self):
+        """
+        Get the range of the text that was modified since the container
+        lexer last ran. Text before the valid end position has the styles
+        that the container lexer last gave it, text after the dirty end
+        position has not been modified since then.
+        @return: (dirty end, valid end) dirty end is -1 if nothing has
+                 been modified
+        """
+        return tuple(self._code['clexrange'])
+
+    def GetMatchingBracket(self, pos):
+        """
+        Get the position of the open bracket that the closing bracket at
+        the given position matches. Unlike BraceMatch this skips over
+        brackets in comments and strings.
+        @param pos: position of a closing bracket
+        @return: buffer position or -1 if there is no match
+        """
+        return self._brackets.GetMatch(pos)
+
+    def GetOpenBracket(self, pos):
+        """
+        Get the position of the innermost bracket that is open at the
+        given position. Brackets in comments and strings are skipped.
+        @param pos: buffer position
+        @return: buffer position or -1 if no bracket is open
+        """
+        return self._brackets.GetOpenBracket(pos)
+
     def GetDocument(self):
         """
         Return a reference to the document object represented in this buffer.
@@ -925,10 +1010,43 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
         wx.PostEvent(self.GetParent(), evt)
         ed_msg.PostMessage(ed_msg.EDMSG_UI_STC_CHANGED, context=self)
 
+    def _UpdateContainerStyleRange(self, evt):
+        """
+        Keep track of the text modified since the container lexer last ran
+        @param evt: wx.stc.EVT_STC_MODIFIED
+        """
+        mtype = evt.GetModificationType()
+        if not mtype & (wx.stc.STC_MOD_INSERTTEXT | wx.stc.STC_MOD_DELETETEXT):
+            return
+
+        pos = evt.GetPosition()
+        length = evt.GetLength()
+        dirty, valid = self._code['clexrange']
+        if mtype & wx.stc.STC_MOD_INSERTTEXT:
+            if dirty > pos:
+                dirty += length
+            if valid > pos:
+                valid += length
+            dirty = max(dirty, pos + length)
+        else:
+            if dirty > pos:
+                dirty = max(pos, dirty - length)
+            if valid > pos:
+                valid = max(pos, valid - length)
+            dirty = max(dirty, pos)
+        self._code['clexrange'] = [dirty, valid]
+
     def OnModified(self, evt):
         """
         Handle modify events, includes style changes!
         """
+        if self._code['clexer'] is not None:
+            self._UpdateContainerStyleRange(evt)
+
+        if evt.GetModificationType() & (wx.stc.STC_MOD_INSERTTEXT |
+                                        wx.stc.STC_MOD_DELETETEXT):
+            self._brackets.Invalidate(evt.GetPosition())
+
         if self.VertEdit.Enabled:
             self.VertEdit.OnModified(evt)
         else:
@@ -939,7 +1057,10 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
         Perform custom styling when registered for a container lexer
         """
         if self._code['clexer'] is not None:
-            self._code['clexer'](self, self.GetEndStyled(), evt.GetPosition())
+            end = evt.GetPosition()
+            self._code['clexer'](self, self.GetEndStyled(), end)
+            dirty = self._code['clexrange'][0]
+            self._code['clexrange'] = [dirty if dirty > end else -1, end]
         else:
             evt.Skip()
 
@@ -1081,6 +1202,8 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
             if self._code['clexer'] is not None:
                 self.Unbind(wx.stc.EVT_STC_STYLENEEDED)
                 self._code['clexer'] = None
+        self._code['clexrange'] = [-1, 0]
+        self._brackets.Reset()
 
         super(EditraBaseStc, self).SetLexer(lexer)
 
@@ -0,0 +1,175 @@
+###############################################################################
+# Name: ed_bracket.py                                                         #
+# Purpose: Bracket nesting index for text buffers                             #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Index of the brackets in a buffer and how they nest. The index is built
+lazily from the start of the buffer up to the positions that are asked for
+and is cut back to the start of the modified line whenever the text of the
+buffer changes. Brackets in comments and strings are left out of the index
+using the styles of the buffer.
+
+@summary: Bracket nesting index
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id: $"
+__revision__ = "$Revision: $"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import re
+import bisect
+
+#-----------------------------------------------------------------------------#
+
+RE_BRACKET = re.compile(br"[()\[\]{}]")
+OPEN_BRACKETS = b"([{"
+CLOSE_BRACKETS = b")]}"
+
+#-----------------------------------------------------------------------------#
+
+class BracketIndex(object):
+    """Bracket nesting index of a buffer. For each bracket in the code of
+    the buffer the index records its position and the entry of the innermost
+    bracket that is still open after it, so that the open brackets at any
+    position can be found with a binary search.
+
+    """
+    def __init__(self, buff):
+        """Create the index
+        @param buff: EditraBaseStc
+
+        """
+        super(BracketIndex, self).__init__()
+
+        # Attributes
+        self._buff = buff
+        self._pos = list()      # Positions of the brackets
+        self._char = list()     # Bracket characters
+        self._after = list()    # Entry of the innermost open bracket after
+        self._valid = 0         # Index is complete up to this position
+
+    def _Before(self, idx):
+        """Get the entry of the innermost open bracket before an entry
+        @param idx: entry index
+        @return: entry index or -1
+
+        """
+        if idx > 0:
+            return self._after[idx - 1]
+        return -1
+
+    def _Update(self, pos):
+        """Extend the index up to the given position
+        @param pos: buffer position
+
+        """
+        pos = min(pos, self._buff.GetLength())
+        if pos <= self._valid:
+            return
+
+        # Brackets are only indexed where the lexer has already styled
+        # the text so that strings and comments can be told apart.
+        if self._buff.GetEndStyled() < pos:
+            self._buff.Colourise(self._buff.GetEndStyled(), pos)
+
+        start = self._valid
+        top = self._after[-1] if self._after else -1
+        text = bytes(self._buff.GetTextRangeRaw(start, pos))
+        for match in RE_BRACKET.finditer(text):
+            bpos = start + match.start()
+            if self._buff.IsComment(bpos + 1) or self._buff.IsString(bpos):
+                continue
+
+            char = text[match.start()]
+            idx = len(self._pos)
+            self._pos.append(bpos)
+            self._char.append(char)
+            if char in OPEN_BRACKETS:
+                top = idx
+            elif top != -1 and \
+                 OPEN_BRACKETS.index(self._char[top]) == \
+                 CLOSE_BRACKETS.index(char):
+                top = self._Before(top)
+            self._after.append(top)
+        self._valid = pos
+
+    def GetDepth(self, pos):
+        """Get the number of brackets that are open at a position
+        @param pos: buffer position
+        @return: int
+
+        """
+        depth = 0
+        idx = self.GetOpenEntry(pos)
+        while idx != -1:
+            depth += 1
+            idx = self._Before(idx)
+        return depth
+
+    def GetOpenEntry(self, pos):
+        """Get the index entry of the innermost bracket open at a position
+        @param pos: buffer position
+        @return: entry index or -1
+
+        """
+        self._Update(pos)
+        idx = bisect.bisect_left(self._pos, pos) - 1
+        if idx < 0:
+            return -1
+        return self._after[idx]
+
+    def GetOpenBracket(self, pos):
+        """Get the position of the innermost bracket open at a position
+        @param pos: buffer position
+        @return: buffer position or -1
+
+        """
+        idx = self.GetOpenEntry(pos)
+        if idx == -1:
+            return -1
+        return self._pos[idx]
+
+    def GetMatch(self, pos):
+        """Get the position of the open bracket that matches the closing
+        bracket at a position.
+        @param pos: position of closing bracket
+        @return: buffer position or -1
+
+        """
+        self._Update(pos + 1)
+        idx = bisect.bisect_left(self._pos, pos)
+        if idx == len(self._pos) or self._pos[idx] != pos or \
+           self._char[idx] not in CLOSE_BRACKETS:
+            return -1
+
+        before = self._Before(idx)
+        if before == -1 or self._after[idx] == before:
+            return -1 # Unmatched closing bracket
+        return self._pos[before]
+
+    def Invalidate(self, pos):
+        """Remove the part of the index from the start of the line of the
+        given position on, as the text or the styles there have changed.
+        @param pos: buffer position
+
+        """
+        pos = self._buff.PositionFromLine(self._buff.LineFromPosition(pos))
+        if pos >= self._valid:
+            return
+
+        idx = bisect.bisect_left(self._pos, pos)
+        del self._pos[idx:]
+        del self._char[idx:]
+        del self._after[idx:]
+        self._valid = pos
+
+    def Reset(self):
+        """Clear the index"""
+        self.Invalidate(0)
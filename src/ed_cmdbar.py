@@ -26,7 +26,10 @@ __revision__ = "$Revision: 70229 $"
 import os
 import sys
 import re
+import time
+import threading
 import wx
+from collections import OrderedDict
 
 # Local Imports
 from . import util
@@ -34,6 +37,7 @@ from . import ed_glob
 from . import ed_search
 from . import ed_event
 from . import ed_msg
+from . import ed_thread
 from . import ebmlib
 from . import eclib
 from . import ed_basewin
@@ -481,6 +485,159 @@ class GotoLineBar(CommandBarBase):
 
 #-----------------------------------------------------------------------------#
 
+class PathCache(object, metaclass=ebmlib.Singleton):
+    """Short lived cache of the directory listings used by the path
+    completion of the L{CommandExecuter}. Listings are dropped when they
+    expire or when the directory monitor sees the directory change so
+    repeated completions in the same directory do not go back to the
+    file system on every keystroke. Directories stop being watched when
+    their listing expires.
+
+    """
+    TTL = 30.0          # Seconds a listing is kept for
+    MAX_DIRS = 16       # Maximum number of cached (and watched) listings
+    MONITOR_FREQ = 2000 # Milliseconds between checks of the watched dirs
+
+    def __init__(self):
+        super(PathCache, self).__init__()
+
+        # Attributes
+        self._lock = threading.Lock()
+        self._listings = OrderedDict()  # key -> (path, time, entries)
+        self._monitor = None
+        self._timer = None              # Timer of the next expiry
+
+    @staticmethod
+    def _GetKey(path):
+        """Get the cache key for a directory path"""
+        return os.path.normcase(os.path.normpath(path))
+
+    def _OnDirChanged(self, added, deleted, modified):
+        """Drop the listings of the directories that have changed
+        @note: callback from the L{ebmlib.DirectoryMonitor}
+
+        """
+        for fobj in added + deleted:
+            self.Invalidate(os.path.dirname(fobj.Path))
+        # Watched directories that were removed themselves
+        for fobj in deleted:
+            self.Invalidate(fobj.Path)
+
+    def _Expire(self):
+        """Drop the listings that have expired and stop watching their
+        directories.
+        @note: called from the expiry timer
+
+        """
+        now = time.time()
+        with self._lock:
+            self._timer = None
+            stale = [ lkey for lkey, entry in self._listings.items()
+                      if now - entry[1] > PathCache.TTL ]
+            remove = [ self._listings.pop(lkey)[0] for lkey in stale ]
+            self._ScheduleExpire(now)
+            monitor = self._monitor
+
+        if monitor is not None:
+            for path in remove:
+                monitor.RemoveDirectory(path)
+
+    def _ScheduleExpire(self, now):
+        """Start the timer for when the oldest listing expires if it is not
+        already running.
+        @param now: current time
+        @note: the lock must be held by the caller
+
+        """
+        if self._timer is None and len(self._listings):
+            oldest = next(iter(self._listings.values()))[1]
+            delay = max(0, oldest + PathCache.TTL - now) + 1.0
+            self._timer = threading.Timer(delay, self._Expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _Watch(self, add, remove):
+        """Update the set of directories watched for changes
+        @param add: path to start watching or None
+        @param remove: list of paths to stop watching
+
+        """
+        with self._lock:
+            if self._monitor is None:
+                self._monitor = ebmlib.DirectoryMonitor(PathCache.MONITOR_FREQ)
+                self._monitor.SubscribeCallback(self._OnDirChanged)
+                self._monitor.StartMonitoring()
+            monitor = self._monitor
+
+        for path in remove:
+            monitor.RemoveDirectory(path)
+        if add is not None:
+            try:
+                monitor.AddDirectory(add)
+            except (AssertionError, OSError):
+                pass
+
+    def GetCachedListing(self, path):
+        """Get the listing of a directory if it is in the cache
+        @param path: directory path
+        @return: list of (name, isdir) or None
+
+        """
+        key = PathCache._GetKey(path)
+        with self._lock:
+            entry = self._listings.get(key, None)
+            if entry is None or time.time() - entry[1] > PathCache.TTL:
+                return None
+            return entry[2]
+
+    def GetListing(self, path):
+        """Get the listing of a directory, reading it from the file system
+        if it is not in the cache. The entry types come from the listing
+        itself so no extra system calls are made per entry.
+        @param path: directory path
+        @return: list of (name, isdir)
+        @raise: OSError if the directory can not be read
+
+        """
+        entries = self.GetCachedListing(path)
+        if entries is not None:
+            return entries
+
+        entries = list()
+        with os.scandir(path) as listing:
+            for entry in listing:
+                try:
+                    isdir = entry.is_dir()
+                except OSError:
+                    isdir = False
+                entries.append((entry.name, isdir))
+
+        key = PathCache._GetKey(path)
+        now = time.time()
+        with self._lock:
+            self._listings[key] = (path, now, entries)
+            self._listings.move_to_end(key)
+            stale = [ lkey for lkey, entry in self._listings.items()
+                      if now - entry[1] > PathCache.TTL ]
+            stale.extend(list(self._listings.keys())[:-PathCache.MAX_DIRS])
+            remove = [ self._listings.pop(lkey)[0] for lkey in set(stale) ]
+            self._ScheduleExpire(now)
+        self._Watch(path, remove)
+        return entries
+
+    def Invalidate(self, path):
+        """Drop the listing of a directory from the cache
+        @param path: directory path
+
+        """
+        with self._lock:
+            entry = self._listings.pop(PathCache._GetKey(path), None)
+            monitor = self._monitor
+        if entry is not None and monitor is not None:
+            monitor.RemoveDirectory(entry[0])
+
+#-----------------------------------------------------------------------------#
+
 class CommandExecuter(eclib.CommandEntryBase):
     """Part of the Vi emulation, opens a minibuffer to execute EX commands.
     @note: based on search ctrl so we get the nice rounded edges on wxmac.
@@ -498,6 +655,8 @@ class CommandExecuter(eclib.CommandEntryBase):
 
         # Attributes
         self._history = dict(cmds=[''], index=-1, lastval='')
+        self._complete = None   # (dir, files, tail, listing, matches)
+        self._pending = set()   # Directories being listed in the background
         if not hasattr(sys, 'frozen'):
             self._curdir = os.path.abspath(os.curdir) + os.sep
         else:
@@ -770,57 +929,103 @@ class CommandExecuter(eclib.CommandEntryBase):
         wins[widx].Raise()
         wx.CallAfter(wins[widx].nb.GetCurrentCtrl().SetFocus)
 
-    def GetPaths(self, path, files=False):
-        """Get a list of paths that are part of the given path by
-        default it will only return directories.
-        @param path: Path to enumerate
-        @keyword files: Get list of files too
+    def _FilterPaths(self, path, files, listing):
+        """Get the completions for a path from the listing of its directory.
+        When the name being completed extends the one of the last call
+        only the previous matches are filtered again.
+        @param path: path being completed
+        @param files: include files in the completions
+        @param listing: list of (name, isdir) of the paths directory
+        @return: sorted list of paths
 
         """
-        def append_slash(path):
-            """Helper function that appends a slash to the path
-            if it's a directory.
-
-            """
-            if os.path.isdir(path) and not path.endswith(os.sep):
-                return path + os.sep
-            return path
-
-        curdir = self._curdir
         head, tail = os.path.split(path)
+        dname = self._GetCompletionDir(path)
+        last = self._complete
+        if last is not None and last[0] == dname and last[1] == files and \
+           last[3] is listing and tail.startswith(last[2]):
+            entries = last[4]
+        else:
+            entries = listing
+
+        matches = [ entry for entry in entries
+                    if entry[0].startswith(tail) and (files or entry[1]) ]
+        self._complete = (dname, files, tail, listing, matches)
+
+        # Add the names back to the original (unexpanded) head
+        candidates = list()
+        for name, isdir in matches:
+            cand = os.path.join(head, name)
+            if isdir and not cand.endswith(os.sep):
+                cand += os.sep
+            candidates.append(cand)
+        return sorted(set(candidates))
+
+    def _GetCompletionDir(self, path):
+        """Get the expanded directory that a path is completed in
+        @param path: path being completed
+        @return: directory path
+
+        """
+        head = os.path.split(path)[0]
         head = os.path.expanduser(head)
         head = os.path.expandvars(head)
-        head = os.path.join(curdir, head)
-        if not os.path.isdir(head):
-            return []
+        return os.path.join(self._curdir, head)
+
+    def _OnListingDone(self, dname, error):
+        """Update the completions once a directory has been read in the
+        background.
+        @param dname: directory that was listed
+        @param error: Exception raised while listing the directory or None
+
+        """
+        if not self:
+            return
+
+        self._pending.discard(dname)
+        if error is not None:
+            self._ReportListingError(dname, error)
+        else:
+            self.ListDir()
 
-        # Return empty list of user does not have
-        # read access to the directory
-        if not os.access(head, os.R_OK):
+    def _ReportListingError(self, dname, error):
+        """Notify the user of a directory that could not be listed
+        @param dname: directory path
+        @param error: OSError
+
+        """
+        if isinstance(error, (FileNotFoundError, NotADirectoryError)):
+            return
+        elif isinstance(error, PermissionError):
             ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT,
                               (ed_glob.SB_INFO,
-                               _("Access Denied: %s") % head))
+                               _("Access Denied: %s") % dname))
             wx.Bell() # Beep to alert
-            return list()
-
-        # We expanded head, so trim the suggestion list of its head
-        # so we can add the tail of the suggestion back to the original head
-        try:
-            candidates = [os.path.basename(p) for p in os.listdir(head)
-                          if p.startswith(tail)]
-            candidates = [append_slash(os.path.join(os.path.dirname(path), cand))
-                          for cand in candidates]
-            if not files:
-                candidates = [cand for cand in candidates if os.path.isdir(cand)]
-        except OSError:
+        else:
             ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT,
                                (ed_glob.SB_INFO, _("Invalid Path")))
-            candidates = list()
 
-        return sorted(list(set(candidates)))
+    def GetPaths(self, path, files=False):
+        """Get a list of paths that are part of the given path by
+        default it will only return directories.
+        @param path: Path to enumerate
+        @keyword files: Get list of files too
+
+        """
+        dname = self._GetCompletionDir(path)
+        try:
+            listing = PathCache().GetListing(dname)
+        except OSError as msg:
+            self._ReportListingError(dname, msg)
+            return list()
+        return self._FilterPaths(path, files, listing)
 
     def ListDir(self):
-        """List the next directory from the current cmd path"""
+        """List the next directory from the current cmd path. Directories
+        that are not in the L{PathCache} are read in the background and the
+        list is updated when they are ready.
+
+        """
         cmd = self.GetValue()
         if cmd.startswith('cd '):
             cstr = 'cd '
@@ -830,7 +1035,19 @@ class CommandExecuter(eclib.CommandEntryBase):
             return
 
         cmd = cmd.replace(cstr, '', 1).strip()
-        paths = self.GetPaths(cmd, cstr == 'e ')
+        dname = self._GetCompletionDir(cmd)
+        listing = PathCache().GetCachedListing(dname)
+        if listing is None:
+            if dname not in self._pending:
+                self._pending.add(dname)
+                job = ed_thread.EdThreadPool().SubmitJob(
+                                            ed_thread.PRIORITY_INTERACTIVE,
+                                            PathCache().GetListing, dname)
+                job.AddDoneCallback(lambda job: wx.CallAfter(
+                                    self._OnListingDone, dname, job.GetError()))
+            return
+
+        paths = self._FilterPaths(cmd, cstr == 'e ', listing)
         self._popup.SetChoices(paths)
         if len(paths):
             self._popup.SetupPosition(self)
@@ -27,11 +27,14 @@ from . import ed_menu
 from . import ed_msg
 from . import ed_stc
 from . import ed_tab
+from .ed_fwatch import EdFileWatcher
 from .doctools import DocPositionMgr
 from .profiler import Profile_Get
 from .util import Log, SetClipboardText
 from .syntax import synglob
-from .ebmlib import GetFileModTime, ContextMenuManager, GetFileName
+from .syntax import syntax
+from .ebmlib import GetFileModTime, GetFileSize, ContextMenuManager, GetFileName
+from .ed_txt import BOM
 
 # External libs
 from .extern.stcspellcheck import STCSpellCheck
@@ -95,6 +98,11 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         self._spell = STCSpellCheck(self, check_region=self.IsNonCode)
         self._caret_w = 1
         self._focused = True
+        self._deferred = False  # File load deferred till tab is activated
+        self._watched = ''      # Path registered with the file watcher
+        self._fstate = None     # Pending file state change notification
+        self._restyle = None    # Pending style sheet update (see UpdateAllStyles)
+        self._sesstate = None   # Session record to restore the buffer from
         spref = Profile_Get('SPELLCHECK', default=dict())
         self._spell_data = dict(choices=list(),
                                 word=('', -1, -1),
@@ -139,6 +147,8 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         """
         if evt.Id == self.Id:
             ed_msg.Unsubscribe(self.OnConfigMsg)
+            if self._watched:
+                EdFileWatcher().Unwatch(self._watched, self.OnFileStateChanged)
         evt.Skip()
 
     # ---- EdTab Methods ----
@@ -155,10 +165,14 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         """
         Check if the file has been modified and prompt a warning
         """
-        # Don't check while the file is loading
-        if self.IsLoading():
+        # Don't check while the file is loading or has not been loaded yet
+        if self.IsLoading() or self._deferred:
             return
 
+        # Apply style changes that were made while the buffer was hidden
+        if self._restyle is not None and self.IsShownOnScreen():
+            self._ApplyPendingStyles()
+
         # Handle hiding and showing the caret when the window gets loses focus
         cfocus = self.FindFocus()
         if not self._focused and cfocus is self:
@@ -170,28 +184,31 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
             self._focused = False
             self.CallTipCancel()
 
-        # Check for changes to on disk file
-        if not self._has_dlg and Profile_Get('CHECKMOD'):
-            cfile = self.GetFileName()
-            lmod = GetFileModTime(cfile)
-            mtime = self.GetModTime()
-            if mtime and not lmod and not os.path.exists(cfile):
-                # File was deleted since last check
-                wx.CallAfter(self.PromptToReSave, cfile)
-            elif mtime < lmod:
-                # Check if we should automatically reload the file or not
-                if Profile_Get('AUTO_RELOAD', default=False) and \
-                   not self.GetModify():
-                    wx.CallAfter(self.DoReloadFile)
-                else:
-                    wx.CallAfter(self.AskToReload, cfile)
-
-        # Check for changes to permissions
-        if self.File.IsReadOnly() != self._ro_img:
-            self._nb.SetPageBitmap(self.GetTabIndex(), self.GetTabImage())
-            self._nb.Refresh()
-        else:
-            pass
+        cfile = self.GetFileName()
+
+        # Handle changes to the on disk file reported by the file watcher
+        # (not while a save is writing the file, it updates the mod time)
+        state = self._fstate
+        if state is not None and not self._has_dlg and not self.IsSaving():
+            self._fstate = None
+            if Profile_Get('CHECKMOD'):
+                mtime = self.GetModTime()
+                if mtime and not state.Exists:
+                    # File was deleted since last check
+                    wx.CallAfter(self.PromptToReSave, cfile)
+                elif mtime < state.ModTime:
+                    # Check if we should automatically reload the file or not
+                    if Profile_Get('AUTO_RELOAD', default=False) and \
+                       not self.GetModify():
+                        wx.CallAfter(self.DoReloadFile)
+                    else:
+                        wx.CallAfter(self.AskToReload, cfile)
+
+            # Check for changes to permissions
+            readonly = state.ReadOnly or self.File.IsRawBytes()
+            if state.Exists and readonly != self._ro_img:
+                self._nb.SetPageBitmap(self.GetTabIndex(), self.GetTabImage())
+                self._nb.Refresh()
 
         # Handle Low(er) priority idle events
         self._lprio += 1
@@ -207,6 +224,46 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
                 # Ensure calltips are not shown when this is a background tab.
                 self.CallTipCancel()
 
+    def _UpdateFileWatch(self, path):
+        """
+        Move the file watch registration of this buffer to the given path.
+        Changes to the file since the modtime of the buffer are reported.
+        @param path: file path or empty string to stop watching
+        """
+        watcher = EdFileWatcher()
+        if self._watched:
+            watcher.Unwatch(self._watched, self.OnFileStateChanged)
+        self._watched = path
+        self._fstate = None
+        if path:
+            watcher.Watch(path, self.OnFileStateChanged, self.GetModTime())
+
+    def _FinishSave(self, path, result, modcount):
+        """
+        Update the buffer after its text was written to disk and move the
+        file watch to the saved file when it was saved under a new name.
+        """
+        super(EdEditorView, self)._FinishSave(path, result, modcount)
+        if result and path != self._watched:
+            self._UpdateFileWatch(path)
+
+    def WatchFile(self):
+        """
+        Register the file of the buffer with the file watcher. Called once
+        the file has been loaded so that changes to it are noticed whether
+        the tab has been shown or not.
+        """
+        self._UpdateFileWatch(self.GetFileName())
+
+    def OnFileStateChanged(self, state):
+        """
+        Callback from the file watcher when the on disk file changes. The
+        change is handled on the next idle check.
+        @param state: ebmlib.FileState
+        """
+        if self and state.Path == self.GetFileName():
+            self._fstate = state
+
     @modalcheck
     def DoReloadFile(self):
         """
@@ -243,7 +300,8 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         """
         Save the current position in the buffer to reset on next load
         """
-        if len(self.GetFileName()) > 1:
+        # Deferred buffers have not changed the stored position
+        if len(self.GetFileName()) > 1 and not self._deferred:
             EdEditorView.DOCMGR.AddRecord([self.GetFileName(),
                                            self.GetCurrentPos()])
 
@@ -258,8 +316,33 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         Performs updates that need to happen when this tab is selected
         """
         Log('[ed_editv][info] Tab has file: %s' % self.GetFileName())
+        self._ApplyPendingStyles()
         self.PostPositionEvent()
 
+    def UpdateAllStyles(self, spec_style=None):
+        """
+        Refreshes all the styles of the buffer. Buffers that are not shown
+        only record the request and are restyled when they are next selected
+        so that theme changes don't re-lex every open document at once.
+        @keyword spec_style: style scheme name
+        """
+        if self._deferred or self.IsShownOnScreen():
+            # Deferred buffers are empty so restyling them costs nothing
+            self._restyle = None
+            super(EdEditorView, self).UpdateAllStyles(spec_style)
+        else:
+            # Keep the last requested style sheet over a plain refresh
+            self._restyle = spec_style or self._restyle or ''
+
+    def _ApplyPendingStyles(self):
+        """
+        Apply a style update that was deferred by L{UpdateAllStyles}
+        """
+        if self._restyle is not None:
+            spec_style = self._restyle or None
+            self._restyle = None
+            super(EdEditorView, self).UpdateAllStyles(spec_style)
+
     def GetName(self):
         """
         Gets the unique name for this tab control.
@@ -272,7 +355,11 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         Get the Bitmap to use for the tab
         @return: wx.Bitmap (16x16)
         """
-        if self.GetDocument().ReadOnly:
+        if self._deferred:
+            # Resolve the icon from the extension without touching the disk
+            lang_id = syntax.GetIdFromExt(self.File.GetExtension())
+            return wx.ArtProvider.GetBitmap(str(lang_id), wx.ART_MENU)
+        elif self.GetDocument().ReadOnly:
             self._ro_img = True
             bmp = wx.ArtProvider.GetBitmap(str(ed_glob.ID_READONLY), wx.ART_MENU)
         else:
@@ -284,6 +371,111 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
                 bmp = wx.ArtProvider.GetBitmap(str(synglob.ID_LANG_TXT), wx.ART_MENU)
         return bmp
 
+    def DeferLoad(self, path, state=None):
+        """
+        Associate the buffer with the given file without reading it. The
+        file is loaded by the notebook the first time the tab is needed.
+        @param path: file path
+        @keyword state: session record to restore the buffer with
+        """
+        self.SetFileName(path)
+        self._sesstate = state
+        self._deferred = True
+
+    def ClearDeferredLoad(self):
+        """
+        Mark the deferred load of this buffer as handled
+        """
+        self._deferred = False
+
+    def IsLoadDeferred(self):
+        """
+        Is the loading of this buffers file still pending
+        @return: bool
+        """
+        return self._deferred
+
+    def GetSessionState(self):
+        """
+        Get the record of this buffer to store in a session file. The
+        encoding and lexer are only recorded when the buffer is in sync with
+        the file on disk.
+        @return: dict
+        """
+        path = self.GetFileName()
+        if self._deferred:
+            # Not loaded yet so the state from the last session still applies
+            state = dict(self._sesstate or dict())
+            state['path'] = path
+            return state
+
+        state = dict(path=path,
+                     caret=self.GetCurrentPos(),
+                     first_line=self.GetFirstVisibleLine(),
+                     folds=list())
+        line = self.ContractedFoldNext(0)
+        while line >= 0:
+            state['folds'].append(line)
+            line = self.ContractedFoldNext(line + 1)
+
+        mtime = GetFileModTime(path)
+        if mtime and mtime == self.GetModTime() and not self.File.IsRawBytes():
+            state.update(mtime=mtime,
+                         size=GetFileSize(path),
+                         encoding=self.File.GetEncoding(),
+                         bom=self.File.HasBom(),
+                         lang_id=self.GetLangId())
+        return state
+
+    def PrepareSessionLoad(self):
+        """
+        Prepare to load the file of a buffer restored from a session. If the
+        file has not changed since the session was saved the recorded
+        encoding is set on the file so that it is not detected again.
+        @return: file extension to configure the lexer with or None to
+                 detect the lexer from the file
+        """
+        state = self._sesstate
+        if not state:
+            return None
+
+        path = self.GetFileName()
+        if state.get('mtime') != GetFileModTime(path) or \
+           state.get('size') != GetFileSize(path) or \
+           not state.get('encoding'):
+            return None
+
+        enc = state['encoding']
+        self.File.SetEncoding(enc)
+        self.File.bom = BOM.get(enc, None) if state.get('bom') else None
+        ext = syntax.GetExtFromId(state.get('lang_id', 0))
+        return ext or None
+
+    def RestoreSessionView(self):
+        """
+        Restore the caret, scroll and fold state recorded in the session
+        once the file has been loaded.
+        @return: bool (False if there was no state to restore)
+        """
+        state = self._sesstate
+        self._sesstate = None
+        if not state or 'caret' not in state:
+            return False
+
+        folds = state.get('folds', list())
+        if folds:
+            # Fold levels are only known once the lexer has run
+            self.Colourise(0, self.GetLineEndPosition(max(folds)))
+            for line in folds:
+                if self.GetFoldLevel(line) & wx.stc.STC_FOLDLEVELHEADERFLAG and \
+                   self.GetFoldExpanded(line):
+                    self.ToggleFold(line)
+
+        self.SetCaretPos(min(state.get('caret', 0), self.GetLength()))
+        self.SetFirstVisibleLine(state.get('first_line', 0))
+        self.ScrollToColumn(0)
+        return True
+
     def GetTabMenu(self):
         """
         Get the tab menu
@@ -362,12 +554,12 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         if e_id == EdEditorView.ID_ADD_TO_DICT:
             # Permanently add to users spelling dictionary
             if spelld:
-                spelld.add(self._spell_data['word'][0])
+                self._spell.addToDictionary(self._spell_data['word'][0])
                 self.RefreshSpellcheck()
         elif e_id == EdEditorView.ID_IGNORE:
             # Ignore spelling for this session
             if spelld:
-                spelld.add_to_session(self._spell_data['word'][0])
+                self._spell.ignoreWord(self._spell_data['word'][0])
                 self.RefreshSpellcheck()
         else:
             replace = None
@@ -610,6 +802,34 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         else:
             self.SetModTime(0)
 
+    @modalcheck
+    def PromptToRestore(self):
+        """
+        Offer to restore the automatic backup of the file if it holds
+        changes that were not saved.
+        """
+        if not self:
+            return
+        text = self.GetNewerBackup()
+        if text is None:
+            return
+
+        mdlg = wx.MessageDialog(self,
+                                _('A backup of %s with unsaved changes '
+                                  'was found.\n\nWould you like to '
+                                  'restore it?') % self.GetFileName(),
+                                _('Restore Backup?'),
+                                wx.YES_NO | wx.ICON_INFORMATION)
+        mdlg.CenterOnParent()
+        result = mdlg.ShowModal()
+        mdlg.Destroy()
+        if result == wx.ID_YES:
+            cpos = self.GetCurrentPos()
+            self.SetText(text)
+            self.GotoPos(min(cpos, self.GetLength()))
+        else:
+            self.RemoveBackup()
+
     @modalcheck
     def AskToReload(self, cfile):
         """
@@ -667,11 +887,13 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         result = dlg.ShowModal()
         dlg.Destroy()
 
-        # HACK
+        # The buffer is about to be closed so wait for it to be written
         if result == wx.ID_YES:
-            evt = wx.MenuEvent(wx.wxEVT_COMMAND_MENU_SELECTED, ed_glob.ID_SAVE)
             tlw = self.GetTopLevelParent()
-            if hasattr(tlw, 'OnSave'):
-                tlw.OnSave(evt)
+            if hasattr(tlw, 'SaveFile'):
+                tlw.SaveFile(self.GetTabLabel(), self, wait=True)
+        elif result == wx.ID_NO:
+            # The unsaved changes are discarded with their backup
+            self.RemoveBackup()
 
         return result
@@ -0,0 +1,386 @@
+###############################################################################
+# Name: ed_export.py                                                          #
+# Purpose: Batch export of files to the generator document formats            #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Batch exporter that converts a set of files or directory trees to the styled
+Html, LaTeX or Rtf documents produced by the L{generator} plugins without
+showing any user interface.
+
+The files are distributed across a pool of worker processes. Each worker
+creates a hidden buffer once and then lexes and styles each file with the
+same syntax definitions and style sheets as the editor does, so the output
+is identical to that of the Generator menu. Generated documents are cached
+by the hash of the file contents, file name, style sheet, fonts, encoding
+setting and output format so unchanged files are copied from the cache on
+later runs.
+
+@summary: Headless batch export to the generator formats
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id: ed_export.py $"
+__revision__ = "$Revision: $"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+import shutil
+import hashlib
+import multiprocessing
+import wx
+
+# Local Imports
+from . import ed_glob
+from . import ed_style
+from . import profiler
+from . import ed_basestc
+from . import plugin
+from . import generator
+from .syntax import syntax
+from .syntax import synglob
+
+#-----------------------------------------------------------------------------#
+# Globals
+
+# Format -> (generator class name, output file extension)
+EXPORT_FORMATS = { 'html' : ('Html', '.html'),
+                   'tex'  : ('LaTeX', '.tex'),
+                   'rtf'  : ('Rtf', '.rtf') }
+
+EXPORT_OK = 0       # Document was generated
+EXPORT_CACHED = 1   # Document was copied from the cache
+EXPORT_FAILED = 2   # Document could not be generated
+
+_WORKER = None      # Per process ExportWorker
+
+#-----------------------------------------------------------------------------#
+
+class ExportApp(wx.App):
+    """Minimal application object for running the generators without the
+    editor's main window.
+
+    """
+    def OnInit(self):
+        self.SetAppName(ed_glob.PROG_NAME)
+        self.pmgr = plugin.PluginManager()
+        return True
+
+    def GetLog(self):
+        return lambda msg, *args: None
+
+    def GetPluginManager(self):
+        return self.pmgr
+
+#-----------------------------------------------------------------------------#
+
+class ExportCache(object):
+    """On disk cache of generated documents keyed by a hash of the source
+    contents and everything else that affects the generated output.
+
+    """
+    def __init__(self, path):
+        """Create the cache
+        @param path: cache directory (None to disable caching)
+
+        """
+        super(ExportCache, self).__init__()
+
+        # Attributes
+        self._path = path
+
+    def _GetPath(self, key):
+        """Get the path of a cache entry"""
+        return os.path.join(self._path, key[:2], key)
+
+    def GetKey(self, data, fname, sheet_hash, fmt, settings):
+        """Get the cache key of a document
+        @param data: source file contents (bytes)
+        @param fname: source file name (used in the generated document)
+        @param sheet_hash: hash of the style sheet
+        @param fmt: export format
+        @param settings: string of the profile settings that change the
+                         generated document (see L{GetExportSettings})
+        @return: string
+
+        """
+        digest = hashlib.sha1(data)
+        digest.update(("\0%s\0%s\0%s\0%s\0%s" % (fname, sheet_hash, fmt,
+                                                 settings, ed_glob.VERSION)
+                      ).encode('utf-8'))
+        return digest.hexdigest()
+
+    def Fetch(self, key, dest):
+        """Copy a cached document to the destination
+        @param key: cache key
+        @param dest: destination path
+        @return: bool (False if the document is not in the cache)
+
+        """
+        if self._path is None:
+            return False
+
+        path = self._GetPath(key)
+        if not os.path.exists(path):
+            return False
+
+        try:
+            _AtomicCopy(path, dest)
+        except (IOError, OSError):
+            return False
+        return True
+
+    def Store(self, key, path):
+        """Add a generated document to the cache
+        @param key: cache key
+        @param path: path of the generated document
+
+        """
+        if self._path is None:
+            return
+
+        try:
+            cpath = self._GetPath(key)
+            os.makedirs(os.path.dirname(cpath), exist_ok=True)
+            _AtomicCopy(path, cpath)
+        except (IOError, OSError):
+            pass
+
+#-----------------------------------------------------------------------------#
+
+class ExportWorker(object):
+    """Generates the documents in a worker process using a single hidden
+    buffer that is reused for each file.
+
+    """
+    def __init__(self, config, profile, sheet, fmt, cache_dir):
+        """Initialize the worker
+        @param config: ed_glob.CONFIG of the parent process
+        @param profile: user profile loaded by the parent process
+        @param sheet: path to style sheet (None for the default styles)
+        @param fmt: export format
+        @param cache_dir: cache directory (None to disable caching)
+
+        """
+        super(ExportWorker, self).__init__()
+
+        ed_glob.CONFIG.update(config)
+        profiler.TheProfile.Update(profile)
+
+        # Attributes
+        self.app = ExportApp(False)
+        self.frame = wx.Frame(None)
+        self.stc = ed_basestc.EditraBaseStc(self.frame)
+        self.cache = ExportCache(cache_dir)
+        self.fmt = fmt
+        self.sheet_hash = GetStyleSheetHash(sheet)
+        gen_cls = getattr(generator, EXPORT_FORMATS[fmt][0])
+        self.gen = gen_cls(self.app.GetPluginManager())
+
+        if sheet is not None:
+            self.stc.LoadStyleSheet(sheet, force=True)
+        self.settings = GetExportSettings(self.stc)
+
+    def Export(self, src, dest):
+        """Export a single file
+        @param src: source file path
+        @param dest: destination file path
+        @return: (src, dest, EXPORT_*, error message)
+
+        """
+        try:
+            with open(src, 'rb') as handle:
+                data = handle.read()
+        except (IOError, OSError) as msg:
+            return (src, dest, EXPORT_FAILED, str(msg))
+
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+        key = self.cache.GetKey(data, os.path.basename(src),
+                                self.sheet_hash, self.fmt, self.settings)
+        if self.cache.Fetch(key, dest):
+            return (src, dest, EXPORT_CACHED, '')
+
+        stc = self.stc
+        if not stc.LoadFile(src):
+            return (src, dest, EXPORT_FAILED, stc.File.GetLastError())
+        stc.FindLexer()
+        stc.Colourise(0, -1)
+
+        tmp = dest + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as handle:
+                self.gen.Write(stc, handle)
+            os.replace(tmp, dest)
+        except Exception as msg:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return (src, dest, EXPORT_FAILED, str(msg))
+        finally:
+            stc.ClearAll()
+            stc.EmptyUndoBuffer()
+
+        self.cache.Store(key, dest)
+        return (src, dest, EXPORT_OK, '')
+
+#-----------------------------------------------------------------------------#
+# Worker process entry points
+
+def _InitWorker(config, profile, sheet, fmt, cache_dir):
+    """Worker process initializer"""
+    global _WORKER
+    _WORKER = ExportWorker(config, profile, sheet, fmt, cache_dir)
+
+def _ExportJob(job):
+    """Worker process job function
+    @param job: (source path, destination path)
+
+    """
+    return _WORKER.Export(*job)
+
+def _AtomicCopy(src, dest):
+    """Copy a file so that the destination is never seen partially written"""
+    tmp = dest + '.tmp'
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+#-----------------------------------------------------------------------------#
+
+def CollectFiles(paths, dest, fmt, all_files=False):
+    """Collect the export jobs for the given files and directories. The
+    directory structure of the sources is mirrored in the destination.
+    @param paths: list of file and directory paths
+    @param dest: output directory
+    @param fmt: export format
+    @keyword all_files: include files that have no registered file type
+    @return: list of (source path, destination path)
+
+    """
+    ext = EXPORT_FORMATS[fmt][1]
+    jobs = list()
+
+    def AddFile(path, rel):
+        fext = os.path.splitext(path)[1][1:]
+        if all_files or syntax.GetIdFromExt(fext) != synglob.ID_LANG_TXT:
+            jobs.append((path, os.path.join(dest, rel + ext)))
+
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(dname for dname in dirs
+                                 if not dname.startswith('.'))
+                for fname in sorted(files):
+                    fpath = os.path.join(root, fname)
+                    AddFile(fpath, os.path.relpath(fpath, path))
+        elif os.path.isfile(path):
+            AddFile(path, os.path.basename(path))
+    return jobs
+
+def GetExportSettings(stc):
+    """Get the profile settings that change the generated documents, the
+    fonts that the styles and the Html css and LaTeX preamble use and the
+    encoding files are read with.
+    @param stc: buffer the documents are generated from
+    @return: string
+
+    """
+    fonts = stc.GetFontDictionary()
+    return repr((sorted(fonts.items()), profiler.Profile_Get('ENCODING')))
+
+def GetStyleSheetHash(sheet):
+    """Get the hash of a style sheets contents
+    @param sheet: style sheet path or None
+    @return: string
+
+    """
+    if sheet is None:
+        return 'default'
+    with open(sheet, 'rb') as handle:
+        return hashlib.sha1(handle.read()).hexdigest()
+
+def BatchExport(paths, dest, fmt='html', style=None, jobs=0,
+                cache_dir=None, all_files=False, callback=None):
+    """Export the given files and directories to a generator format.
+    @param paths: list of file and directory paths
+    @param dest: output directory
+    @keyword fmt: export format (see EXPORT_FORMATS)
+    @keyword style: style sheet name (None for the profiles style sheet)
+    @keyword jobs: number of worker processes (0 for one per cpu)
+    @keyword cache_dir: result cache directory (None to disable caching)
+    @keyword all_files: include files that have no registered file type
+    @keyword callback: callable(src, dest, EXPORT_*, error message) called
+                       as each file finishes
+    @return: dict of EXPORT_* -> number of files
+
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("Unknown export format: %s" % fmt)
+
+    sheet = ed_style.StyleMgr.GetStyleSheet(style)
+    if style and sheet is None:
+        raise ValueError("Unknown style sheet: %s" % style)
+
+    todo = CollectFiles(paths, dest, fmt, all_files)
+    results = { EXPORT_OK : 0, EXPORT_CACHED : 0, EXPORT_FAILED : 0 }
+    if not todo:
+        return results
+
+    nproc = min(jobs or multiprocessing.cpu_count(), len(todo))
+    chunk = max(1, min(16, len(todo) // (nproc * 4)))
+
+    # The workers each need their own gui toolkit instance so they are
+    # started fresh instead of being forked from this process.
+    ctx = multiprocessing.get_context('spawn')
+    pool = ctx.Pool(nproc, _InitWorker,
+                    (dict(ed_glob.CONFIG), dict(profiler.TheProfile),
+                     sheet, fmt, cache_dir))
+    try:
+        for result in pool.imap_unordered(_ExportJob, todo, chunk):
+            results[result[2]] += 1
+            if callback is not None:
+                callback(*result)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+def Main(opts, args):
+    """Run a batch export from the command line options
+    @param opts: dict of command line options
+    @param args: list of files and directories to export
+    @return: process exit code
+
+    """
+    fmt = opts.get('--export', 'html').lower()
+    dest = os.path.abspath(opts.get('--output', os.getcwd()))
+    jobs = opts.get('--jobs', '0')
+    if not jobs.isdigit():
+        sys.stderr.write("error: --jobs requires a number\n")
+        return 1
+
+    cache_dir = None
+    if '--no-cache' not in opts and ed_glob.CONFIG['CACHE_DIR']:
+        cache_dir = os.path.join(ed_glob.CONFIG['CACHE_DIR'], 'export')
+
+    def Report(src, dest, status, msg):
+        if status == EXPORT_FAILED:
+            sys.stderr.write("failed: %s (%s)\n" % (src, msg))
+
+    try:
+        results = BatchExport(args, dest, fmt, opts.get('--style'),
+                              int(jobs), cache_dir, '--all' in opts, Report)
+    except ValueError as msg:
+        sys.stderr.write("error: %s\n" % msg)
+        return 1
+
+    print("Exported %d, cached %d, failed %d" % (results[EXPORT_OK],
+                                                 results[EXPORT_CACHED],
+                                                 results[EXPORT_FAILED]))
+    return int(results[EXPORT_FAILED] > 0)
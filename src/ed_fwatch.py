@@ -0,0 +1,82 @@
+###############################################################################
+# Name: ed_fwatch.py                                                          #
+# Purpose: Provides the shared file change monitor for open buffers           #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Implements the application wide file watcher that monitors the on disk files
+of all open buffers. All file system access is done on a single background
+thread and changes are pushed to the interested clients on the main thread.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id: ed_fwatch.py $"
+__revision__ = "$Revision: $"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import wx
+
+# Local Imports
+from . import ebmlib
+
+#-----------------------------------------------------------------------------#
+
+class EdFileWatcher(ebmlib.FileMonitor, metaclass=ebmlib.Singleton):
+    """Singleton FileMonitor for the files of open buffers"""
+    def __init__(self):
+        super(EdFileWatcher, self).__init__(checkFreq=1000.0)
+
+        # Attributes
+        self._clients = dict() # path -> [callable(FileState),]
+
+        self.SubscribeCallback(self._OnFilesChanged)
+
+    def _OnFilesChanged(self, modified, deleted, permissions):
+        """Dispatch change notifications to the clients of each file
+        @param modified: list of ebmlib.FileState
+        @param deleted: list of ebmlib.FileState
+        @param permissions: list of ebmlib.FileState
+
+        """
+        for state in modified + deleted + permissions:
+            for client in list(self._clients.get(state.Path, list())):
+                client(state)
+
+    def Watch(self, path, client, modtime=0):
+        """Start watching the given file for a client
+        @param path: file path
+        @param client: callable(ebmlib.FileState)
+        @keyword modtime: modtime of the file when the client loaded it,
+                          the client is notified if the file changed since
+
+        """
+        self._clients.setdefault(path, list()).append(client)
+        state = self.GetFileState(path)
+        self.AddFile(path, modtime)
+        if modtime and state is not None and state.Exists is not None and \
+           (not state.Exists or state.ModTime != modtime):
+            # Already watched for another client so the first check that
+            # compares with the modtime has been done.
+            wx.CallAfter(client, state)
+        if not self.Monitoring:
+            self.StartMonitoring()
+
+    def Unwatch(self, path, client):
+        """Stop watching the given file for a client
+        @param path: file path
+        @param client: callable that was passed to L{Watch}
+
+        """
+        clients = self._clients.get(path, list())
+        if client in clients:
+            clients.remove(client)
+            self.RemoveFile(path)
+            if not clients:
+                del self._clients[path]
+
+#-----------------------------------------------------------------------------#
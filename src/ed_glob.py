@@ -160,6 +160,7 @@ ID_PREF_AUTOBKUP = wx.NewId()
 ID_PREF_AUTO_RELOAD = wx.NewId()
 ID_PREF_AUTOCOMPEX = wx.NewId()
 ID_PREF_AUTOTRIM = wx.NewId()
+ID_PREF_AUTOTRIM_MOD = wx.NewId()
 ID_PREF_CHKMOD = wx.NewId()
 ID_PREF_CHKUPDATE = wx.NewId()
 ID_PREF_DLEXER = wx.NewId()
@@ -342,6 +343,7 @@ ID_2_PROF = {
              ID_AUTOINDENT: 'AUTO_INDENT',
              ID_PREF_AUTO_RELOAD: 'AUTO_RELOAD',
              ID_PREF_AUTOTRIM: 'AUTO_TRIM_WS',
+             ID_PREF_AUTOTRIM_MOD: 'AUTO_TRIM_WS_MODIFIED',
              ID_BRACKETHL: 'BRACKETHL',
              ID_PREF_CHKMOD: 'CHECKMOD',
              ID_PREF_CHKUPDATE: 'CHECKUPDATE',
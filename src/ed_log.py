@@ -32,6 +32,7 @@ from src import plugin
 from src.profiler import Profile_Get
 from src import ed_glob
 from src import ed_basewin
+from src import ed_thread
 
 # -----------------------------------------------------------------------------
 # Globals
@@ -117,6 +118,7 @@ class LogViewer(ed_basewin.EdBaseCtrlBox):
         self.SetWindow(self._buffer)
         self._srcfilter = None
         self._clear = None
+        self._jobs = None
 
         # Layout
         self.__DoLayout()
@@ -124,6 +126,8 @@ class LogViewer(ed_basewin.EdBaseCtrlBox):
         # Event Handlers
         self.Bind(wx.EVT_BUTTON,
                   lambda evt: self._buffer.Clear(), self._clear)
+        self.Bind(wx.EVT_BUTTON,
+                  lambda evt: ed_thread.EdThreadPool().LogStats(), self._jobs)
         self.Bind(wx.EVT_CHOICE, self.OnChoice, self._srcfilter)
         self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
 
@@ -152,6 +156,7 @@ class LogViewer(ed_basewin.EdBaseCtrlBox):
 
         # Clear Button
         ctrlbar.AddStretchSpacer()
+        self._jobs = self.AddPlateButton(_('Job Stats'), align=wx.ALIGN_RIGHT)
         self._clear = self.AddPlateButton(_('Clear'), ed_glob.ID_DELETE,
                                           wx.ALIGN_RIGHT)
         
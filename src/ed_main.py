@@ -46,6 +46,8 @@ from . import plugin
 from . import ed_fmgr
 from . import perspective as viewmgr
 from . import ed_session
+from . import ed_txt
+from . import ed_stc
 from . import iface
 from . import ebmlib
 from . import eclib
@@ -617,28 +619,45 @@ class MainWindow(wx.Frame, viewmgr.PerspectiveManager):
         else:
             evt.Skip()
 
-    def SaveFile(self, tablbl, buf):
+    def SaveFile(self, tablbl, buf, wait=False):
         """
-        Save the given page in the notebook
+        Save the given page in the notebook. The file is written in the
+        background unless wait is set.
         @param tablbl: main notebook tab label
         @param buf: EdEditView instance
+        @keyword wait: wait for the file to be written before returning
         @note: intended for internal use! method signature may change
         """
         fname = ebmlib.GetFileName(buf.GetFileName())
         if fname != '':
             fpath = buf.GetFileName()
-            result = buf.SaveFile(fpath)
             self._last_save = fpath
-            if result:
-                self.PushStatusText(_('Saved File: %s') % fname, SB_INFO)
+            if wait:
+                self._OnBufferSaved(buf, fname, buf.SaveFile(fpath))
             else:
-                err = buf.GetDocument().GetLastError()
-                self.PushStatusText(_('ERROR: %s') % err, SB_INFO)
-                ed_mdlg.SaveErrorDlg(self, fname, err)
-                buf.GetDocument().ResetAll()
+                buf.SaveFileAsync(fpath, lambda result:
+                                  self._OnBufferSaved(buf, fname, result))
         else:
             self.OnSaveAs(ID_SAVEAS, tablbl, buf)
 
+    def _OnBufferSaved(self, buf, fname, result):
+        """
+        Report the result of saving a buffer
+        @param buf: EdEditView instance
+        @param fname: name of the saved file
+        @param result: whether the file was written or not
+        """
+        if not self:
+            return
+
+        if result:
+            self.PushStatusText(_('Saved File: %s') % fname, SB_INFO)
+        else:
+            err = buf.GetDocument().GetLastError()
+            self.PushStatusText(_('ERROR: %s') % err, SB_INFO)
+            ed_mdlg.SaveErrorDlg(self, fname, err)
+            buf.GetDocument().ResetAll()
+
     def SaveCurrentBuffer(self):
         """
         Save the file in the currently selected editor buffer
@@ -648,7 +667,8 @@ class MainWindow(wx.Frame, viewmgr.PerspectiveManager):
 
     def SaveAllBuffers(self):
         """
-        Save all open editor buffers
+        Save all open editor buffers. The files are written concurrently
+        in the background.
         """
         for page in range(self.nb.GetPageCount()):
             buff = self.nb.GetPage(page)
@@ -929,6 +949,10 @@ class MainWindow(wx.Frame, viewmgr.PerspectiveManager):
 
         # Write out saved document information
         self.nb.DocMgr.WriteBook()
+        ed_txt.EncodingCache().Save()
+        if _PGET('AUTOBACKUP'):
+            # Drop backup chunks that have not been used in 30 days
+            ed_stc.GetBackupManager()[1].Prune(2592000)
         syntax.SyntaxMgr().SaveState()
 
         # Save Shelf contents
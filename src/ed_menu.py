@@ -21,6 +21,8 @@ __revision__ = '$Revision: 70229 $'
 # --------------------------------------------------------------------------
 # Dependencies
 import os
+import hashlib
+import marshal
 import wx
 
 # Editra Libraries
@@ -35,6 +37,9 @@ from .syntax import synglob
 # Globals
 _ = wx.GetTranslation
 
+COMPILED_VERSION = 1        # Format version of compiled key profiles
+MODIFIERS = ('Ctrl', 'Alt', 'Shift')
+
 
 # --------------------------------------------------------------------------
 class EdMenu(wx.Menu):
@@ -239,6 +244,7 @@ class KeyBinder(object):
     """
     cprofile = None         # Current Profile Name String
     keyprofile = dict()     # Active Profile (dict)
+    keyindex = dict()       # Normalized binding => item id of Active Profile
 
     def __init__(self):
         """
@@ -352,19 +358,14 @@ class KeyBinder(object):
         @param keyb: tuple of unicode (u'Ctrl', u'C')
         @return: int (-1 if not found)
         """
-        menu_id = -1
-        for key, val in cls.keyprofile.items():
-            if val == keyb:
-                menu_id = key
-                break
-        return menu_id
+        return cls.keyindex.get(_NormalizeBinding(keyb), -1)
 
     @classmethod
     def LoadDefaults(cls):
         """
         Load the default key profile
         """
-        cls.keyprofile = dict(_DEFAULT_BINDING)
+        cls.SetProfileDict(dict(_DEFAULT_BINDING))
         cls.cprofile = None
 
     def LoadKeyProfile(self, pname):
@@ -384,46 +385,26 @@ class KeyBinder(object):
         Load a key profile from the given path
         @param path: full path to file
         """
-        keydict = dict()
         pname = None
         if path:
             pname = os.path.basename(path)
             pname = pname.rsplit('.', 1)[0]
 
         if pname is not None and os.path.exists(path):
-            reader = util.GetFileReader(path)
-            if reader != -1:
-                util.Log('[keybinder][info] Loading KeyProfile: %s' % path)
-                for line in reader:
-                    parts = line.split('=', 1)
-                    # Check that the line was formatted properly
-                    if len(parts) == 2:
-                        # Try to find the ID value
-                        item_id = _GetValueFromStr(parts[0])
-                        if item_id is not None:
-                            tmp = [part.strip()
-                                   for part in parts[1].split('+')
-                                   if len(part.strip())]
-
-                            # Do some checking if the binding is valid
-                            nctrl = len([key for key in tmp
-                                         if key not in ('Ctrl', 'Alt', 'Shift')])
-                            if nctrl:
-                                if parts[1].strip().endswith('++'):
-                                    tmp.append('+')
-                                kb = tuple(tmp)
-                                if kb in list(keydict.values()):
-                                    for mid, b in keydict.items():
-                                        if kb == b:
-                                            del keydict[mid]
-                                            break
-                                keydict[item_id] = tuple(tmp)
-                            else:
-                                # Invalid key binding
-                                continue
-
-                reader.close()
-                KeyBinder.keyprofile = keydict
+            stamp = _GetFileStamp(path)
+            bindings = LoadCompiledKeyProfile(path, stamp)
+            if bindings is None:
+                reader = util.GetFileReader(path)
+                if reader != -1:
+                    util.Log('[keybinder][info] Loading KeyProfile: %s' % path)
+                    bindings = _ParseKeyProfile(reader)
+                    reader.close()
+                    SaveCompiledKeyProfile(path, stamp, bindings)
+            else:
+                util.Log('[keybinder][info] Loading compiled KeyProfile: %s' % path)
+
+            if bindings is not None:
+                KeyBinder.SetProfileDict(_BuildKeyProfile(bindings))
                 KeyBinder.cprofile = pname
                 return
             else:
@@ -466,15 +447,26 @@ class KeyBinder(object):
         if isinstance(keys, str):
             keys = [key.strip() for key in keys.split('+')
                     if len(key.strip())]
-            keys = tuple(keys)
+        keys = tuple(keys)
+
+        # Remove the items current binding from the index
+        current = cls.keyprofile.get(item_id, None)
+        if current == keys:
+            return
+        elif current is not None:
+            norm = _NormalizeBinding(current)
+            if cls.keyindex.get(norm, None) == item_id:
+                del cls.keyindex[norm]
 
         if len(keys):
             # Check for an existing binding
-            menu_id = cls.FindMenuId(keys)
+            norm = _NormalizeBinding(keys)
+            menu_id = cls.keyindex.get(norm, -1)
             if menu_id != -1:
                 del cls.keyprofile[menu_id]
             # Set the binding
             cls.keyprofile[item_id] = keys
+            cls.keyindex[norm] = item_id
         elif item_id in cls.keyprofile:
             # Clear the binding
             del cls.keyprofile[item_id]
@@ -497,7 +489,11 @@ class KeyBinder(object):
         @param cls: Class Object
         @param keyprofile: { menu_id: (u'Ctrl', u'C'), }
         """
+        keyindex = dict()
+        for item_id, keys in keyprofile.items():
+            keyindex.setdefault(_NormalizeBinding(keys), item_id)
         cls.keyprofile = keyprofile
+        cls.keyindex = keyindex
 
 
 # -----------------------------------------------------------------------------
@@ -1175,6 +1171,140 @@ def _GetValueFromStr(item_str):
     return getattr(ed_glob, item_str, None)
 
 
+def _NormalizeBinding(keys):
+    """
+    Get the normalized form of a key binding that is used to index the
+    bindings, so that bindings that only differ by case or by the order
+    of the modifiers are the same.
+    @param keys: tuple of key strings (u'Ctrl', u'C')
+    @return: tuple
+    """
+    keys = [key.strip().title() for key in keys]
+    mods = [mod for mod in MODIFIERS if mod in keys]
+    return tuple(mods + [key for key in keys if key not in MODIFIERS])
+
+
+def _GetFileStamp(path):
+    """
+    Get the (mtime, size) of a file
+    @param path: file path
+    @return: tuple or None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+def _ParseKeyProfile(reader):
+    """
+    Parse the lines of a key profile file
+    @param reader: file reader
+    @return: list of (id name, binding tuple)
+    """
+    bindings = list()
+    for line in reader:
+        parts = line.split('=', 1)
+        # Check that the line was formatted properly
+        if len(parts) == 2:
+            tmp = [part.strip() for part in parts[1].split('+')
+                   if len(part.strip())]
+
+            # Do some checking if the binding is valid
+            nctrl = len([key for key in tmp if key not in MODIFIERS])
+            if nctrl:
+                if parts[1].strip().endswith('++'):
+                    tmp.append('+')
+                bindings.append((parts[0].strip(), tuple(tmp)))
+    return bindings
+
+
+def _BuildKeyProfile(bindings):
+    """
+    Build the key profile dictionary from a list of bindings. When the
+    same keys are bound more than once only the last binding is kept.
+    @param bindings: list of (id name, binding tuple)
+    @return: { menu_id: (u'Ctrl', u'C'), }
+    """
+    keydict = dict()
+    keyindex = dict()
+    for item_str, keys in bindings:
+        # Try to find the ID value
+        item_id = _GetValueFromStr(item_str)
+        if item_id is None:
+            continue
+
+        norm = _NormalizeBinding(keys)
+        if norm in keyindex:
+            del keydict[keyindex[norm]]
+        if item_id in keydict:
+            keyindex.pop(_NormalizeBinding(keydict[item_id]), None)
+        keydict[item_id] = keys
+        keyindex[norm] = item_id
+    return keydict
+
+
+def _GetCompiledPath(path):
+    """
+    Get the path of the compiled cache file for a key profile
+    @param path: key profile path
+    @return: path or None if there is no cache directory
+    """
+    cdir = ed_glob.CONFIG['CACHE_DIR']
+    if not cdir:
+        return None
+    key = hashlib.sha1(path.encode('utf-8', 'replace')).hexdigest()
+    return os.path.join(cdir, 'keys', key + '.ekc')
+
+
+def LoadCompiledKeyProfile(path, stamp):
+    """
+    Load the compiled bindings of a key profile
+    @param path: key profile path
+    @param stamp: (mtime, size) of the key profile
+    @return: list of (id name, binding tuple) or None if there is no
+             valid compiled data
+    """
+    cpath = _GetCompiledPath(path)
+    if cpath is None or stamp is None or not os.path.exists(cpath):
+        return None
+
+    try:
+        with open(cpath, 'rb') as handle:
+            data = marshal.load(handle)
+        version, kpath, cstamp, bindings = data
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if version != COMPILED_VERSION or kpath != path or \
+       tuple(cstamp) != stamp:
+        return None
+    return [ (item_str, tuple(keys)) for item_str, keys in bindings ]
+
+
+def SaveCompiledKeyProfile(path, stamp, bindings):
+    """
+    Save the parsed bindings of a key profile
+    @param path: key profile path
+    @param stamp: (mtime, size) of the key profile
+    @param bindings: list of (id name, binding tuple)
+    """
+    cpath = _GetCompiledPath(path)
+    if cpath is None or stamp is None:
+        return
+
+    try:
+        if not os.path.exists(os.path.dirname(cpath)):
+            os.makedirs(os.path.dirname(cpath))
+        tmp = cpath + '.tmp'
+        with open(tmp, 'wb') as handle:
+            marshal.dump((COMPILED_VERSION, path, stamp, bindings), handle)
+        os.replace(tmp, cpath)
+    except (IOError, OSError, ValueError):
+        pass
+
+
 # ---- Public Functions ----
 
 def IterateMenuItems(menu):
@@ -18,8 +18,8 @@ __revision__ = '$Revision: 72278 $'
 # --------------------------------------------------------------------------
 # Dependencies
 import os
-import sys
 import glob
+import itertools
 import wx
 
 # Editra Libraries
@@ -43,6 +43,7 @@ from . import ed_book
 # Globals
 ID_IDLE_TIMER = wx.NewId()
 SIMULATED_EVT_ID = -1
+PREFETCH_COUNT = 3  # Number of deferred tabs to load ahead of the selection
 _ = wx.GetTranslation
 # --------------------------------------------------------------------------
 
@@ -349,8 +350,11 @@ class EdPages(ed_book.EdBaseBook):
 
         try:
             mgr = ed_session.EdSessionMgr()
-            flist = self.GetFileNames()
-            bSaved = mgr.SaveSession(session, flist)
+            records = list()
+            for page in self.GetTextControls():
+                if page.GetFileName():
+                    records.append(page.GetSessionState())
+            bSaved = mgr.SaveSession(session, records)
         except Exception as msg:
             self.LOG('[ed_pages][err] SaveSession error %s' % msg)
         return None
@@ -364,34 +368,42 @@ class EdPages(ed_book.EdBaseBook):
         self._ses_load = True
 
         mgr = ed_session.EdSessionMgr()
-        flist = list()
+        records = mgr.IterSession(session)
         try:
-            flist = mgr.LoadSession(session)
+            # Read the first record up front so that an unreadable session
+            # is reported before the current files are closed.
+            first = next(records, None)
         except Exception as msg:
             self._ses_load = False
             errdict = dict(sessionname=session, error=msg)
             return (_('Session Load Error'),
                     _('Failed to load the session: %(sessionname)s\n\nError: %(error)s') % errdict)
 
-        if not len(flist):
+        if first is None:
             self._ses_load = False
             return _('Empty File'), _('Session file is empty.')
 
         # Close current files
         self.CloseAllPages()
 
+        lazy = Profile_Get('SESSION_LAZY_LOAD', default=True)
         missingfns = []
-        for loadfn in flist:
-            if os.path.exists(loadfn) and os.access(loadfn, os.R_OK):
-                if not ebmlib.IsUnicode(loadfn):
-                    try:
-                        loadfn = loadfn.decode(sys.getfilesystemencoding())
-                    except UnicodeDecodeError:
-                        self.LOG('[ed_pages][err] LoadSessionFile: Failed to decode file name')
-                self.OpenPage(os.path.dirname(loadfn),
-                              os.path.basename(loadfn))
-            else:
-                missingfns.append(loadfn)
+        try:
+            for record in itertools.chain((first,), records):
+                loadfn = record['path']
+                if os.path.exists(loadfn) and os.access(loadfn, os.R_OK):
+                    control = self.OpenPageDeferred(loadfn, record)
+                    if not lazy:
+                        self.LoadDeferredPage(control)
+                else:
+                    missingfns.append(loadfn)
+        except Exception as msg:
+            # Keep the files that were read before the error
+            self.LOG('[ed_pages][err] LoadSessionFile: %s' % msg)
+
+        # Only the selected tab is loaded now, the rest are loaded on demand
+        if lazy and self.GetPageCount():
+            self.ChangePage(self.GetPageCount() - 1)
 
         if missingfns:
             rmsg = (_('Missing session files'),
@@ -466,6 +478,7 @@ class EdPages(ed_book.EdBaseBook):
         sender, path = args
         for buf in self.GetTextControls():
             if buf.GetFileName() == path:
+                self.LoadDeferredPage(buf)
                 return buf
         else:
             return ed_msg.NullValue()
@@ -837,28 +850,153 @@ class EdPages(ed_book.EdBaseBook):
             self.GoCurrentPage()
             self.LOG('[ed_pages][evt] Opened Page: %s' % filename)
 
-    def DoPostLoad(self):
+    def OpenPageDeferred(self, path2file, state=None):
+        """
+        Add a tab for the given file without loading it. The file is read
+        and lexed when the tab is first selected or its document is
+        requested.
+        @param path2file: full path of file
+        @keyword state: session record to restore the buffer with
+        @return: the new tabs buffer
+        @see: L{LoadDeferredPage}
+        """
+        filename = ebmlib.GetFileName(path2file)
+        if self.GetPageCount() and not (self.control.GetModify() or \
+                                        self.control.GetLength() or \
+                                        self.control.GetFileName() != ''):
+            # Reuse the empty buffer
+            control = self.control
+            control.DeferLoad(path2file, state)
+            self.SetPageText(self.GetSelection(), filename)
+            self.SetPageBitmap(self.GetSelection(), control.GetTabImage())
+        else:
+            with eclib.Freezer(self.TopLevelParent) as _tmp:
+                control = ed_editv.EdEditorView(self, wx.ID_ANY)
+                control.Hide()
+                control.DeferLoad(path2file, state)
+                self.AddPage(control, filename, select=False)
+        self.LOG('[ed_pages][evt] Deferred Page: %s' % filename)
+        return control
+
+    def LoadDeferredPage(self, page):
+        """
+        Load the file of a tab that was opened by L{OpenPageDeferred}.
+        Does nothing for pages that are already loaded.
+        @param page: notebook page
+        @return: bool (False if the file could not be loaded)
+        """
+        if not hasattr(page, 'IsLoadDeferred') or not page.IsLoadDeferred():
+            return True
+
+        page.ClearDeferredLoad()
+        path2file = page.GetFileName()
+        # Unchanged files from a session skip encoding and lexer detection
+        lexer_ext = page.PrepareSessionLoad()
+        with eclib.Freezer(page) as _tmp:
+            result = True
+            if os.path.exists(path2file):
+                try:
+                    result = page.LoadFile(path2file)
+                except Exception as msg:
+                    self.LOG('[ed_pages][err] Failed to open file %s\n' % path2file)
+                    self.LOG('[ed_pages][err] %s' % msg)
+                    if not self._ses_load:
+                        ed_mdlg.OpenErrorDlg(self, path2file, msg)
+                    page.GetDocument().ClearLastError()
+                    result = None
+
+            if result is False and not self._ses_load:
+                result = self._HandleEncodingError(page)
+
+            if not result:
+                # Nothing usable was loaded so drop the tab
+                wx.CallAfter(self._CloseWindow, page)
+                return False
+
+            if lexer_ext:
+                page.FindLexer(lexer_ext)
+            else:
+                page.FindLexer()
+            page.EmptyUndoBuffer()
+            doc = page.GetDocument()
+            doc.AddModifiedCallback(page.FireModified)
+
+            idx = self.GetPageIndex(page)
+            if idx >= 0:
+                self.SetPageBitmap(idx, page.GetTabImage())
+
+            if Profile_Get('WARN_EOL', default=True) and not doc.IsRawBytes():
+                page.CheckEOL()
+
+            if not page.IsLoading():
+                self.DoPostLoad(page)
+
+        self.LOG('[ed_pages][evt] Loaded Deferred Page: %s' % path2file)
+        return True
+
+    def _CloseWindow(self, page):
+        """
+        Close the tab that contains the given page if it is still present
+        @param page: notebook page
+        """
+        if self and page:
+            idx = self.GetPageIndex(page)
+            if idx >= 0:
+                self._ClosePageNum(idx)
+
+    def _PrefetchDeferred(self):
+        """
+        Load the next deferred tab following the current selection. Only
+        one tab is loaded per call to keep the ui responsive.
+        """
+        sel = self.GetSelection()
+        if sel < 0:
+            return
+
+        count = self.GetPageCount()
+        for idx in range(sel + 1, min(sel + 1 + PREFETCH_COUNT, count)):
+            page = self.GetPage(idx)
+            if hasattr(page, 'IsLoadDeferred') and page.IsLoadDeferred():
+                self.LoadDeferredPage(page)
+                break
+
+    def DoPostLoad(self, control=None):
         """
         Perform post file open actions
+        @keyword control: buffer that was loaded (default current buffer)
         """
+        if control is None:
+            control = self.control
+
         # Ensure that document buffer is writable after an editable
         # document is opened in the buffer.
-        doc = self.control.GetDocument()
+        doc = control.GetDocument()
         if not doc.IsReadOnly() and not doc.IsRawBytes():
-            self.control.SetReadOnly(False)
+            control.SetReadOnly(False)
 
-        # Set last known caret position if the user setting is enabled
-        # and the caret position has not been changed during a threaded
-        # file loading operation.
-        if Profile_Get('SAVE_POS') and self.control.GetCurrentPos() <= 0:
-            pos = self.DocMgr.GetPos(self.control.GetFileName())
-            self.control.SetCaretPos(pos)
-            self.control.ScrollToColumn(0)
+        # Restore the view from the session or set last known caret
+        # position if the user setting is enabled and the caret position
+        # has not been changed during a threaded file loading operation.
+        if hasattr(control, 'RestoreSessionView') and \
+           control.RestoreSessionView():
+            pass
+        elif Profile_Get('SAVE_POS') and control.GetCurrentPos() <= 0:
+            pos = self.DocMgr.GetPos(control.GetFileName())
+            control.SetCaretPos(pos)
+            control.ScrollToColumn(0)
 
         ed_msg.PostMessage(ed_msg.EDMSG_FILE_OPENED,
-                           self.control.GetFileName(),
+                           control.GetFileName(),
                            context=self.frame.Id)
 
+        # Watch the file for changes from now on
+        if hasattr(control, 'WatchFile'):
+            control.WatchFile()
+
+        # Check for unsaved changes left in an automatic backup
+        if hasattr(control, 'PromptToRestore'):
+            wx.CallAfter(control.PromptToRestore)
+
     def GoCurrentPage(self):
         """
         Move Focus to Currently Selected Page.
@@ -1040,6 +1178,9 @@ class EdPages(ed_book.EdBaseBook):
                 if page is not None and page.IsShown():
                     page.DoOnIdle()
 
+            if not self._ses_load:
+                self._PrefetchDeferred()
+
     def OnPageChanging(self, evt):
         """
         Page changing event handler.
@@ -1071,6 +1212,7 @@ class EdPages(ed_book.EdBaseBook):
         # Get the window that is the current page
         window = self.GetPage(pg_num)
         self.control = window
+        self.LoadDeferredPage(window)
 
         # Update Frame Title
         self.frame.SetTitle(self.control.GetTitleString())
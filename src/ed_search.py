@@ -24,7 +24,13 @@ __revision__ = '$Revision: 71673 $'
 import os
 import sys
 import re
+import array
+import bisect
+import threading
+import weakref
 import unicodedata
+import concurrent.futures
+from collections import OrderedDict
 import wx
 
 # Local imports
@@ -56,6 +62,52 @@ class EdSearchEngine(ebmlib.SearchEngine):
                                              matchcase, wholeword)
         # Attributes
         self._offset = 0
+        self._source = None     # Text of in memory searches for results
+        self._buffer = None     # weakref to the buffer of the search pool
+
+    def FindAllLines(self):
+        """
+        Find all the lines with matches in the search pool
+        @return: list of results
+        """
+        # Pad the text so that its lines match the offset line numbers
+        self._source = '\n' * self._offset + self.GetSearchPool()
+        try:
+            return super(EdSearchEngine, self).FindAllLines()
+        finally:
+            self._source = None
+
+    def FormatRecord(self, fname, lnum, match):
+        """
+        Format a search result as a record for a L{SearchResultModel}
+        @return: tuple (fname, line, start column, end column, source,
+                        buffer)
+        """
+        start = end = 0
+        found = self.GetQueryObject().search(match)
+        if found is not None:
+            start, end = found.span()
+        buff = None
+        if self._source is not None:
+            buff = self._buffer
+        return (fname, lnum + self._offset, start, end, self._source, buff)
+
+    def GetFileEncoding(self, fname):
+        """
+        Get the encoding to decode a file with, the same one that is used
+        when the file is opened in a buffer.
+        @param fname: file path
+        @return: encoding name
+        """
+        return ed_txt.GetFileEncoding(fname)
+
+    def SetSearchBuffer(self, buff):
+        """
+        Set the buffer that the search pool was taken from so that the
+        results of in memory searches are shown in it.
+        @param buff: EditraStc
+        """
+        self._buffer = weakref.ref(buff)
 
     def FormatResult(self, fname, lnum, match):
         """
@@ -104,6 +156,110 @@ class EdSearchEngine(ebmlib.SearchEngine):
         super(EdSearchEngine, self).SetSearchPool(pool)
 
 
+# --------------------------------------------------------------------------
+def GetReplaceEdits(regex, text, rstring, isregex=True):
+    """
+    Get the edits for replacing all the matches of a regular expression
+    @param regex: compiled regular expression
+    @param text: text to replace in
+    @param rstring: replacement string
+    @keyword isregex: expand group references in the replacement string
+    @return: list of (start, end, replacement) for L{ed_basestc.EditraBaseStc.ApplyEdits}
+    """
+    edits = list()
+    for match in regex.finditer(text):
+        value = rstring
+        if isregex:
+            try:
+                value = match.expand(rstring)
+            except (re.error, IndexError):
+                pass
+        edits.append((match.start(), match.end(), value))
+    return edits
+
+
+# --------------------------------------------------------------------------
+class FileReplacer(object):
+    """
+    Replaces all the matches of a search engines query in a set of files on
+    disk. The files are processed in parallel, are decoded and written back
+    with their original encoding through L{ed_txt.EdFile}, and each file is
+    replaced atomically so that an interrupted replace never leaves a
+    partially written file behind.
+    """
+    def __init__(self, engine, rstring, backup=True):
+        """
+        Create the replacer
+        @param engine: EdSearchEngine with the query to replace
+        @param rstring: replacement string
+        @keyword backup: make a backup copy of each file before changing it
+        """
+        super(FileReplacer, self).__init__()
+
+        # Attributes
+        self._engine = engine
+        self._rstring = rstring
+        self._checker = ebmlib.FileTypeChecker()
+        self._bkupmgr = None
+        if backup:
+            self._bkupmgr = ebmlib.FileBackupMgr(None)
+
+    def ReplaceInFile(self, path, dryrun=False):
+        """
+        Replace all the matches in a file
+        @param path: file path
+        @keyword dryrun: only count the matches without changing the file
+        @return: tuple (path, number of matches, error message or None)
+        """
+        if not self._checker.IsReadableText(path):
+            return (path, 0, None)
+
+        fobj = ed_txt.EdFile(path)
+        try:
+            text = fobj.Read()
+        except ed_txt.ReadError as msg:
+            return (path, 0, str(msg))
+        if fobj.IsRawBytes():
+            return (path, 0, None)
+
+        text, count = self._engine.ReplaceAll(text, self._rstring)
+        if not count or dryrun:
+            return (path, count, None)
+
+        if self._bkupmgr is not None and not self._bkupmgr.MakeBackupCopy(path):
+            return (path, 0, _("Failed to create backup"))
+
+        try:
+            fobj.Write(text)
+        except Exception as msg:
+            return (path, 0, str(msg))
+        return (path, count, None)
+
+    def ReplaceInFiles(self, paths, dryrun=False, callback=None):
+        """
+        Replace all the matches in a list of files using a pool of workers
+        @param paths: list of file paths
+        @keyword dryrun: only count the matches without changing the files
+        @keyword callback: callable(path, count, error) called as each file
+                           finishes
+        @return: list of (path, number of matches, error message or None)
+                 for the files that had matches or errors
+        """
+        results = list()
+        workers = ebmlib.DefaultThreadCount()
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            jobs = [pool.submit(self.ReplaceInFile, path, dryrun)
+                    for path in paths]
+            for job in concurrent.futures.as_completed(jobs):
+                result = job.result()
+                if result[1] or result[2]:
+                    results.append(result)
+                if callback is not None:
+                    callback(*result)
+        results.sort()
+        return results
+
+
 # --------------------------------------------------------------------------
 class SearchController(object):
     """
@@ -514,7 +670,7 @@ class SearchController(object):
         # Create a new search engine object
         engine = EdSearchEngine(query, evt.IsRegEx(), True,
                                 evt.IsMatchCase(), evt.IsWholeWord())
-        engine.SetResultFormatter(engine.FormatResult)
+        engine.SetResultFormatter(engine.FormatRecord)
 
         # Send the search function over to any interested parties that wish
         # to process the results.
@@ -526,6 +682,7 @@ class SearchController(object):
                                    (engine.SearchInFile, [fname, ], dict()))
             else:
                 engine.SetSearchPool(stc.GetText())
+                engine.SetSearchBuffer(stc)
                 ed_msg.PostMessage(ed_msg.EDMSG_START_SEARCH,
                                    (engine.FindAllLines,))
         if smode == eclib.LOCATION_IN_SELECTION:
@@ -534,6 +691,7 @@ class SearchController(object):
             offset = stc.LineFromPosition(sel_s)
             engine.SetOffset(offset)
             engine.SetSearchPool(stc.GetSelectedText())
+            engine.SetSearchBuffer(stc)
             ed_msg.PostMessage(ed_msg.EDMSG_START_SEARCH,
                                (engine.FindAllLines,))
         elif smode == eclib.LOCATION_OPEN_DOCS:
@@ -687,29 +845,22 @@ class SearchController(object):
                 pass    # TODO: notify of no matches?
         elif smode == eclib.LOCATION_OPEN_DOCS:
             for ctrl in self._parent.GetTextControls():
+                self._parent.LoadDeferredPage(ctrl)
                 engine.SetSearchPool(ctrl.GetText())
                 matches = engine.FindAll()
                 if matches is not None:
                     self.ReplaceInStc(ctrl, matches, rstring, evt.IsRegEx())
                     results += len(matches)
         elif smode in (eclib.LOCATION_IN_CURRENT_DIR, eclib.LOCATION_IN_FILES):
-            dlg = wx.MessageDialog(self._parent,
-                                   _('Sorry will be ready for future version'),
-                                   _('Not implemented'),
-                                   # _("Warning this cannot be undone!"),
-                                   # _("Do Replace All?"),
-                                   style=wx.ICON_WARNING|wx.OK|wx.CANCEL|wx.CENTER)
-            result = dlg.ShowModal()
-            dlg.Destroy()
-
-            if result == wx.ID_OK:
-                pass
-#                path = evt.GetDirectory()
-#                ed_msg.PostMessage(ed_msg.EDMSG_START_SEARCH,
-#                                   (engine.SearchInDirectory,
-#                                    [path,], dict(recursive=evt.IsRecursive())))
+            if smode == eclib.LOCATION_IN_CURRENT_DIR:
+                path = ebmlib.GetPathName(self._stc().GetFileName())
             else:
-                return
+                path = evt.GetDirectory()
+            if path and os.path.isdir(path):
+                engine.SetFileFilters(evt.GetFileFilters())
+                self.ReplaceInDirectory(engine, rstring, path,
+                                        evt.IsRecursive())
+            return
 
         # Post number of matches that were replaced to the status bar
         if results > 0:
@@ -768,6 +919,128 @@ class SearchController(object):
         if client in self._clients:
             self._clients.remove(client)
 
+    def ReplaceInDirectory(self, engine, rstring, path, recursive=True):
+        """
+        Replace all matches in the files of a directory. The matches are
+        first counted in the background and the user is shown a preview of
+        the changes to confirm before any files are modified. Files that
+        are open in a buffer are changed in the buffer instead of on disk.
+        @param engine: EdSearchEngine with the query to replace
+        @param rstring: replacement string
+        @param path: directory path
+        @keyword recursive: include sub directories
+        """
+        buffers = dict()
+        for ctrl in self._parent.GetTextControls():
+            fname = ctrl.GetFileName()
+            if fname and not ctrl.IsLoadDeferred():
+                buffers[os.path.abspath(fname)] = ctrl
+
+        replacer = FileReplacer(engine, rstring,
+                                Profile_Get('REPLACE_BACKUP', default=True))
+
+        def DoPreview():
+            """Count the matches in the files on disk"""
+            files = list()
+            opened = list()
+            for fname in engine.IterDirectoryFiles(path, recursive):
+                fname = os.path.abspath(fname)
+                if fname in buffers:
+                    opened.append(fname)
+                else:
+                    files.append(fname)
+            results = replacer.ReplaceInFiles(files, dryrun=True)
+            wx.CallAfter(self._ConfirmReplaceInFiles, engine, rstring,
+                         replacer, results,
+                         [buffers[fname] for fname in opened])
+
+        ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT,
+                           (ed_glob.SB_INFO, _('Searching for matches...')))
+        ed_thread.EdThreadPool().SubmitJob(ed_thread.PRIORITY_BACKGROUND,
+                                           DoPreview)
+
+    def _ConfirmReplaceInFiles(self, engine, rstring, replacer, results,
+                               buffers):
+        """
+        Show the preview of a replace in files and do the replacement if
+        the user accepts it.
+        @param engine: EdSearchEngine with the query to replace
+        @param rstring: replacement string
+        @param replacer: FileReplacer
+        @param results: dry run results from L{FileReplacer.ReplaceInFiles}
+        @param buffers: list of open buffers in the replace location
+        """
+        if not self._parent:
+            return
+
+        bmatches = list()
+        for ctrl in buffers:
+            engine.SetSearchPool(ctrl.GetText())
+            matches = engine.FindAll()
+            if matches:
+                bmatches.append((ctrl, matches))
+
+        changes = [ result for result in results if result[1] ]
+        total = sum(result[1] for result in changes) + \
+                sum(len(matches) for ctrl, matches in bmatches)
+        if not total:
+            ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT,
+                               (ed_glob.SB_INFO, _('No matches were found.')))
+            return
+
+        # Preview of the files that will be changed
+        lines = [ '%s (%d)' % (ctrl.GetFileName(), len(matches))
+                  for ctrl, matches in bmatches ]
+        lines.extend([ '%s (%d)' % (fname, count)
+                       for fname, count, err in changes ])
+        nfiles = len(lines)
+        if nfiles > 20:
+            lines = lines[:20] + [_('... and %d more files') % (nfiles - 20)]
+        msg = _('Replace %(matches)d matches in %(files)d files?') % \
+              dict(matches=total, files=nfiles)
+        msg += '\n\n' + '\n'.join(lines)
+        dlg = wx.MessageDialog(self._parent, msg, _('Replace All'),
+                               style=wx.ICON_WARNING|wx.OK|wx.CANCEL|wx.CENTER)
+        result = dlg.ShowModal()
+        dlg.Destroy()
+        if result != wx.ID_OK:
+            return
+
+        # Open buffers are changed in place so the change can be undone
+        for ctrl, matches in bmatches:
+            self.ReplaceInStc(ctrl, matches, rstring, engine.IsRegEx())
+
+        def DoReplace():
+            """Replace the matches in the files on disk"""
+            done = replacer.ReplaceInFiles([ fname for fname, count, err
+                                             in changes ])
+            wx.CallAfter(self._ReplaceInFilesDone, done,
+                         sum(len(matches) for ctrl, matches in bmatches))
+
+        ed_thread.EdThreadPool().SubmitJob(ed_thread.PRIORITY_BACKGROUND,
+                                           DoReplace)
+
+    def _ReplaceInFilesDone(self, results, bcount=0):
+        """
+        Report the results of a replace in files
+        @param results: results from L{FileReplacer.ReplaceInFiles}
+        @keyword bcount: number of matches replaced in open buffers
+        """
+        total = bcount
+        errors = list()
+        for fname, count, err in results:
+            total += count
+            if err:
+                errors.append('%s: %s' % (fname, err))
+
+        ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT,
+                           (ed_glob.SB_INFO,
+                            _('%d matches were replaced.') % total))
+        if errors and self._parent:
+            wx.MessageBox(_('The following files could not be changed:') + \
+                          '\n\n' + '\n'.join(errors[:20]),
+                          _('Replace Error'), wx.OK|wx.ICON_ERROR)
+
     @staticmethod
     def ReplaceInStc(stc, matches, rstring, isregex=True):
         """
@@ -779,26 +1052,11 @@ class SearchController(object):
         """
         if not len(matches):
             return
-        def GetSub(match):
-            """
-            replace substitution callable for re.sub
-            """
-            value = rstring
-            if isregex:
-                try:
-                    value = match.expand(rstring)
-                except:
-                    pass
-            return value
-        text = re.sub(matches[0].re, GetSub, stc.GetText())
+        text = stc.GetText()
+        edits = GetReplaceEdits(matches[0].re, text, rstring, isregex)
         # Update the view
         with eclib.Freezer(stc) as _tmp:
-            stc.BeginUndoAction()
-            cpos = stc.CurrentPos
-            stc.ClearAll()
-            stc.SetText(text)
-            stc.GotoPos(cpos)
-            stc.EndUndoAction()
+            stc.ApplyEdits(edits, text)
 
     @staticmethod
     def ReplaceInStcSelection(stc, matches, rstring, isregex=True):
@@ -807,25 +1065,13 @@ class SearchController(object):
         """
         if not len(matches):
             return
-        def GetSub(match):
-            """
-            replace substitution callable for re.sub
-            """
-            value = rstring
-            if isregex:
-                try:
-                    value = match.expand(rstring)
-                except:
-                    pass
-            return value
-        text = re.sub(matches[0].re, GetSub, stc.GetSelectedText())
+        text = stc.GetSelectedText()
+        edits = GetReplaceEdits(matches[0].re, text, rstring, isregex)
         # Update the view
         with eclib.Freezer(stc) as _tmp:
-            stc.BeginUndoAction()
             start, end = stc.GetSelection()
-            stc.ReplaceSelection(text)
-            stc.SetSelection(start, start+len(text))
-            stc.EndUndoAction()
+            delta = stc.ApplyEdits(edits, text, start)
+            stc.SetSelection(start, end + delta)
 
     def SetFileFilters(self, filters):
         """
@@ -1318,7 +1564,7 @@ class EdFindResults(plugin.Plugin):
             s_mw = shelf.GetOwnerWindow()
             shelf_nb = shelf.GetWindow()
             for item in EdFindResults.RESULT_SCREENS:
-                if item.GetDisplayedLines() < 3 and \
+                if item.IsEmpty() and \
                    s_mw is win and item.GetParent() is shelf_nb:
                     screen = shelf.RaiseWindow(item)
                     break
@@ -1352,7 +1598,10 @@ class SearchResultScreen(ed_basewin.EdBaseCtrlBox):
         # Attributes
         self._meth = None
         self._job = None
-        self._list = SearchResultList(self)
+        self._future = None
+        self._model = SearchResultModel()
+        self._list = SearchResultList(self, self._model)
+        self._status = None
         self._cancelb = None
         self._clearb = None
 
@@ -1362,12 +1611,9 @@ class SearchResultScreen(ed_basewin.EdBaseCtrlBox):
 
         # Event Handlers
         self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy, self)
-        self.Bind(wx.EVT_BUTTON,
-                  lambda evt: self._list.Clear(), self._clearb)
+        self.Bind(wx.EVT_BUTTON, lambda evt: self.Clear(), self._clearb)
         self.Bind(wx.EVT_BUTTON,
                   lambda evt: self.CancelSearch(), self._cancelb)
-        self._list.Bind(eclib.EVT_TASK_START, self.OnTaskStart)
-        self._list.Bind(eclib.EVT_TASK_COMPLETE, self.OnTaskComplete)
 
         # Message Handlers
         ed_msg.Subscribe(self.OnThemeChange, ed_msg.EDMSG_THEME_CHANGED)
@@ -1375,6 +1621,8 @@ class SearchResultScreen(ed_basewin.EdBaseCtrlBox):
     def OnDestroy(self, evt):
         if evt.Id == self.Id:
             ed_msg.Unsubscribe(self.OnThemeChange)
+            if self._job is not None:
+                self._job.Cancel()
         evt.Skip()
 
     def __DoLayout(self):
@@ -1382,6 +1630,8 @@ class SearchResultScreen(ed_basewin.EdBaseCtrlBox):
         Layout and setup the results screen ui
         """
         ctrlbar = self.CreateControlBar(wx.TOP)
+        self._status = wx.StaticText(ctrlbar, label='')
+        ctrlbar.AddControl(self._status)
         ctrlbar.AddStretchSpacer()
 
         # Cancel Button
@@ -1394,28 +1644,42 @@ class SearchResultScreen(ed_basewin.EdBaseCtrlBox):
 
         self.SetWindow(self._list)
 
-    def GetDisplayedLines(self):
+    def Clear(self):
         """
-        Get the number of lines displayed in the output window
+        Clear the results
         """
-        return self._list.GetLineCount()
+        self._model.Clear()
+        self._list.UpdateCount()
+        self._status.SetLabel('')
 
-    def OnTaskStart(self, evt):
+    def IsEmpty(self):
+        """
+        Does the screen have no search results
+        @return: bool
+        """
+        return not self._model.GetRecordCount()
+
+    def OnTaskStart(self, job):
         """
         Start accepting results from the search thread
-        @param evt: UpdateBufferEvent
+        @param job: SearchResultJob that started
         """
-        start = '>>> %s' % _('Search Started')
+        if job is not self._job:
+            return
+
+        start = _('Search Started')
         if self._meth is not None:
             start += (': ' + self._meth.__self__.GetOptionsString())
-        self._list.SetStartEndText(start + os.linesep)
+        self._status.SetLabel(start)
         self._list.Start(250)
 
-    def OnTaskComplete(self, evt):
+    def OnTaskComplete(self, job):
         """
         Update when task is complete
-        @param evt: UpdateBufferEvent
+        @param job: SearchResultJob that finished
         """
+        if job is not self._job:
+            return
         self._meth = None
 
         # Stop the timer
@@ -1426,15 +1690,11 @@ class SearchResultScreen(ed_basewin.EdBaseCtrlBox):
         ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT,
                            (ed_glob.SB_INFO, _('Search complete')))
 
-        # Flush any remaining text to the output buffer
-        self._list.FlushBuffer()
- 
-        # Add our end message
-        lines = max(0, self._list.GetLineCount() - 2)
-        msg = _('Search Complete: %d matching lines where found.') % lines
-        msg2 = _('Files Searched: %d' % self._list.GetFileCount())
-        end = '>>> %s \t%s' % (msg, msg2)
-        self._list.SetStartEndText(end + os.linesep)
+        msg = _('Search Complete: %d matching lines where found.') % \
+              self._model.GetRecordCount()
+        msg2 = _('Files Searched: %d') % self._model.GetFileCount()
+        self._status.SetLabel('%s  %s' % (msg, msg2))
+        self._status.GetParent().Layout()
 
     def OnThemeChange(self, msg):
         """
@@ -1455,6 +1715,8 @@ class SearchResultScreen(ed_basewin.EdBaseCtrlBox):
         """
         if self._job is not None:
             self._job.Cancel()
+        if self._future is not None:
+            self._future.Cancel()
         self._cancelb.Disable()
 
     def StartSearch(self, searchmeth, *args, **kwargs):
@@ -1468,139 +1730,374 @@ class SearchResultScreen(ed_basewin.EdBaseCtrlBox):
 
         if self._job is not None:
             self._job.Cancel()
-
-        self._list.Clear()
-        self._job = eclib.TaskObject(self._list, searchmeth, *args, **kwargs)
-        ed_thread.EdThreadPool().QueueJob(self._job.DoTask)
+        if self._future is not None:
+            self._future.Cancel()
+
+        self.Clear()
+        self._job = SearchResultJob(self, self._model, searchmeth,
+                                    *args, **kwargs)
+        self._future = ed_thread.EdThreadPool().SubmitJob(
+                                            ed_thread.PRIORITY_BACKGROUND,
+                                            self._job.DoTask)
         self._cancelb.Enable()
 
 
 # -----------------------------------------------------------------------------
-class SearchResultList(eclib.OutputBuffer):
+class SearchResultModel(object):
     """
-    Outputbuffer for listing matching lines from the search results that
-    a L{ebmlib.SearchEngine} dispatches. The matching lines are turned into
-    hotspots that allow them to be clicked on for instant navigation to the
-    matching line.
+    Compact store of search results. Each matching line is kept as a
+    (file id, line, match start, match end) record in a set of integer
+    arrays, the text of the lines is only read when it is displayed. The
+    records are grouped by file and each group is shown as a header row
+    followed by a row for each of its records.
+    """
+    CACHED_FILES = 4    # Number of files to keep the lines of in memory
+
+    def __init__(self):
+        super(SearchResultModel, self).__init__()
+
+        # Attributes
+        self._lock = threading.Lock()
+        self.Clear()
+
+    def Clear(self):
+        """
+        Remove all the results
+        """
+        with self._lock:
+            self._files = list()            # (path, text source, buffer)
+            self._fstart = array.array('L') # first record of each file
+            self._hrow = array.array('L')   # header row of each file
+            self._rfile = array.array('L')
+            self._rline = array.array('L')
+            self._rstart = array.array('L')
+            self._rend = array.array('L')
+            self._searched = 0
+            self._lines = OrderedDict()     # file id -> list of lines
+
+    def AddRecord(self, fname, lnum, start=0, end=0, source=None,
+                  buff=None):
+        """
+        Add a matching line
+        @param fname: file name
+        @param lnum: line number (0 based)
+        @keyword start: column the match starts at
+        @keyword end: column the match ends at
+        @keyword source: text that was searched for in memory searches
+        @keyword buff: weakref to the buffer of in memory searches
+        """
+        with self._lock:
+            if not self._files or self._files[-1][0] != fname:
+                nrec = len(self._rfile)
+                self._hrow.append(nrec + len(self._files))
+                self._fstart.append(nrec)
+                self._files.append((fname, source, buff))
+            self._rfile.append(len(self._files) - 1)
+            self._rline.append(lnum)
+            self._rstart.append(start)
+            self._rend.append(end)
+
+    def AddSearchedFile(self):
+        """
+        Count a file that was searched
+        @return: number of files searched
+        """
+        self._searched += 1
+        return self._searched
+
+    def GetFileCount(self):
+        """
+        Get the number of files that were searched
+        @return: int
+        """
+        return self._searched
+
+    def GetFileInfo(self, fid):
+        """
+        Get the file name and number of records of a file group
+        @param fid: file id
+        @return: (file name, number of records)
+        """
+        with self._lock:
+            if fid + 1 < len(self._fstart):
+                end = self._fstart[fid + 1]
+            else:
+                end = len(self._rfile)
+            return (self._files[fid][0], end - self._fstart[fid])
+
+    def GetLineText(self, idx):
+        """
+        Get the text of the line of a record
+        @param idx: record index
+        @return: string
+        """
+        fid = self._rfile[idx]
+        lines = self._lines.get(fid, None)
+        if lines is None:
+            fname, source = self._files[fid][:2]
+            if source is None:
+                try:
+                    enc = ed_txt.GetFileEncoding(fname)
+                    with open(fname, 'r', newline='\n', errors='replace',
+                              encoding=enc) as handle:
+                        source = handle.read()
+                except (IOError, OSError, LookupError):
+                    source = ''
+            # Split the same way as the search engine does
+            lines = source.split('\n')
+            self._lines[fid] = lines
+            while len(self._lines) > SearchResultModel.CACHED_FILES:
+                self._lines.popitem(last=False)
+        else:
+            self._lines.move_to_end(fid)
+
+        lnum = self._rline[idx]
+        if lnum < len(lines):
+            return lines[lnum]
+        return ''
+
+    def GetRecord(self, idx):
+        """
+        Get a record
+        @param idx: record index
+        @return: (file name, line, start column, end column, buffer) where
+                 buffer is a weakref to the buffer of in memory searches
+                 or None
+        """
+        with self._lock:
+            fname, source, buff = self._files[self._rfile[idx]]
+            return (fname, self._rline[idx], self._rstart[idx],
+                    self._rend[idx], buff)
+
+    def GetRecordCount(self):
+        """
+        Get the number of records
+        @return: int
+        """
+        return len(self._rfile)
+
+    def GetRow(self, row):
+        """
+        Get what is shown in a row
+        @param row: row index
+        @return: (file id, record index) the record index is -1 for the
+                 header rows of the file groups
+        """
+        with self._lock:
+            fid = bisect.bisect_right(self._hrow, row) - 1
+            if fid < 0:
+                return (-1, -1)
+            if row == self._hrow[fid]:
+                return (fid, -1)
+            return (fid, self._fstart[fid] + row - self._hrow[fid] - 1)
+
+    def GetRowCount(self):
+        """
+        Get the number of rows to display
+        @return: int
+        """
+        with self._lock:
+            return len(self._rfile) + len(self._files)
+
+
+# -----------------------------------------------------------------------------
+class SearchResultJob(object):
+    """
+    Runs a search method on a worker thread and adds the results it yields
+    to a L{SearchResultModel}.
+    """
+    def __init__(self, screen, model, task, *args, **kwargs):
+        """
+        @param screen: SearchResultScreen to notify
+        @param model: SearchResultModel to add the results to
+        @param task: search method
+        @param *args: positional arguments to pass to task
+        @param **kwargs: keyword arguments to pass to task
+        """
+        super(SearchResultJob, self).__init__()
+
+        # Attributes
+        self.cancel = False
+        self._screen = screen
+        self._model = model
+        self._task = task
+        self._args = args
+        self._kwargs = kwargs
+
+    def Cancel(self):
+        """Cancel the running task"""
+        self.cancel = True
+
+    def DoTask(self):
+        """Run the search and collect the results"""
+        wx.CallAfter(self._Notify, 'OnTaskStart')
+        model = self._model
+        for result in self._task(*self._args, **self._kwargs):
+            if self.cancel:
+                break
+
+            if isinstance(result, tuple) and result[0] is None:
+                # Search in a new file has started
+                count = model.AddSearchedFile()
+                # Only update the status bar for every 10 files to reduce the
+                # overhead of updating the status bar.
+                if count == 1 or not count % 10:
+                    wx.CallAfter(ed_msg.PostMessage, ed_msg.EDMSG_UI_SB_TXT,
+                                 (ed_glob.SB_INFO, result[1]))
+            elif isinstance(result, tuple):
+                model.AddRecord(*result)
+            else:
+                # Formatted results from other search methods
+                match = SearchResultList.RE_FIND_MATCH.match(result)
+                if match is not None:
+                    model.AddRecord(match.group(1), int(match.group(2)) - 1)
+        wx.CallAfter(self._Notify, 'OnTaskComplete')
+
+    def _Notify(self, meth):
+        """Notify the screen of the jobs progress on the main thread"""
+        if self._screen:
+            getattr(self._screen, meth)(self)
+
+
+# -----------------------------------------------------------------------------
+class SearchResultList(eclib.EBaseListCtrl):
+    """
+    Virtual list for showing the results of a search held in a
+    L{SearchResultModel}. The results are grouped by file, activating a
+    result opens the file at the matched line.
     """
-    STY_SEARCH_MATCH = eclib.OPB_STYLE_MAX + 1
     RE_FIND_MATCH = re.compile('(.+) \(([0-9]+)\)\: .+')
+    COL_FILE = 0
+    COL_LINE = 1
+    COL_TEXT = 2
 
-    def __init__(self, parent):
-        super(SearchResultList, self).__init__(parent)
+    def __init__(self, parent, model):
+        super(SearchResultList, self).__init__(parent,
+                                               style=wx.LC_REPORT | \
+                                                     wx.LC_VIRTUAL | \
+                                                     wx.LC_SINGLE_SEL)
 
         # Attributes
-        self._files = 0
+        self._model = model
+        self._timer = wx.Timer(self)
+        self._hattr = wx.ItemAttr()
 
         # Setup
         font = Profile_Get('FONT1', 'font', wx.Font(11, wx.FONTFAMILY_MODERN, 
                                                     wx.FONTSTYLE_NORMAL, 
                                                     wx.FONTWEIGHT_NORMAL))
         self.SetFont(font)
-        style = (font.GetFaceName(), font.GetPointSize(), '#FFFFFF')
-        self.StyleSetSpec(SearchResultList.STY_SEARCH_MATCH,
-                          'face:%s,size:%d,fore:#000000,back:%s' % style)
-        self.StyleSetHotSpot(SearchResultList.STY_SEARCH_MATCH, True)
+        hfont = wx.Font(font)
+        hfont.SetWeight(wx.FONTWEIGHT_BOLD)
+        self._hattr.SetFont(hfont)
+        self.InsertColumn(SearchResultList.COL_FILE, _('File'))
+        self.InsertColumn(SearchResultList.COL_LINE, _('Line'))
+        self.InsertColumn(SearchResultList.COL_TEXT, _('Text'))
+        self.setResizeColumn(SearchResultList.COL_TEXT + 1) # NOTE: +1 bug in mixin
+
+        # Event Handlers
+        self.Bind(wx.EVT_TIMER, lambda evt: self.UpdateCount(), self._timer)
+        self.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.OnItemActivated)
 
-    def AppendUpdate(self, value):
+    def OnGetItemAttr(self, item):
         """
-        Do a little filtering of updates as they arrive
-        @param value: search result from search method
+        Override for virtual control, file headers are shown in bold
         """
-        if isinstance(value, str):
-            # Regular search result
-            super(SearchResultList, self).AppendUpdate(value)
-        else:
-            # Search in a new file has started
-            self._files += 1
-
-            # Only updated status bar for every 10 files to reduce the overhead
-            # of updating the status bar and to improve performance of search.
-            if self._files == 1 or \
-               ((self._files / 10) > ((self._files-1) / 10)): 
-                wx.CallAfter(ed_msg.PostMessage, ed_msg.EDMSG_UI_SB_TXT,
-                             (ed_glob.SB_INFO,
-                              value[1])) # GetTranslation not thread safe (_("Searching in: %s") % )
-
-    def ApplyStyles(self, start, txt):
-        """
-        Set a hotspot for each search result
-        Search matches strings should be formatted as follows
-        /file/name (line) match string
-        @param start: long
-        @param txt: string
-        """
-        self.StartStyling(start, 0x1f)
-        if re.match(SearchResultList.RE_FIND_MATCH, txt):
-            self.SetStyling(len(txt), SearchResultList.STY_SEARCH_MATCH)
-        else:
-            self.SetStyling(len(txt), eclib.OPB_STYLE_DEFAULT)
+        if self._model.GetRow(item)[1] < 0:
+            return self._hattr
+        return None
 
-    def Clear(self):
+    def OnGetItemText(self, item, column):
         """
-        Override OutputBuffer.Clear
+        Override for virtual control
         """
-        self._files = 0
-        super(SearchResultList, self).Clear()
+        fid, idx = self._model.GetRow(item)
+        if fid < 0:
+            return ''
 
-    def DoHotSpotClicked(self, pos, line):
+        if idx < 0:
+            fname, count = self._model.GetFileInfo(fid)
+            if column == SearchResultList.COL_FILE:
+                return fname
+            elif column == SearchResultList.COL_LINE:
+                return str(count)
+        elif column == SearchResultList.COL_LINE:
+            return str(self._model.GetRecord(idx)[1] + 1)
+        elif column == SearchResultList.COL_TEXT:
+            return self._model.GetLineText(idx).strip()
+        return ''
+
+    def OnItemActivated(self, evt):
         """
-        Handle a click on a hotspot and open the file to the matched line
-        @param pos: long
-        @param line: int
+        Open the file to the matched line of the activated result
+        @param evt: wx.ListEvent
         """
-        txt = self.GetLine(line)
-        match = re.match(SearchResultList.RE_FIND_MATCH, txt)
-        if match is not None:
-            groups = match.groups()
-            if len(groups) == 2:
-                fname, lnum = groups
-                if lnum.isdigit():
-                    lnum = int(lnum) - 1
-                else:
-                    lnum = 0
-                self._OpenToLine(fname, lnum)
+        fid, idx = self._model.GetRow(evt.GetIndex())
+        if idx >= 0:
+            fname, lnum, start, end, buff = self._model.GetRecord(idx)
+            self._OpenToLine(fname, lnum, (start, end), buff)
 
-    def GetFileCount(self):
+    def Start(self, interval):
         """
-        Get the number of files searched in the previous/current search job.
-        @return: int
+        Start updating the list as the results arrive
+        @param interval: update interval in milliseconds
+        """
+        self._timer.Start(interval)
+
+    def Stop(self):
+        """
+        Stop updating the list and show all the results
         """
-        return self._files
+        self._timer.Stop()
+        self.UpdateCount()
 
-    def SetStartEndText(self, txt):
+    def UpdateCount(self):
         """
-        Add a start task or end task message to the output. Styled in
-        Info style.
-        @param txt: text to add
+        Update the list with the number of results in the model
         """
-        self.SetReadOnly(False)
-        cpos = self.GetLength()
-        self.AppendText(txt)
-        self.StartStyling(cpos, 0x1f)
-        self.SetStyling(self.GetLength() - cpos, eclib.OPB_STYLE_INFO)
-        self.SetReadOnly(True)
+        count = self._model.GetRowCount()
+        if count != self.GetItemCount():
+            self.SetItemCount(count)
+            self.Refresh()
 
     @staticmethod
-    def _OpenToLine(fname, line):
+    def _OpenToLine(fname, line, span=None, buff=None):
         """
         Open the given filename to the given line number
         @param fname: File name to open, relative paths will be converted to abs
                       paths.
         @param line: Line number to set the cursor to after opening the file
+        @keyword span: (start, end) columns of the match to select
+        @keyword buff: weakref to the buffer an in memory search was done in
         """
-        mainw = wx.GetApp().GetActiveWindow()
-        nbook = mainw.GetNotebook()
-        buffers = [ page.GetFileName() for page in nbook.GetTextControls() ]
-        if fname in buffers:
-            page = buffers.index(fname)
-            nbook.ChangePage(page)
-            cpage = nbook.GetPage(page)
+        if buff is not None:
+            # The buffer the result came from must still be open
+            cpage = buff()
+            if not cpage:
+                ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT,
+                                   (ed_glob.SB_INFO,
+                                    _('The searched buffer has been closed')))
+                return
+            nbook = cpage.GetParent()
+            nbook.ChangePage(nbook.GetPageIndex(cpage))
         else:
-            nbook.OnDrop([fname])
-            cpage = nbook.GetPage(nbook.GetSelection())
+            mainw = wx.GetApp().GetActiveWindow()
+            nbook = mainw.GetNotebook()
+            buffers = [ page.GetFileName()
+                        for page in nbook.GetTextControls() ]
+            if fname in buffers:
+                page = buffers.index(fname)
+                nbook.ChangePage(page)
+                cpage = nbook.GetPage(page)
+            else:
+                nbook.OnDrop([fname])
+                cpage = nbook.GetPage(nbook.GetSelection())
 
         cpage.GotoLine(line)
+        if span is not None and span[1] > span[0]:
+            lstart = cpage.PositionFromLine(line)
+            cpage.SetSelection(cpage.PositionRelative(lstart, span[0]),
+                               cpage.PositionRelative(lstart, span[1]))
         cpage.SetFocus()
 
 # -----------------------------------------------------------------------------
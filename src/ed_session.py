@@ -9,6 +9,13 @@
 """
 Editra session file manager.
 
+Session files start with a header line holding the format version followed
+by one JSON record per line for each buffer in the session. Each record has
+the buffers file path and optionally the state needed to restore the buffer
+without redoing detection work (encoding, lexer, caret, scroll and fold
+state along with the files modification time and size). Sessions saved in
+the previous pickle based format are still read.
+
 """
 
 __author__ = "Cody Precord <cprecord@editra.org>"
@@ -19,6 +26,7 @@ __revision__ = "$Revision: 70097 $"
 # Imports
 import wx
 import os
+import json
 import pickle
 
 # Editra Imports
@@ -33,6 +41,9 @@ from . import ebmlib
 # Globals
 _ = wx.GetTranslation
 
+SESSION_MAGIC = 'EDITRA_SESSION'
+SESSION_VERSION = 2
+
 #-----------------------------------------------------------------------------#
 
 class SessionManager(object):
@@ -96,47 +107,95 @@ class SessionManager(object):
             sessions.insert(0, defaultSession)
         return sessions
 
-    def LoadSession(self, name):
-        """Load a named session
+    def IterSession(self, name):
+        """Iterate over the buffer records of a named session. The records
+        are read one at a time as they are consumed.
         @param name: session name
-        @return: list of paths
+        @return: generator of dict (all records have a 'path' key)
+        @raise: TypeError, ValueError on invalid session data
 
         """
         session = self.PathFromSessionName(name)
         assert os.path.exists(session)
-        flist = list()
         with open(session, 'rb') as f_handle:
-            # Load and validate file
-            try:
-                flist = pickle.load(f_handle)
-                # TODO: Extend in future to support loading sessions
-                #       for multiple windows.
-                flist = flist.get('win1', list())
-                for item in flist:
-                    if type(item) not in (str, str):
-                        raise TypeError("Invalid item in unpickled sequence")
-            except (pickle.UnpicklingError, TypeError, EOFError) as e:
-                util.Log("[ed_session][err] %s" % e)
-                raise e # Re throw
+            header = f_handle.readline().split()
+            if not header or header[0] != SESSION_MAGIC.encode('ascii'):
+                # Session saved in the original pickle format
+                f_handle.seek(0)
+                for path in self._LoadPickledSession(f_handle):
+                    yield dict(path=path)
+                return
+
+            version = int(header[1]) if len(header) > 1 else 0
+            if version > SESSION_VERSION:
+                raise ValueError("Unsupported session version %d" % version)
+
+            for line in f_handle:
+                if not line.strip():
+                    continue
+                record = json.loads(line.decode('utf-8', 'surrogateescape'))
+                if not isinstance(record, dict) or \
+                   not isinstance(record.get('path', None), str):
+                    raise TypeError("Invalid record in session file")
+                yield record
+
+    def _LoadPickledSession(self, f_handle):
+        """Load the paths of a session saved in the pickle format
+        @param f_handle: open session file
+        @return: list of paths
+
+        """
+        try:
+            flist = pickle.load(f_handle)
+            # TODO: Extend in future to support loading sessions
+            #       for multiple windows.
+            flist = flist.get('win1', list())
+            for item in flist:
+                if type(item) not in (str, str):
+                    raise TypeError("Invalid item in unpickled sequence")
+        except (pickle.UnpicklingError, TypeError, EOFError) as e:
+            util.Log("[ed_session][err] %s" % e)
+            raise e # Re throw
         return flist
 
+    def LoadSession(self, name):
+        """Load a named session
+        @param name: session name
+        @return: list of paths
+
+        """
+        try:
+            return [record['path'] for record in self.IterSession(name)]
+        except ValueError as e:
+            util.Log("[ed_session][err] %s" % e)
+            raise e
+
     def SaveSession(self, name, paths):
         """Save the given list of files as a session with the given name
         @param name: session name
-        @param paths: list of file paths
+        @param paths: list of file paths or buffer records (dict with at
+                      least a 'path' key)
         @return: bool
 
         """
         session = self.PathFromSessionName(name)
+        tmp = session + '.tmp'
         bOk = False
-        with open(session, 'wb') as f_handle:
-            try:
-                # TODO multi window support
-                sdata = dict(win1=paths)
-                pickle.dump(sdata, f_handle)
-                bOk = True
-            except Exception as msg:
-                util.Log("[ed_session][err] Failed to SaveSessionFile: %s" % msg)
+        try:
+            with open(tmp, 'wb') as f_handle:
+                header = "%s %d\n" % (SESSION_MAGIC, SESSION_VERSION)
+                f_handle.write(header.encode('ascii'))
+                for item in paths:
+                    if not isinstance(item, dict):
+                        item = dict(path=item)
+                    line = json.dumps(item, ensure_ascii=False) + "\n"
+                    f_handle.write(line.encode('utf-8', 'surrogateescape'))
+            os.replace(tmp, session)
+            bOk = True
+        except Exception as msg:
+            util.Log("[ed_session][err] Failed to SaveSessionFile: %s" % msg)
+            if os.path.exists(tmp):
+                os.remove(tmp)
 
         return bOk
 
@@ -24,6 +24,7 @@ __revision__ = '$Revision: 73349 $'
 # Imports
 
 import os
+import re
 import wx
 import wx.stc
 
@@ -56,6 +57,12 @@ EDSTC_EOL_CRLF = ed_glob.EOL_MODE_CRLF
 SPACECHARS = ' \t\r\n'
 NONSPACE = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_'
 OPERATORS = './\?[]{}<>!@#$%^&*():=-+\"\';,'
+
+# Trailing whitespace at the end of a line or the document
+RE_TRAILING_WS = re.compile(r'[^\S\r\n]+(?=\r|\n|\Z)')
+
+# Invisible marker that tracks the lines changed since the last save
+MARKER_MODIFIED = ed_marker.NewMarkerId()
 # -------------------------------------------------------------------------
 
 
@@ -89,6 +96,34 @@ def jumpaction(func):
     return WrapJump
 
 
+def GetTrailingWhitespace(text):
+    """
+    Find the trailing whitespace on each line of the text
+    @param text: string
+    @return: list of (start, end, '') edits for L{ApplyEdits}
+    """
+    return [(match.start(), match.end(), '')
+            for match in RE_TRAILING_WS.finditer(text)]
+
+
+def GetBackupManager():
+    """
+    Get the backup manager and chunk store for the automatic backups as
+    configured in the user profile.
+    @return: (ebmlib.FileBackupMgr, ebmlib.ChunkStore)
+    """
+    suffix = _PGET('AUTOBACKUP_SUFFIX', default='.edbkup')
+    bkupmgr = ebmlib.FileBackupMgr(None, '%s' + suffix)
+    path = _PGET('AUTOBACKUP_PATH', default='')
+    if path and os.path.exists(path):
+        bkupmgr.SetBackupDirectory(path)
+        store = ebmlib.ChunkStore(os.path.join(path, 'chunks'))
+    else:
+        store = ebmlib.ChunkStore(os.path.join(ed_glob.CONFIG['CACHE_DIR'],
+                                               'backup'))
+    return bkupmgr, store
+
+
 # -------------------------------------------------------------------------
 
 class EditraStc(ed_basestc.EditraBaseStc):
@@ -116,6 +151,7 @@ class EditraStc(ed_basestc.EditraBaseStc):
                              wx.stc.STC_PERFORMED_REDO |
                              wx.stc.STC_MOD_DELETETEXT |
                              wx.stc.STC_MOD_INSERTTEXT)
+        self.MarkerDefine(MARKER_MODIFIED, wx.stc.STC_MARK_EMPTY)
 
         self.CmdKeyAssign(ord('-'), wx.stc.STC_SCMOD_CTRL,
                           wx.stc.STC_CMD_ZOOMOUT)
@@ -132,6 +168,9 @@ class EditraStc(ed_basestc.EditraBaseStc):
         self.key_handler = KeyHandler(self)
         self._backup_done = True
         self._bktimer = wx.Timer(self)
+        self._trackmod = True
+        self._modcount = 0 # Number of changes made to the text
+        self._saving = 0   # Number of pending background saves
         self._dwellsent = False
 
         # Macro Attributes
@@ -629,46 +668,107 @@ class EditraStc(ed_basestc.EditraBaseStc):
 
     def OnBackupTimer(self, evt):
         """
-        Backup the buffer to a backup file.
+        Backup the buffer to a backup file. The backup is chunked so only
+        the parts of the text that changed since the last backup are
+        written out.
         @param evt: wx.TimerEvent
         """
         fname = self.GetFileName()
-        # If the file is loading or is over 5MB don't do automatic backups.
-        if self.IsLoading() or ebmlib.GetFileSize(fname) > 5242880:
+        if self.IsLoading() or self._backup_done or not fname:
             return
 
-        # If the file is different than the last save point make the backup.
-        suffix = _PGET('AUTOBACKUP_SUFFIX', default='.edbkup')
-        bkupmgr = ebmlib.FileBackupMgr(None, '%s' + suffix)
-        path = _PGET('AUTOBACKUP_PATH', default='')
-        if path and os.path.exists(path):
-            bkupmgr.SetBackupDirectory(path)
-
-        if not self._backup_done and \
-           (not bkupmgr.HasBackup(fname) or bkupmgr.IsBackupNewer(fname)):
-            msg = _('File backup performed: %s') % fname
-            idval = self.Id
-            target = self.TopLevelParent
-            
-            def BackupJob(fobj, text):
-                writer = bkupmgr.GetBackupWriter(fobj)
-                try:
-                    writer(text)
-                except Exception as msg:
+        bkupmgr, store = GetBackupManager()
+        msg = _('File backup performed: %s') % fname
+        idval = self.Id
+        target = self.TopLevelParent
+
+        def BackupJob(data, info):
+            try:
+                if not bkupmgr.WriteChunkedBackup(fname, data, store, info):
                     return
-                nevt = ed_event.StatusEvent(ed_event.edEVT_STATUS, idval,
-                                            msg, ed_glob.SB_INFO)
-                wx.PostEvent(target, nevt)
-            ed_thread.EdThreadPool().QueueJob(BackupJob, self.File, self.GetText())
-            self._backup_done = True
+            except (IOError, OSError):
+                return
+            nevt = ed_event.StatusEvent(ed_event.edEVT_STATUS, idval,
+                                        msg, ed_glob.SB_INFO)
+            wx.PostEvent(target, nevt)
+
+        # Autosaves are short so they are not held up by long searches
+        info = dict(encoding=self.File.GetEncoding())
+        ed_thread.EdThreadPool().SubmitJob(ed_thread.PRIORITY_INTERACTIVE,
+                                           BackupJob, self.GetTextRaw(), info)
+        self._backup_done = True
+
+    def GetNewerBackup(self):
+        """
+        Get the text of the automatic backup of the buffer's file if it was
+        made after the file was last saved and differs from the buffer.
+        @return: string or None
+        """
+        fname = self.GetFileName()
+        if not fname or not _PGET('AUTOBACKUP'):
+            return None
+
+        bkupmgr, store = GetBackupManager()
+        if not bkupmgr.IsBackupNewer(fname):
+            return None
+
+        try:
+            backup = bkupmgr.ReadChunkedBackup(fname, store)
+        except (IOError, OSError) as msg:
+            self.LOG('[ed_stc][err] Failed to read backup of %s: %s' % \
+                     (fname, msg))
+            return None
+
+        if backup is None:
+            return None
+        text = backup[0].decode('utf-8', 'replace')
+        if text == self.GetText():
+            return None
+        return text
+
+    def RemoveBackup(self, path=None):
+        """
+        Remove the automatic backup of a file once the text it holds has
+        been saved or discarded.
+        @keyword path: file path (default the buffer's file)
+        """
+        fname = path or self.GetFileName()
+        if not fname:
+            return
+
+        bkupmgr, store = GetBackupManager()
+        try:
+            bkupmgr.RemoveChunkedBackup(fname, store)
+        except OSError as msg:
+            self.LOG('[ed_stc][err] Failed to remove backup of %s: %s' % \
+                     (fname, msg))
 
     def OnModified(self, evt):
         """
         Overrides base modified handler
         """
         super(EditraStc, self).OnModified(evt)
+        self._modcount += 1
         if not self.IsLoading():
             self._backup_done = False
+            if self._trackmod:
+                self._MarkModifiedLines(evt)
+
+    def _MarkModifiedLines(self, evt):
+        """
+        Mark the lines touched by an insert or delete so that they can be
+        trimmed on save.
+        @param evt: wx.stc.EVT_STC_MODIFIED
+        """
+        if not evt.GetModificationType() & (wx.stc.STC_MOD_INSERTTEXT |
+                                            wx.stc.STC_MOD_DELETETEXT):
+            return
+
+        mask = 1 << MARKER_MODIFIED
+        line = self.LineFromPosition(evt.GetPosition())
+        for mline in range(line, line + max(evt.GetLinesAdded(), 0) + 1):
+            if not self.MarkerGet(mline) & mask:
+                self.MarkerAdd(mline, MARKER_MODIFIED)
 
     def OnKeyDown(self, evt):
         """
@@ -888,9 +988,11 @@ class EditraStc(ed_basestc.EditraBaseStc):
             self.SetUndoCollection(True)
             del self._loading
             self._loading = None
+            if _PGET('WARN_EOL', default=True) and not self.File.IsRawBytes():
+                self.CheckEOL()
             parent = self.GetParent()
             if hasattr(parent, 'DoPostLoad'):
-                parent.DoPostLoad()
+                parent.DoPostLoad(self)
         elif evt.GetState() == ed_txt.FL_STATE_START:
             ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_SHOW, (pid, True))
             ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE, (pid, 0, self.File.GetSize()))
@@ -1220,35 +1322,29 @@ class EditraStc(ed_basestc.EditraBaseStc):
         will toggle on eol visibility.
         @postcondition: eol mode is configured to best match file
         @todo: Is showing line endings the best way to show mixed?
+        @note: does nothing while the file is loading, it is called again
+               when the load has finished.
         """
-        mixed = diff = False
+        if self.IsLoading():
+            return
+
         eol_map = {'\n': wx.stc.STC_EOL_LF,
                    '\r\n': wx.stc.STC_EOL_CRLF,
                    '\r': wx.stc.STC_EOL_CR}
 
-        eol = chr(self.GetCharAt(self.GetLineEndPosition(0)))
-        if eol == '\r':
-            tmp = chr(self.GetCharAt(self.GetLineEndPosition(0) + 1))
-            if tmp == '\n':
-                eol += tmp
+        # The line endings are counted when the file is decoded, only
+        # count them here if the text did not come from a file read.
+        info = self.File.GetEOLInfo()
+        if info is None:
+            info = ed_txt.EOLCounter()
+            info.Feed(self.GetText())
+            info.Finish()
+
+        eol = info.GetFirstEOL() or self.GetEOLChar()
+        mixed = info.IsMixed()
 
         # Is the eol used in the document the same as what is currently set.
-        if eol != self.GetEOLChar():
-            diff = True
-
-        # Check the lines to see if they are all matching or not.
-        LEPFunct = self.GetLineEndPosition
-        GCAFunct = self.GetCharAt
-        for line in range(self.GetLineCount() - 1):
-            end = LEPFunct(line)
-            tmp = chr(GCAFunct(end))
-            if tmp == '\r':
-                tmp2 = chr(GCAFunct(LEPFunct(0) + 1))
-                if tmp2 == '\n':
-                    tmp += tmp2
-            if tmp != eol:
-                mixed = True
-                break
+        diff = eol != self.GetEOLChar()
 
         if mixed or diff:
             if mixed:
@@ -1294,7 +1390,6 @@ class EditraStc(ed_basestc.EditraBaseStc):
         if mode_id not in (ed_glob.ID_TAB_TO_SPACE, ed_glob.ID_SPACE_TO_TAB):
             return
         tabw = self.GetIndent()
-        pos = self.GetCurrentPos()
         sel = self.GetSelectedText()
         if mode_id == ed_glob.ID_TAB_TO_SPACE:
             cmd = ('\t', ' ' * tabw)
@@ -1306,14 +1401,14 @@ class EditraStc(ed_basestc.EditraBaseStc):
         if sel != wx.EmptyString:
             self.ReplaceSelection(sel.replace(cmd[0], cmd[1]))
         else:
-            self.BeginUndoAction()
-            part1 = self.GetTextRange(0, pos).replace(cmd[0], cmd[1])
-            tmptxt = self.GetTextRange(pos, self.GetLength()).replace(cmd[0], \
-                                                                      cmd[1])
-            self.SetText(part1 + tmptxt)
-            self.GotoPos(len(part1))
+            # Only replace the whitespace runs instead of resetting the text
+            # so that markers, folds and the caret are kept.
+            text = self.GetText()
+            edits = [ (match.start(), match.end(), cmd[1])
+                      for match in re.finditer(re.escape(cmd[0]), text) ]
+            with eclib.Freezer(self) as _tmp:
+                self.ApplyEdits(edits, text)
             self.SetUseTabs(tabs)
-            self.EndUndoAction()
 
     def GetCurrentLineNum(self):
         """
@@ -1560,65 +1655,36 @@ class EditraStc(ed_basestc.EditraBaseStc):
         wx.PostEvent(self.TopLevelParent, evt)
         self._BuildMacro()
 
-    def TrimWhitespace(self):
+    def TrimWhitespace(self, modified_only=False):
         """
-        Trims trailing whitespace from all lines in the document.
+        Trims trailing whitespace from the lines in the document. The spans
+        to remove are found with a single pass over the text and then
+        deleted from the back of the document in one undo action.
+        @keyword modified_only: only trim the lines that were changed since
+                                the last save point.
         @postcondition: all trailing whitespace is removed from document
         """
-        cpos = self.GetCurrentPos()
-        cline = self.GetCurrentLine()
-        cline_len = len(self.GetLine(cline))
-        epos = cline_len - (self.GetLineEndPosition(cline) - cpos)
-
-        # Begin stripping trailing whitespace
-        self.BeginUndoAction()
-        for line in range(self.GetLineCount()):
-            eol = ''
-            tmp = self.GetLine(line)
-
-            # Scintilla stores text in utf8 internally so we need to
-            # encode to utf8 to get the correct length of the text.
-            try:
-                tlen = len(tmp.encode('utf-8'))
-            except:
-                tlen = len(tmp)
-
-            if tlen:
-                if '\r\n' in tmp:
-                    eol = '\r\n'
-                elif '\n' in tmp:
-                    eol = '\n'
-                else:
-                    eol = tmp[-1]
-
-                if not eol.isspace():
-                    continue
-                elif eol in ' \t':
-                    eol = ''
-            else:
-                continue
-
-            # Strip the extra whitespace from the line
-            end = self.GetLineEndPosition(line) + len(eol)
-            start = max(end - tlen, 0)
-            self.SetTargetStart(start)
-            self.SetTargetEnd(end)
-            rtxt = tmp.rstrip() + eol
-            if rtxt != self.GetTextRange(start, end):
-                self.ReplaceTarget(tmp.rstrip() + eol)
-        self.EndUndoAction()
+        if not modified_only:
+            text = self.GetText()
+            self.ApplyEdits(GetTrailingWhitespace(text), text)
+            return
 
-        # Restore carat position
-        cline_len = len(self.GetLine(cline))
-        end = self.GetLineEndPosition(cline)
-        if epos >= cline_len:
-            epos = end
-        else:
-            start = max(end - cline_len, 0)
-            epos += start
+        mask = 1 << MARKER_MODIFIED
+        lines = list()
+        line = self.MarkerNext(0, mask)
+        while line != -1:
+            lines.append(line)
+            line = self.MarkerNext(line + 1, mask)
 
-        if epos != cpos:
-            self.GotoPos(epos)
+        # Trimming the last line first keeps the earlier positions valid
+        self.BeginUndoAction()
+        try:
+            for line in reversed(lines):
+                text = self.GetLine(line)
+                self.ApplyEdits(GetTrailingWhitespace(text), text,
+                                self.PositionFromLine(line))
+        finally:
+            self.EndUndoAction()
 
     def FoldingOnOff(self, switch=None):
         """
@@ -1855,7 +1921,12 @@ class EditraStc(ed_basestc.EditraBaseStc):
         """
         fsize = ebmlib.GetFileSize(path)
         if fsize < 1048576: # 1MB
-            return super(EditraStc, self).LoadFile(path)
+            self._trackmod = False
+            try:
+                return super(EditraStc, self).LoadFile(path)
+            finally:
+                self._trackmod = True
+                self.MarkerDeleteAll(MARKER_MODIFIED)
         else:
             ed_msg.PostMessage(ed_msg.EDMSG_FILE_OPENING, path)
             self.file.SetPath(path)
@@ -1879,11 +1950,14 @@ class EditraStc(ed_basestc.EditraBaseStc):
                 txt = self.File.Read()
                 self.SetReadOnly(False)
                 if txt is not None:
+                    self._trackmod = False
                     if self.File.IsRawBytes() and not ebmlib.IsUnicode(txt):
                         self.AddStyledText(txt)
                         self.SetReadOnly(True) # Don't allow editing of raw bytes
                     else:
                         self.SetText(txt)
+                    self._trackmod = True
+                    self.MarkerDeleteAll(MARKER_MODIFIED)
                 else:
                     return False, _('Failed to reload: %s') % cfile
 
@@ -1930,6 +2004,65 @@ class EditraStc(ed_basestc.EditraBaseStc):
                 else:
                     break
 
+    def _GetSaveText(self, path):
+        """
+        Prepare the buffer for being saved and get a snapshot of its text
+        @param path: path of file to save
+        @return: text to write or None if the file is read only
+        """
+        tlw_id = self.TopLevelParent.Id
+        ed_msg.PostMessage(ed_msg.EDMSG_FILE_SAVE,
+                           (path, self.GetLangId()), tlw_id)
+        self.File.SetPath(path)
+        self.LOG('[ed_stc][info] Writing file %s, with encoding %s' % \
+                 (path, self.File.GetEncoding()))
+
+        if _PGET('AUTO_TRIM_WS', 'bool', False):
+            self.TrimWhitespace(_PGET('AUTO_TRIM_WS_MODIFIED',
+                                      'bool', False))
+
+        if self.File.IsReadOnly():
+            wx.MessageBox(_('File is Read Only and cannot be saved'),
+                          _('Read Only'),
+                          style=wx.OK|wx.CENTER|wx.ICON_WARNING)
+            return None
+        elif not self.File.IsRawBytes():
+            return self.GetText()
+        else:
+            nchars = self.GetTextLength()
+            return self.GetStyledText(0, nchars)[0:nchars*2:2]
+
+    def _FinishSave(self, path, result, modcount):
+        """
+        Update the buffer after its text was written to disk
+        @param path: path of the saved file
+        @param result: whether the file was written or not
+        @param modcount: modification count of the saved text
+        """
+        if result:
+            # Only mark the buffer as saved if it was not changed while
+            # the file was being written.
+            if modcount == self._modcount:
+                self.SetSavePoint()
+                self.MarkerDeleteAll(MARKER_MODIFIED)
+                self._backup_done = True
+                self.RemoveBackup(path)
+            self.SetModTime(ebmlib.GetFileModTime(path))
+            self.File.FireModified()
+            self.SetFileName(path)
+
+        wx.CallAfter(ed_msg.PostMessage,
+                     ed_msg.EDMSG_FILE_SAVED,
+                     (path, self.GetLangId()),
+                     self.TopLevelParent.Id)
+
+    def IsSaving(self):
+        """
+        Is a background thread writing the buffer to disk
+        @return: bool
+        """
+        return self._saving > 0
+
     def SaveFile(self, path):
         """
         Save buffers contents to disk
@@ -1938,45 +2071,88 @@ class EditraStc(ed_basestc.EditraBaseStc):
         """
         result = True
         try:
-            tlw_id = self.TopLevelParent.Id
-            ed_msg.PostMessage(ed_msg.EDMSG_FILE_SAVE,
-                               (path, self.GetLangId()), tlw_id)
-            self.File.SetPath(path)
-            self.LOG('[ed_stc][info] Writing file %s, with encoding %s' % \
-                     (path, self.File.GetEncoding()))
-
-            if _PGET('AUTO_TRIM_WS', 'bool', False):
-                self.TrimWhitespace()
-
-            if self.File.IsReadOnly():
-                wx.MessageBox(_('File is Read Only and cannot be saved'),
-                              _('Read Only'),
-                              style=wx.OK|wx.CENTER|wx.ICON_WARNING)
+            txt = self._GetSaveText(path)
+            if txt is None:
                 return True
-            else:
-                if not self.File.IsRawBytes():
-                    self.File.Write(self.GetText())
-                else:
-                    nchars = self.GetTextLength()
-                    txt = self.GetStyledText(0, nchars)[0:nchars*2:2]
-                    self.File.Write(txt)
+            self.File.Write(txt)
         except Exception as msg:
             result = False
             self.LOG('[ed_stc][err] There was an error saving %s' % path)
             self.LOG('[ed_stc][err] ERROR: %s' % str(msg))
 
-        if result:
-            self.SetSavePoint()
-            self.SetModTime(ebmlib.GetFileModTime(path))
-            self.File.FireModified()
-            self.SetFileName(path)
+        self._FinishSave(path, result, self._modcount)
+        return result
 
-        wx.CallAfter(ed_msg.PostMessage,
-                     ed_msg.EDMSG_FILE_SAVED,
-                     (path, self.GetLangId()),
-                     tlw_id)
+    def SaveFileAsync(self, path, callback=None):
+        """
+        Save buffers contents to disk on a background thread. The text is
+        copied out of the buffer first so editing can continue while it is
+        encoded and written out.
+        @param path: path of file to save
+        @keyword callback: callable(result) called when the save is done
+        @return: JobFuture or None if the file was not written
+        """
+        try:
+            txt = self._GetSaveText(path)
+        except Exception as msg:
+            self.LOG('[ed_stc][err] There was an error saving %s' % path)
+            self.LOG('[ed_stc][err] ERROR: %s' % str(msg))
+            self._FinishSave(path, False, self._modcount)
+            if callback is not None:
+                callback(False)
+            return None
+
+        if txt is None:
+            if callback is not None:
+                callback(True)
+            return None
+
+        # Show the progress of writing large files in the status bar
+        progress = None
+        if len(txt) >= 1048576: # 1MB
+            pid = self.TopLevelParent.Id
+            def PostProgress(done, total):
+                ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE,
+                                   (pid, done, total))
+            progress = PostProgress
+            ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_SHOW, (pid, True))
+            ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE,
+                               (pid, 0, len(txt)))
+
+        self._saving += 1
+        modcount = self._modcount
+        job = self.File.WriteAsync(txt, progress)
+        job.AddDoneCallback(lambda job: wx.CallAfter(self._OnSaveDone, job,
+                                                     path, modcount,
+                                                     progress, callback))
+        return job
+
+    def _OnSaveDone(self, job, path, modcount, progress, callback):
+        """
+        Called on the main thread when a L{SaveFileAsync} has finished
+        @param job: JobFuture of the write
+        @param path: path of the saved file
+        @param modcount: modification count of the saved text
+        @param progress: progress callback or None
+        @param callback: callable(result) or None
+        """
+        if not self:
+            return
 
-        return result
+        self._saving -= 1
+        if progress is not None:
+            ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE,
+                               (self.TopLevelParent.Id, 0, 0))
+
+        err = job.GetError()
+        if err is not None:
+            self.LOG('[ed_stc][err] There was an error saving %s' % path)
+            self.LOG('[ed_stc][err] ERROR: %s' % str(err))
+            self.File.SetLastError(str(err))
+
+        self._FinishSave(path, err is None, modcount)
+        if callback is not None:
+            callback(err is None)
 
     def ConfigureLexer(self, file_ext):
         """
@@ -26,6 +26,8 @@ __revision__ = '$Revision: 72388 $'
 # Imports
 import os
 import re
+import marshal
+import hashlib
 import wx
 
 # Editra Libraries
@@ -44,6 +46,10 @@ RE_ESS_COMMENT = re.compile('\/\*[^*]*\*+([^/][^*]*\*+)*\/')
 RE_ESS_SCALAR = re.compile('\%\([a-zA-Z0-9]+\)')
 RE_HEX_STR = re.compile('#[0-9a-fA-F]{3,6}')
 
+# Compiled style sheet cache
+COMPILED_VERSION = 1        # Format version of compiled style sheets
+_SHEET_INDEX = dict()       # Style directory -> (mtime, {lower name : name})
+
 # --------------------------------------------------------------------------
 
 
@@ -362,6 +368,7 @@ class StyleMgr(object):
     modifying styles during run time.
     """
     STYLES = dict()         # Static cache for loaded style set(s)
+    STAMPS = dict()         # Style sheet path -> (mtime, size) when loaded
     FONT_PRIMARY = 'primary'
     FONT_SECONDARY = 'secondary'
     FONT_SIZE = 'size'
@@ -584,20 +591,12 @@ class StyleMgr(object):
         style = ebmlib.AddFileExtension(style, '.ess').lower()
 
         # Get Correct Filename if it exists
-        for sheet in util.GetResourceFiles('styles', trim=False, 
-                                           get_all=True, title=False):
-            if sheet.lower() == style:
-                style = sheet
-                break
-
-        user = os.path.join(ed_glob.CONFIG['STYLES_DIR'], style)
-        sysp = os.path.join(ed_glob.CONFIG['SYS_STYLES_DIR'], style)
-        if os.path.exists(user):
-            return user
-        elif os.path.exists(sysp):
-            return sysp
-        else:
-            return None
+        for sdir in (ed_glob.CONFIG['STYLES_DIR'],
+                     ed_glob.CONFIG['SYS_STYLES_DIR']):
+            sheet = GetStyleSheetIndex(sdir).get(style)
+            if sheet is not None:
+                return os.path.join(sdir, sheet)
+        return None
 
     def GetSyntaxParams(self):
         """
@@ -622,10 +621,27 @@ class StyleMgr(object):
                         data when available
         @return: whether style sheet was loaded or not
         """
-        if isinstance(style_sheet, str) and \
-           os.path.exists(style_sheet) and \
-           ((force or style_sheet not in StyleMgr.STYLES) or \
-             style_sheet != self.style_set):
+        stamp = None
+        if isinstance(style_sheet, str) and os.path.exists(style_sheet):
+            stat = os.stat(style_sheet)
+            stamp = (stat.st_mtime, stat.st_size)
+
+        if stamp is not None and not force:
+            if style_sheet in StyleMgr.STYLES and \
+               StyleMgr.STAMPS.get(style_sheet) == stamp:
+                # Share the parsed sheet with other buffers using it
+                self.style_set = style_sheet
+                self.LOG('[ed_style][info] Using cached style data')
+                return True
+
+            # Skip parsing if the sheet was compiled by a previous session
+            style_data = LoadCompiledStyles(style_sheet, stamp)
+            if style_data is not None:
+                StyleMgr.STAMPS[style_sheet] = stamp
+                self.LOG('[ed_style][info] Using compiled style data')
+                return self.SetStyles(style_sheet, style_data, nomerge=True)
+
+        if stamp is not None:
             reader = util.GetFileReader(style_sheet)
             if reader == -1:
                 self.LOG('[ed_style][err] Failed to open style sheet: %s' % style_sheet)
@@ -638,6 +654,10 @@ class StyleMgr(object):
                 return False
             ret_val = self.SetStyles(style_sheet, style_data)
             reader.close()
+            if ret_val:
+                StyleMgr.STAMPS[style_sheet] = stamp
+                SaveCompiledStyles(style_sheet, stamp,
+                                   StyleMgr.STYLES[style_sheet])
             return ret_val
         elif style_sheet not in StyleMgr.STYLES:
             self.LOG('[ed_style][warn] Style sheet %s does not exists' % style_sheet)
@@ -941,7 +961,7 @@ class StyleMgr(object):
         @postcondition: style scheme is set to specified style
         """
         if spec_style and (spec_style != self.style_set):
-            self.LoadStyleSheet(self.GetStyleSheet(spec_style), force=True)
+            self.LoadStyleSheet(self.GetStyleSheet(spec_style))
         self.SetSyntax(self.GetSyntaxParams())
         self.Refresh()
 
@@ -1073,6 +1093,99 @@ DEF_STYLE_DICT = \
          }
 
 
+def GetStyleSheetIndex(path):
+    """
+    Get the index of the style sheets in a directory. The index is kept
+    in memory and only rebuilt when the directory has changed.
+    @param path: style sheet directory
+    @return: dict of lower case file name -> file name
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except (OSError, TypeError):
+        return dict()
+
+    index = _SHEET_INDEX.get(path)
+    if index is None or index[0] != mtime:
+        sheets = dict()
+        for fname in os.listdir(path):
+            if fname.lower().endswith('.ess'):
+                sheets[fname.lower()] = fname
+        index = (mtime, sheets)
+        _SHEET_INDEX[path] = index
+    return index[1]
+
+
+def _GetCompiledPath(style_sheet):
+    """
+    Get the path of the compiled cache file for a style sheet
+    @param style_sheet: style sheet path
+    @return: path or None if there is no cache directory
+    """
+    cdir = ed_glob.CONFIG['CACHE_DIR']
+    if not cdir:
+        return None
+    key = hashlib.sha1(style_sheet.encode('utf-8', 'replace')).hexdigest()
+    return os.path.join(cdir, 'styles', key + '.essc')
+
+
+def LoadCompiledStyles(style_sheet, stamp):
+    """
+    Load the compiled style dictionary of a style sheet
+    @param style_sheet: style sheet path
+    @param stamp: (mtime, size) of the style sheet
+    @return: dict of StyleItems or None if there is no valid compiled data
+    """
+    cpath = _GetCompiledPath(style_sheet)
+    if cpath is None or not os.path.exists(cpath):
+        return None
+
+    try:
+        with open(cpath, 'rb') as handle:
+            data = marshal.load(handle)
+        version, path, cstamp, items = data
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if version != COMPILED_VERSION or path != style_sheet or \
+       tuple(cstamp) != stamp:
+        return None
+
+    style_dict = dict()
+    for tag, (null, fore, back, face, size, ex) in items.items():
+        item = StyleItem(fore, back, face, size, list(ex))
+        item.null = null
+        style_dict[tag] = item
+    return style_dict
+
+
+def SaveCompiledStyles(style_sheet, stamp, style_dict):
+    """
+    Save the parsed and packed style dictionary of a style sheet
+    @param style_sheet: style sheet path
+    @param stamp: (mtime, size) of the style sheet
+    @param style_dict: dict of StyleItems
+    """
+    cpath = _GetCompiledPath(style_sheet)
+    if cpath is None:
+        return
+
+    items = dict()
+    for tag, item in style_dict.items():
+        items[tag] = (item.null, item.fore, item.back, item.face,
+                      item.size, tuple(item.GetModifierList()))
+
+    try:
+        if not os.path.exists(os.path.dirname(cpath)):
+            os.makedirs(os.path.dirname(cpath))
+        tmp = cpath + '.tmp'
+        with open(tmp, 'wb') as handle:
+            marshal.dump((COMPILED_VERSION, style_sheet, stamp, items), handle)
+        os.replace(tmp, cpath)
+    except (IOError, OSError, ValueError):
+        pass
+
+
 def MergeFonts(style_dict, font_dict):
     """
     Does any string substitution that the style dictionary
@@ -314,6 +314,31 @@ class TangoTheme(plugin.Plugin):
 
     name = 'Tango'
 
+    # Names of the files in each of the theme's resource directories
+    _index = dict()
+
+    @staticmethod
+    def ResetIndex():
+        """
+        Clear the index of the theme resource directories so that they
+        are rescanned on the next bitmap request.
+        """
+        TangoTheme._index.clear()
+
+    def __GetArtFile(self, client, name, mime=False):
+        """
+        Gets the path of a resource file from the theme using the index
+        of the resource directory instead of checking for it on disk.
+        @param client: wx.ART_MENU/wx.ART_TOOLBAR
+        @param name: file name of the resource
+        @keyword mime: is this a filetype icon lookup
+        @return: path of art resource or None
+        """
+        path = self.__GetArtPath(client, mime)
+        if path is not None and name in TangoTheme._index[path]:
+            return path + name
+        return None
+
     def __GetArtPath(self, client, mime=False):
         """
         Gets the path of the resource directory to get
@@ -341,7 +366,13 @@ class TangoTheme(plugin.Plugin):
                                 clients.get(client, "menu"))
 
         path += os.sep
-        if os.path.exists(path):
+        if path not in TangoTheme._index:
+            try:
+                TangoTheme._index[path] = frozenset(os.listdir(path))
+            except OSError:
+                TangoTheme._index[path] = None
+
+        if TangoTheme._index[path] is not None:
             return path
         else:
             return None
@@ -359,11 +390,9 @@ class TangoTheme(plugin.Plugin):
         @param bmp_id: Id of bitmap to look for
         """
         if bmp_id in ART:
-            path = self.__GetArtPath(wx.ART_MENU, mime=False)
+            path = self.__GetArtFile(wx.ART_MENU, ART[bmp_id])
             if path is not None:
-                path = path + ART[bmp_id]
-                if os.path.exists(path):
-                    return wx.Bitmap(path, wx.BITMAP_TYPE_PNG)
+                return wx.Bitmap(path, wx.BITMAP_TYPE_PNG)
         else:
             return self.GetFileBitmap(bmp_id)
 
@@ -375,17 +404,18 @@ class TangoTheme(plugin.Plugin):
         @param bmp_id: Id of filetype bitmap to look up
         @see: L{syntax.synglob}
         """
-        path = self.__GetArtPath(wx.ART_MENU, mime=True)
-        if path is not None and bmp_id in SYNTAX_IDS:
+        if bmp_id in SYNTAX_IDS:
+            req = None
             if bmp_id in MIME_ART:
-                req = path + MIME_ART[bmp_id]
-                if os.path.exists(req):
-                    return wx.Bitmap(req, wx.BITMAP_TYPE_PNG)
+                req = self.__GetArtFile(wx.ART_MENU, MIME_ART[bmp_id], True)
 
             # Try to fall back to bmp for plain text when above is not found
-            bkup = path + MIME_ART[synglob.ID_LANG_TXT]
-            if os.path.exists(bkup):
-                return wx.Bitmap(bkup, wx.BITMAP_TYPE_PNG)
+            if req is None:
+                req = self.__GetArtFile(wx.ART_MENU,
+                                        MIME_ART[synglob.ID_LANG_TXT], True)
+
+            if req is not None:
+                return wx.Bitmap(req, wx.BITMAP_TYPE_PNG)
 
         return wx.NullBitmap
 
@@ -395,11 +425,9 @@ class TangoTheme(plugin.Plugin):
         @param bmp_id: Id of art resource
         """
         if bmp_id in ART:
-            path = self.__GetArtPath(wx.ART_OTHER, mime=False)
+            path = self.__GetArtFile(wx.ART_OTHER, ART[bmp_id])
             if path is not None:
-                path = path + ART[bmp_id]
-                if os.path.exists(path):
-                    return wx.Bitmap(path, wx.BITMAP_TYPE_PNG)
+                return wx.Bitmap(path, wx.BITMAP_TYPE_PNG)
 
         return wx.NullBitmap
 
@@ -410,16 +438,8 @@ class TangoTheme(plugin.Plugin):
         @return: wx.NullBitmap or a 32x32 bitmap
         """
         if bmp_id in ART:
-            # size = Profile_Get('ICON_SZ', default=(24, 24))
-            path = self.__GetArtPath(wx.ART_TOOLBAR, mime=False)
+            path = self.__GetArtFile(wx.ART_TOOLBAR, ART[bmp_id])
             if path is not None:
-                # tpath = os.path.join(path, '24', ART[bmp_id])
-                # if size[0] == 24 and os.path.exists(tpath):
-                #     path = tpath
-                # else:
-                path = path + ART[bmp_id]
-
-                if os.path.exists(path):
-                    return wx.Bitmap(path, wx.BITMAP_TYPE_PNG)
+                return wx.Bitmap(path, wx.BITMAP_TYPE_PNG)
 
         return wx.NullBitmap
@@ -10,6 +10,13 @@
 Implements and provides the interface for dispatching asynchronous jobs through
 the Editra Threadpool.
 
+Jobs should be submitted with the priority class that matches them so that
+long running searches do not hold up file loading or autosaving:
+
+  - PRIORITY_INTERACTIVE: short jobs the user is waiting on
+  - PRIORITY_LOAD: file loading (default for L{EdThreadPool.QueueJob})
+  - PRIORITY_BACKGROUND: long running jobs such as Find in Files
+
 """
 
 __author__ = "Cody Precord <cprecord@editra.org>"
@@ -22,13 +29,64 @@ import wx
 
 # Local Imports
 from . import ebmlib
+from . import util
+
+#-----------------------------------------------------------------------------#
+# Globals
+PRIORITY_INTERACTIVE = ebmlib.PRIORITY_INTERACTIVE
+PRIORITY_LOAD = ebmlib.PRIORITY_LOAD
+PRIORITY_BACKGROUND = ebmlib.PRIORITY_BACKGROUND
+
+PRIORITY_NAMES = { PRIORITY_INTERACTIVE : 'interactive',
+                   PRIORITY_LOAD : 'load',
+                   PRIORITY_BACKGROUND : 'background' }
+
+# Jobs running longer than this many seconds are reported in the log
+SLOW_JOB_TIME = 5.0
 
 #-----------------------------------------------------------------------------#
 
 class EdThreadPool(ebmlib.ThreadPool, metaclass=ebmlib.Singleton):
     """Singleton ThreadPool"""
     def __init__(self):
-        super(EdThreadPool, self).__init__(5) # 5 Threads
+        super(EdThreadPool, self).__init__() # Sized on the number of cores
+
+    def OnJobDone(self, job):
+        """Report failed and slow jobs to the log
+        @param job: ebmlib.JobFuture
+
+        """
+        if job.GetError() is not None:
+            util.Log("[ed_thread][err] Job %s failed: %s" % \
+                     (job.Name, job.GetTraceback()))
+        elif job.GetRunTime() > SLOW_JOB_TIME:
+            util.Log("[ed_thread][info] Job %s ran for %.2fs" % \
+                     (job.Name, job.GetRunTime()))
+
+    def FormatStats(self):
+        """Get a summary of the pools statistics for display in the log
+        @return: list of strings
+
+        """
+        stats = self.GetStats()
+        lines = ["Threads: %d, busy: %d" % (stats['threads'], stats['busy'])]
+        for pri in sorted(stats['jobs']):
+            jstats = stats['jobs'][pri]
+            ran = max(1, jstats['completed'] + jstats['failed'])
+            lines.append(("%s: queued %d, done %d, failed %d, cancelled %d, "
+                          "avg wait %.3fs (max %.3fs), "
+                          "avg run %.3fs (max %.3fs)") % \
+                         (PRIORITY_NAMES[pri], stats['queued'][pri],
+                          jstats['completed'], jstats['failed'],
+                          jstats['cancelled'], jstats['wait'] / ran,
+                          jstats['max_wait'], jstats['run'] / ran,
+                          jstats['max_run']))
+        return lines
+
+    def LogStats(self):
+        """Write the pools statistics to the log"""
+        for line in self.FormatStats():
+            util.Log("[ed_thread][info] %s" % line)
 
 #-----------------------------------------------------------------------------#
         
\ No newline at end of file
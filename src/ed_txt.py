@@ -17,18 +17,23 @@ __revision__ = "$Revision: 72103 $"
 
 #--------------------------------------------------------------------------#
 # Imports
+import os
 import sys
 import re
 import time
+import json
+import threading
 import wx
 import codecs
 import encodings as enclib
 import locale
+from collections import OrderedDict
 from io import StringIO
 
 # Local Imports
 from .util import Log
 from .profiler import Profile_Get
+from . import ed_glob
 from . import ed_msg
 from . import ebmlib
 from . import ed_thread
@@ -54,6 +59,12 @@ BOM = { 'utf-8'  : codecs.BOM_UTF8,
 # The first group from this expression will be the encoding.
 RE_MAGIC_COMMENT = re.compile("coding[:=]\s*\"*([-\w.]+)\"*")
 
+# Number of bytes read from the start of a file to detect its encoding
+ENC_SAMPLE_SIZE = 4096
+
+# Size of the chunks that files are written in
+WRITE_CHUNK_SIZE = 262144
+
 # File Load States
 FL_STATE_START   = 0
 FL_STATE_READING = 1
@@ -97,13 +108,15 @@ class EdFile(ebmlib.FileObjectImpl):
         self._raw = False           # Raw bytes?
         self._fuzzy_enc = False
         self._job = None # async file read job
+        self._eol = None # EOLCounter of the last read
+        self._wlock = threading.Lock() # serializes writes
 
     def _SanitizeBOM(self, bstring):
         """Remove byte order marks that get automatically added by some codecs"""
         for enc in ('utf-8', 'utf-32', 'utf-16'):
             bmark = BOM.get(enc)
             if bstring.startswith(bmark):
-                bstring = bstring.lstrip(bmark)
+                bstring = bstring[len(bmark):]
                 break
         return bstring
 
@@ -120,6 +133,16 @@ class EdFile(ebmlib.FileObjectImpl):
         self._raw = True
         return '\0'.join(bytes_value)+'\0'
 
+    def _CacheEncoding(self):
+        """Remember the encoding of the file for the next time it is read.
+        Files whose encoding was only guessed at or that could not be
+        decoded are not cached so that they are checked again.
+
+        """
+        if not self._raw and not self._fuzzy_enc and self.encoding:
+            EncodingCache().Set(self.GetPath(), self.encoding,
+                                self.HasBom(), self._magic['comment'])
+
     def _ResetBuffer(self):
         Log("[ed_txt][info] Resetting buffer")
         if self.__buffer is not None:
@@ -227,6 +250,10 @@ class EdFile(ebmlib.FileObjectImpl):
             ustr = ustr.replace('\x05', ' ')
             self.SetEncoding('binary')
             self._raw = True
+        else:
+            self._eol = EOLCounter()
+            self._eol.Feed(ustr)
+            self._eol.Finish()
 
         return ustr
 
@@ -243,8 +270,20 @@ class EdFile(ebmlib.FileObjectImpl):
             return
 
         assert self.Handle is not None, "File handle not initialized"
-        lines = [ self.Handle.readline() for x in range(2) ]
+        cached = EncodingCache().Get(self.GetPath())
+        if cached is not None:
+            enc, has_bom, magic = cached
+            Log("[ed_txt][info] DetectEncoding - Cached encoding %s" % enc)
+            self.bom = BOM.get(enc, None) if has_bom else None
+            self._magic['comment'] = magic
+            self._fuzzy_enc = False
+            self.encoding = enc
+            return
+
+        # All checks are done on a single sample from the start of the file
+        sample = self.Handle.read(ENC_SAMPLE_SIZE)
         self.Handle.seek(0)
+        lines = sample.splitlines(True)[:2]
         enc = None
         if len(lines):
             # First check for a Byte Order Mark
@@ -264,7 +303,7 @@ class EdFile(ebmlib.FileObjectImpl):
 
         if enc is None:
             Log("[ed_txt][info] Doing brute force encoding check")
-            enc = GuessEncoding(self.GetPath(), 4096)
+            enc = GuessEncodingBytes(sample)
 
         if enc is None:
             self._fuzzy_enc = True
@@ -273,19 +312,18 @@ class EdFile(ebmlib.FileObjectImpl):
         Log("[ed_txt][info] DetectEncoding - Set Encoding to %s" % enc)
         self.encoding = enc 
 
-    def EncodeText(self):
-        """Do a trial run of encoding all the text to ensure that we can
-        determine an encoding that will correctly be able to write the data
-        to disk.
-        @return: bool
+    def EncodeText(self, value):
+        """Encode the text to the bytes that will be written to disk. The
+        files encoding is tried first and then the other available encodings
+        if the text cannot be represented in it.
+        @param value: (Unicode) String of text
+        @return: bytes
+        @throws: WriteError Failed to encode the text with any encoding
 
         """
-        bOk = True
-        txt = self.__buffer.read(8)
-        self.__buffer.seek(0)
-        if not ebmlib.IsUnicode(txt):
-            # Already a string so nothing to do
-            return bOk
+        if not ebmlib.IsUnicode(value):
+            # Already a byte string so nothing to do
+            return value
 
         encs = GetEncodings()
         if self.encoding is None:
@@ -293,16 +331,10 @@ class EdFile(ebmlib.FileObjectImpl):
         encs.insert(0, self.encoding)
         cenc = self.encoding
 
-        readsize = min(self.__buffer.len, 4096)
         for enc in encs:
-            self.__buffer.seek(0)
             try:
-                tmpchars = self.__buffer.read(readsize)
-                while len(tmpchars):
-                    tmpchars.encode(enc)
-                    tmpchars = self.__buffer.read(readsize)
+                data = value.encode(enc)
                 self.encoding = enc
-                self.__buffer.seek(0)
                 self.ClearLastError()
             except LookupError as msg:
                 Log("[ed_txt][err] Invalid encoding: %s" % enc)
@@ -315,7 +347,6 @@ class EdFile(ebmlib.FileObjectImpl):
             else:
                 break
         else:
-            bOk = False
             raise WriteError("Failed to encode text to byte string")
 
         # Log if the encoding changed due to encoding errors
@@ -323,8 +354,11 @@ class EdFile(ebmlib.FileObjectImpl):
             Log("[ed_txt][warn] Used encoding %s differs from original %s" %\
                 (self.encoding, cenc))
 
-        self.__buffer.seek(0)
-        return bOk
+        data = self._SanitizeBOM(data)
+        if self.HasBom():
+            Log("[ed_txt][info] Adding BOM back to text")
+            data = self.bom + data
+        return data
 
     def FireModified(self):
         """Fire the modified callback(s)"""
@@ -352,6 +386,13 @@ class EdFile(ebmlib.FileObjectImpl):
             return Profile_Get('ENCODING', default=DEFAULT_ENCODING)
         return self.encoding
 
+    def GetEOLInfo(self):
+        """Get the end of line statistics of the text from the last read
+        @return: EOLCounter or None if they are not available
+
+        """
+        return self._eol
+
     def GetMagic(self):
         """Get the magic comment if one was present
         @return: string or None
@@ -396,6 +437,7 @@ class EdFile(ebmlib.FileObjectImpl):
 
             self._ResetBuffer()
             self._raw = False
+            self._eol = None
 
             Log("[ed_txt][info] Read - Start reading")
             tmp = self.Handle.read(chunk)
@@ -407,6 +449,7 @@ class EdFile(ebmlib.FileObjectImpl):
             self.Close()
             txt = self.DecodeText()
             self.SetModTime(ebmlib.GetFileModTime(self.GetPath()))
+            self._CacheEncoding()
             self._ResetBuffer()
             return txt
         else:
@@ -424,7 +467,8 @@ class EdFile(ebmlib.FileObjectImpl):
         ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE, (pid, 1, filesize))
         # Fork off async job to threadpool
         self._job = FileReadJob(control, self.ReadGenerator, 4096)
-        ed_thread.EdThreadPool().QueueJob(self._job.run)
+        ed_thread.EdThreadPool().SubmitJob(ed_thread.PRIORITY_LOAD,
+                                           self._job.run)
 
     def ReadGenerator(self, chunk=512):
         """Get the contents of the file as a string, automatically handling
@@ -441,6 +485,8 @@ class EdFile(ebmlib.FileObjectImpl):
             throttle = max(chunk, filesize/100)
 
             self.DetectEncoding()
+            self._eol = None
+            eol = EOLCounter()
             try:
                 # Must use codec reader to ensure correct number of
                 # bytes are read in to be decoded.
@@ -449,13 +495,14 @@ class EdFile(ebmlib.FileObjectImpl):
                 while True:
                     tmp = reader.read(chunk)
                     if not len(tmp):
-                        if buffered_data.len:
+                        if buffered_data.tell():
                             yield buffered_data.getvalue()
                             buffered_data.close()
                         break
 
+                    eol.Feed(tmp)
                     buffered_data.write(tmp)
-                    if buffered_data.len >= throttle:
+                    if buffered_data.tell() >= throttle:
                         yield buffered_data.getvalue()
                         buffered_data.close()
                         buffered_data = StringIO()
@@ -466,6 +513,10 @@ class EdFile(ebmlib.FileObjectImpl):
                 self.Close()
                 if self._magic['comment']:
                     self._magic['bad'] = True
+            else:
+                self._CacheEncoding()
+                eol.Finish()
+                self._eol = eol
 
             Log("[ed_txt][info] Decoded %s with %s" % (self.Path, self.Encoding))
             self.SetModTime(ebmlib.GetFileModTime(self.Path))
@@ -487,6 +538,7 @@ class EdFile(ebmlib.FileObjectImpl):
         self._magic = dict(comment=None, bad=False)
         self.encoding = Profile_Get('ENCODING', default=DEFAULT_ENCODING)
         self.bom = None
+        self._eol = None
 
     def SetEncoding(self, enc):
         """Explicitly set/change the encoding of the file
@@ -504,66 +556,263 @@ class EdFile(ebmlib.FileObjectImpl):
         """
         raise NotImplementedError
 
-    def Write(self, value):
-        """Write the given value to the file
+    def Write(self, value, progress=None):
+        """Write the given value to the file. The text is encoded before
+        the file is touched and then written to a temporary file that
+        replaces the original once it is safely on disk, so a failed
+        write never leaves the file truncated.
         @param value: (Unicode) String of text to write to disk
+        @keyword progress: callable(bytes written, total bytes)
         @note: exceptions are allowed to be raised for the writing
-        @throws: WriteError Failed to open file for writing
-        @throws: UnicodeEncodeError Failed to encode text using set encoding
+        @throws: WriteError Failed to encode the text or write the file
 
         """
         ctime = time.time()
         Log("[ed_txt][info] Write - Called: %s - Time: %d" % (self.Path, ctime))
 
-        # Check if a magic comment was added or changed
-        self._ResetBuffer()
-        self.__buffer.write(value)
-        self.__buffer.seek(0)
-        enc = CheckMagicComment([ self.__buffer.readline() for x in range(2) ])
-        self.__buffer.seek(0)
-
-        # Update encoding if necessary
-        if enc is not None:
-            Log("[ed_txt][info] Write: found magic comment: %s" % enc)
-            self.encoding = enc
+        with self._wlock:
+            # Check if a magic comment was added or changed
+            if ebmlib.IsUnicode(value):
+                lines = value[:ENC_SAMPLE_SIZE].splitlines(True)[:2]
+                enc = CheckMagicComment(lines)
+                if enc is not None:
+                    Log("[ed_txt][info] Write: found magic comment: %s" % enc)
+                    self.encoding = enc
+
+            # Encode to byte string
+            # Do before opening file so that encoding failures don't cause
+            # file data to get lost!
+            data = self.EncodeText(value)
+            Log("[ed_txt][info] Write Successful encode with %s" % self.Encoding)
+
+            if not len(self.Path):
+                self.SetLastError("No file path set")
+                raise WriteError(self.GetLastError())
 
-        # Encode to byte string
-        # Do before opening file so that encoding failures don't cause file
-        # data to get lost!
-        if self.EncodeText():
-            Log("[ed_txt][info] Write Successful test encode with %s" % self.Encoding)
-
-            # Open and write the file
-            if self.DoOpen('wb'):
-                Log("[ed_txt][info] Opened %s, writing as %s" % (self.Path, self.Encoding))
-                
-                if self.HasBom():
-                    Log("[ed_txt][info] Adding BOM back to text")
-                    self.Handle.write(self.bom)
-
-                # Write the file to disk
-                chunk = min(self.__buffer.len, 4096)
-                buffer_read = self.__buffer.read
-                filewrite = self.Handle.write
-                fileflush = self.Handle.flush
-                sanitize = self._SanitizeBOM
-                tmp = buffer_read(chunk)
-                while len(tmp):
-                    tmp_bytes = sanitize(tmp.encode(self.Encoding))
-                    filewrite(tmp_bytes)
-                    fileflush()
-                    tmp = buffer_read(chunk)
-
-                self._ResetBuffer() # Free buffer
-                self.Close()
-                Log("[ed_txt][info] %s was written successfully" % self.Path)
-            else:
-                self._ResetBuffer()
+            try:
+                AtomicWrite(self.Path, data, progress)
+            except (IOError, OSError) as msg:
+                self.SetLastError(str(msg))
                 raise WriteError(self.GetLastError())
 
+            self._CacheEncoding()
+            Log("[ed_txt][info] %s was written successfully" % self.Path)
+
         Log("[ed_txt][info] Write - Complete: %s - Time: %d" % 
             (self.Path, time.time() - ctime))
 
+    def WriteAsync(self, value, progress=None):
+        """Write the given value to the file on a background thread
+        @param value: (Unicode) String of text to write to disk
+        @keyword progress: callable(bytes written, total bytes) called
+                           from the background thread
+        @return: JobFuture (see L{Write} for the errors it can hold)
+
+        """
+        Log("[ed_txt][info] EdFile.WriteAsync()")
+        return ed_thread.EdThreadPool().SubmitJob(ed_thread.PRIORITY_INTERACTIVE,
+                                                  self.Write, value, progress)
+
+#-----------------------------------------------------------------------------#
+
+class EOLCounter(object):
+    """Counts the LF, CRLF and CR line endings of a text in a single pass.
+    The text can be fed in chunks, a CRLF that is split between two chunks
+    is counted correctly.
+
+    """
+    def __init__(self):
+        super(EOLCounter, self).__init__()
+
+        # Attributes
+        self.lf = 0
+        self.crlf = 0
+        self.cr = 0
+        self._first = None      # First line ending in the text
+        self._lastcr = False    # Did the last chunk end with a CR
+
+    def Feed(self, data):
+        """Count the line endings in the next chunk of text
+        @param data: string or bytes
+
+        """
+        if not len(data):
+            return
+
+        if isinstance(data, str):
+            nl, cr = '\n', '\r'
+        else:
+            nl, cr = b'\n', b'\r'
+
+        crlf = data.count(cr + nl)
+        self.crlf += crlf
+        self.lf += data.count(nl) - crlf
+        self.cr += data.count(cr) - crlf
+
+        starts_nl = data[:1] == nl
+        if self._lastcr and starts_nl:
+            # CRLF split across the chunks was counted as a CR and a LF
+            self.cr -= 1
+            self.lf -= 1
+            self.crlf += 1
+
+        if self._first is None:
+            if self._lastcr:
+                # The previous chunk ended with the first line ending
+                self._first = '\r\n' if starts_nl else '\r'
+            else:
+                npos = data.find(nl)
+                rpos = data.find(cr)
+                if rpos >= 0 and (npos < 0 or rpos < npos):
+                    # Only known once the next chunk is seen if CR is last
+                    if rpos + 1 < len(data):
+                        self._first = '\r\n' if npos == rpos + 1 else '\r'
+                elif npos >= 0:
+                    self._first = '\n'
+
+        self._lastcr = data[-1:] == cr
+
+    def Finish(self):
+        """Finish counting after the last chunk has been fed"""
+        if self._first is None and self._lastcr:
+            self._first = '\r'
+
+    def GetFirstEOL(self):
+        """Get the line ending used by the first line
+        @return: string or None if the text has no line endings
+
+        """
+        return self._first
+
+    def IsMixed(self):
+        """Does the text use more than one kind of line ending
+        @return: bool
+
+        """
+        return len([ cnt for cnt in (self.lf, self.crlf, self.cr) if cnt ]) > 1
+
+#-----------------------------------------------------------------------------#
+
+class EncodingCache(object, metaclass=ebmlib.Singleton):
+    """Persistent cache of the encodings of previously read files. Entries
+    are keyed on the file path and are only valid while the size and
+    modification time of the file are unchanged.
+
+    """
+    MAX_ENTRIES = 2000
+
+    def __init__(self, path=None):
+        """Create the cache
+        @keyword path: file to persist the cache in (default is the
+                       encodings file in the cache directory)
+
+        """
+        super(EncodingCache, self).__init__()
+
+        # Attributes
+        if path is None and ed_glob.CONFIG['CACHE_DIR']:
+            path = os.path.join(ed_glob.CONFIG['CACHE_DIR'], 'encodings')
+        self._path = path
+        self._entries = OrderedDict()   # path -> (mtime, size, enc, bom, magic)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+
+    def _EnsureLoaded(self):
+        """Load the saved entries the first time the cache is used
+        @note: must be called with the lock held
+
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self._path or not os.path.exists(self._path):
+            return
+
+        try:
+            with open(self._path, 'r', encoding='utf-8',
+                      errors='surrogateescape') as handle:
+                for entry in json.load(handle):
+                    self._entries[entry[0]] = tuple(entry[1:6])
+        except (IOError, OSError, ValueError, TypeError, IndexError) as msg:
+            Log("[ed_txt][err] Failed to load encoding cache: %s" % msg)
+            self._entries.clear()
+
+    @staticmethod
+    def _GetStamp(path):
+        """Get the (mtime, size) of a file
+        @return: tuple or None if the file can not be accessed
+
+        """
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError, ValueError):
+            return None
+        return (stat.st_mtime, stat.st_size)
+
+    def Get(self, path):
+        """Get the cached encoding information for a file
+        @param path: file path
+        @return: (encoding, has bom, magic comment) or None
+
+        """
+        stamp = EncodingCache._GetStamp(path)
+        if stamp is None:
+            return None
+
+        with self._lock:
+            self._EnsureLoaded()
+            entry = self._entries.get(path, None)
+            if entry is None or tuple(entry[:2]) != stamp:
+                return None
+            self._entries.move_to_end(path)
+            return tuple(entry[2:])
+
+    def Set(self, path, enc, bom=False, magic=None):
+        """Cache the encoding information for a file at its current state
+        @param path: file path
+        @param enc: encoding name
+        @keyword bom: does the file start with a byte order mark
+        @keyword magic: encoding from the magic comment if any
+
+        """
+        stamp = EncodingCache._GetStamp(path)
+        if stamp is None:
+            return
+
+        entry = stamp + (enc, bool(bom), magic)
+        with self._lock:
+            self._EnsureLoaded()
+            if self._entries.get(path, None) != entry:
+                self._entries[path] = entry
+                self._dirty = True
+            self._entries.move_to_end(path)
+            while len(self._entries) > EncodingCache.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def Save(self):
+        """Write the cache to disk if it has changed
+        @return: bool
+
+        """
+        with self._lock:
+            if not self._path or not self._dirty:
+                return True
+            entries = [ [path] + list(entry)
+                        for path, entry in self._entries.items() ]
+            self._dirty = False
+
+        tmp = self._path + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8',
+                      errors='surrogateescape') as handle:
+                json.dump(entries, handle)
+            os.replace(tmp, self._path)
+        except (IOError, OSError, ValueError) as msg:
+            Log("[ed_txt][err] Failed to save encoding cache: %s" % msg)
+            return False
+        return True
+
 #-----------------------------------------------------------------------------#
 
 class FileReadJob(object):
@@ -658,6 +907,18 @@ class FileLoadEvent(wx.PyEvent):
 
 #-----------------------------------------------------------------------------#
 # Utility Function
+def AtomicWrite(path, data, progress=None):
+    """Write data to a file through a temporary file that is renamed over
+    the original once it has been flushed to disk (see L{ebmlib.AtomicWrite})
+    @param path: file path (symbolic links are followed)
+    @param data: bytes
+    @keyword progress: callable(bytes written, total bytes)
+    @throws: IOError, OSError
+
+    """
+    if not ebmlib.AtomicWrite(path, data, progress, WRITE_CHUNK_SIZE):
+        Log("[ed_txt][warn] Could not create temp file, wrote in place")
+
 def CheckBom(line):
     """Try to look for a bom byte at the beginning of the given line
     @param line: line (first line) of a file
@@ -677,13 +938,16 @@ def CheckBom(line):
 def CheckMagicComment(lines):
     """Try to decode the given text on the basis of a magic
     comment if one is present.
-    @param lines: list of lines to check for a magic comment
+    @param lines: list of lines (string or bytes) to check for a magic comment
     @return: encoding or None
 
     """
     Log("[ed_txt][info] CheckMagicComment: %s" % str(lines))
     enc = None
     for line in lines:
+        if isinstance(line, bytes):
+            # The comment itself is ascii
+            line = line.decode('latin-1')
         match = RE_MAGIC_COMMENT.search(line)
         if match:
             enc = match.group(1)
@@ -767,20 +1031,54 @@ def GuessEncoding(fname, sample):
     @param sample: pre-read amount
     @return: encoding or None
 
+    """
+    try:
+        with open(fname, 'rb') as handle:
+            data = handle.read(sample)
+    except (IOError, OSError):
+        return None
+    return GuessEncodingBytes(data)
+
+def GuessEncodingBytes(sample):
+    """Attempt to guess the encoding of a sample of bytes from the start of
+    a file by trying to decode it with each of the candidate encodings.
+    @param sample: bytes
+    @return: encoding or None
+
     """
     for enc in GetEncodings():
         try:
-            with open(fname, 'rb') as handle:
-                with codecs.getreader(enc)(handle) as reader:
-                    value = reader.read(sample)
-                    if str('\0') in value:
-                        continue
-                    else:
-                        return enc
+            # Incremental decoding so a multibyte character that is split
+            # at the end of the sample is not treated as an error.
+            decoder = codecs.getincrementaldecoder(enc)()
+            value = decoder.decode(sample, False)
         except Exception as msg:
             continue
+
+        if '\0' not in value:
+            return enc
     return None
 
+def GetFileEncoding(path):
+    """Get the encoding that a file is decoded with when it is opened in a
+    buffer (see L{EdFile.DetectEncoding}). Files with a utf-8 byte order
+    mark get the codec that skips it.
+    @param path: file path
+    @return: encoding name
+
+    """
+    fobj = EdFile(path)
+    if fobj.DoOpen('rb'):
+        try:
+            fobj.DetectEncoding()
+        finally:
+            fobj.Close()
+
+    enc = fobj.GetEncoding()
+    if fobj.HasBom() and enc.replace('_', '-').lower() == 'utf-8':
+        enc = 'utf-8-sig'
+    return enc
+
 def GetEncodings():
     """Get a list of possible encodings to try from the locale information
     @return: list of strings
@@ -327,21 +327,53 @@ class EditraCommander(object):
     def EndUndoAction(self):
         self.stc.EndUndoAction()
 
+    def _MoveLines(self, repeat, down):
+        """Move the caret up or down a number of visible lines. Counted moves
+        jump straight to the line before the target and then make a single
+        line move so the caret keeps its remembered column.
+        @param repeat: int
+        @param down: bool
+
+        """
+        if repeat > 1:
+            cline = self.stc.GetCurrentLine()
+            vline = self.stc.VisibleFromDocLine(cline)
+            if down:
+                vline += repeat
+            else:
+                vline = max(0, vline - repeat)
+            target = min(self.stc.DocLineFromVisible(vline),
+                         self.stc.GetLineCount() - 1)
+
+            if target != cline:
+                # Goto the visible line next to the target on the side the
+                # caret is coming from.
+                vline = self.stc.VisibleFromDocLine(target)
+                if down:
+                    line = self.stc.DocLineFromVisible(vline - 1)
+                    self.stc.GotoPos(self.stc.GetLineEndPosition(line))
+                else:
+                    line = self.stc.DocLineFromVisible(vline + 1)
+                    self.stc.GotoPos(self.stc.PositionFromLine(line))
+
+        if down:
+            self.stc.LineDown()
+        else:
+            self.stc.LineUp()
+
     def MoveUp(self, repeat=1):
         """Move caret up
         @keyword repeat: int
 
         """
-        for i in range(repeat):
-            self.stc.LineUp()
+        self._MoveLines(repeat, False)
 
     def MoveDown(self, repeat=1):
         """Move caret down
         @keyword repeat: int
 
         """
-        for i in range(repeat):
-            self.stc.LineDown()
+        self._MoveLines(repeat, True)
 
     def MoveRight(self, repeat=1):
         """Move position to the right
@@ -670,17 +702,15 @@ class EditraCommander(object):
         elif not bIsLine:
             self.stc.CharRight()
 
-        for i in range(repeat):
-            self.InsertText(text)
+        self.InsertText(text * repeat)
         self.EndUndoAction()
 
     def InvertCase(self, repeat):
         """Invert the case of the following characters"""
         if not self.HasSelection():
-            for i in range(repeat):
-                self.StartSelection()
-                self.MoveForward()
-                self.EndSelection()
+            self.StartSelection()
+            self.MoveForward(repeat)
+            self.EndSelection()
         self.stc.InvertCase()
         self.Deselect()
 
@@ -721,8 +751,7 @@ class EditraCommander(object):
         """Replace the next character under cursor with the given char"""
         self.BeginUndoAction()
         self.DeleteForward(repeat)
-        for i in range(repeat):
-            self.InsertText(char)
+        self.InsertText(char * repeat)
         self.EndUndoAction()
 
     def FindNextChar(self, char, repeat):
@@ -887,6 +916,20 @@ def SplitRepeat(cmd):
         repeat = int(repeat)
     return (repeat, rest)
 
+def BuildDispatch(h_list):
+    """Build the table that maps the first character of a command to the
+    handler function for it. When more than one handler claims a character
+    the first one in the list wins.
+    @param h_list: list of handler functions
+    @return: dict
+
+    """
+    table = dict()
+    for handler in h_list:
+        for char in handler.start_chars:
+            table.setdefault(char, handler)
+    return table
+
 def GetHandler(cmd, h_list=None):
     """Finds the function that handles command cmd
     @param cmd: the command string
@@ -894,30 +937,39 @@ def GetHandler(cmd, h_list=None):
 
     """
     if h_list is None:
-        h_list = HANDLERS
+        table = DISPATCH
+    elif h_list is MOTION_HANDLERS:
+        table = MOTION_DISPATCH
+    else:
+        table = BuildDispatch(h_list)
 
     repeat, cmd = SplitRepeat(cmd)
     if not cmd:
         return None
 
-    for handler in h_list:
-        if cmd[0] in handler.start_chars:
-            return handler
+    return table.get(cmd[0], None)
 
-def DoHandle(handler, cmd, editor):
+def DoHandle(handler, cmd, editor, repeat=None):
     """Call handler for command
     It's necessary to use this function instead of calling the handler
     directly.
+    @keyword repeat: count to apply in addition to the one in the command
 
     """
-    repeat, cmd = SplitRepeat(cmd)
+    count, cmd = SplitRepeat(cmd)
+    if repeat is None:
+        repeat = count
+    elif count:
+        repeat = repeat * count
+
     if handler.generic_repeat:   # generic_repeat means that if no repeat
         repeat = repeat or 1     # parameter is supplied, use 1
     return handler(editor, repeat, cmd)
 
-def GetMotion(editor, cmd):
+def GetMotion(editor, cmd, repeat=None):
     """Move cursor of editor to a new location according to motion
     Returns a method that handles this motion, or None
+    @keyword repeat: count to pass to the motion
 
     """
     if not cmd:
@@ -928,9 +980,18 @@ def GetMotion(editor, cmd):
         return None
 
     def motion_function():
-        return DoHandle(handler, cmd, editor)
+        return DoHandle(handler, cmd, editor, repeat)
     return motion_function
 
+def CallEditor(editor, name, *args):
+    """Call a method of the editor commander by name
+    @param editor: EditraCommander
+    @param name: method name
+    @return: the method's return value
+
+    """
+    return getattr(editor, name)(*args)
+
 # ---------------------------------------------------------------------------- #
 # Vim commands
 
@@ -971,18 +1032,35 @@ def vim_parser(start_chars, generic_repeat=True, is_motion=False):
 NeedMore = True
 InvalidOp = False
 
+# Command to commander method maps used by the handlers below, these are
+# shared by all commanders so that they are not rebuilt on each keystroke.
+INSERT_MAP = { 'I': 'GotoIndentStart', 'A': 'GotoLineEnd',
+               'a': 'MoveForward', 'o': 'OpenLine', 'O': 'OpenLineUp' }
+ARROW_MAP = { 'h': 'MoveLeft', 'j': 'MoveDown', 'k': 'MoveUp',
+              'l': 'MoveRight', '\r': 'MoveDown', ' ': 'MoveRight',
+              '\x08': 'MoveLeft' }
+WORD_MAP = { 'w': 'NextWord', 'e': 'WordEnd', 'b': 'BackWord',
+             'W': 'NextWordBig', 'E': 'WordEndBig', 'B': 'BackWordBig',
+             '[': 'BackWordPart', ']': 'WordPartEnd' }
+LINE_MAP = { '0': 'GotoLineStart', '^': 'GotoIndentStart',
+             '$': 'GotoLineEnd' }
+PARA_MAP = { '{': 'ParaUp', '}': 'ParaDown' }
+IDENT_MAP = { '#': 'PrevIdent', '*': 'NextIdent' }
+DELETE_MAP = { 'x': 'dl', 'X': 'dh', 's': 'cl', 'S': 'cc',
+               'C': 'c$', 'D': 'd$', 'Y': 'y$' }
+CHANGE_MAP = { 'y': 'YankSelection', 'd': 'DeleteSelection',
+               'c': 'ChangeSelection', '<': 'DedentSelection',
+               '>': 'IndentSelection' }
+FIND_MAP = { 'f': 'FindNextChar', 'F': 'FindPrevChar',
+             't': 'FindTillNextChar', 'T': 'FindTillPrevChar' }
+
 @vim_parser( 'iIaAoO' )
 def InsertMode(editor, repeat, cmd):
     """Handler for basic commands that put vim in INSERT mode"""
-    cmd_map = {
-            'i': (lambda:None),
-            'I': editor.GotoIndentStart,
-            'A': editor.GotoLineEnd,
-            'a': editor.MoveForward,
-            'o': editor.OpenLine,
-            'O': editor.OpenLineUp
-            }
-    func = cmd_map[cmd]
+    if cmd in INSERT_MAP:
+        func = getattr(editor, INSERT_MAP[cmd])
+    else:
+        func = (lambda:None)
     func()
     editor.SetLastChangeCommand(func)  # Let the editor remember to repeat
     editor.SetInsertRepeat(repeat)     # insertion if and when needed
@@ -1013,17 +1091,8 @@ def Arrows(editor, repeat, cmd):
     @see: vim_parser
 
     """
-    cmd_map = {
-            'h': editor.MoveLeft,
-            'j': editor.MoveDown,
-            'k': editor.MoveUp,
-            'l': editor.MoveRight,
-            '\r': editor.MoveDown,
-            ' ' : editor.MoveRight,
-            '\x08' : editor.MoveLeft
-          }
-    if cmd in cmd_map:
-        cmd_map[cmd](repeat)
+    if cmd in ARROW_MAP:
+        CallEditor(editor, ARROW_MAP[cmd], repeat)
     else:
         # Handle motion for actual arrow keys
         if cmd == '\u013c' and not editor.IsAtLineEnd():
@@ -1041,17 +1110,8 @@ def Words(editor,repeat, cmd):
     @see: vim_parser
 
     """
-    cmd_map = {
-            'w': editor.NextWord,
-            'e': editor.WordEnd,
-            'b': editor.BackWord,
-            'W': editor.NextWordBig,
-            'E': editor.WordEndBig,
-            'B': editor.BackWordBig,
-            '[': editor.BackWordPart,
-            ']': editor.WordPartEnd,
-          }
-    cmd_map.get(cmd, lambda x: None)(repeat)
+    if cmd in WORD_MAP:
+        CallEditor(editor, WORD_MAP[cmd], repeat)
 
 @vim_parser('$^0', is_motion=True)
 def Line(editor, repeat, cmd):
@@ -1059,11 +1119,8 @@ def Line(editor, repeat, cmd):
     @see: vim_parser
 
     """
-    cmd_map = { '0': editor.GotoLineStart,
-                '^': editor.GotoIndentStart,
-                '$': editor.GotoLineEnd,
-              }
-    cmd_map.get(cmd, lambda:None)()
+    if cmd in LINE_MAP:
+        CallEditor(editor, LINE_MAP[cmd])
 
 @vim_parser('{}', is_motion=True)
 def Para(editor, repeat, cmd):
@@ -1071,10 +1128,8 @@ def Para(editor, repeat, cmd):
     @see: vim_parser
 
     """
-    cmd_map = { '{': editor.ParaUp,
-            '}': editor.ParaDown,
-          }
-    cmd_map.get(cmd, lambda x: None)(repeat)
+    if cmd in PARA_MAP:
+        CallEditor(editor, PARA_MAP[cmd], repeat)
 
 @vim_parser('uU')
 def Undo(editor, repeat, cmd):
@@ -1098,10 +1153,8 @@ def FindIdent(editor, repeat, cmd):
     @see: vim_parser
 
     """
-    cmd_map = { '#': editor.PrevIdent,
-                '*': editor.NextIdent,
-              }
-    cmd_map.get(cmd, lambda x: None)(repeat)
+    if cmd in IDENT_MAP:
+        CallEditor(editor, IDENT_MAP[cmd], repeat)
 
 @vim_parser('~')
 def Tilde(editor, repeat, cmd):
@@ -1129,13 +1182,8 @@ def Delete(editor, repeat, cmd):
     @see: vim_parser
 
     """
-    cmd_map = {
-        'x': 'dl', 'X': 'dh',
-        's': 'cl', 'S': 'cc',
-        'C': 'c$', 'D': 'd$', 'Y': 'y$',
-        }
-    if cmd in cmd_map:
-        Change(editor, repeat, cmd_map[cmd])
+    if cmd in DELETE_MAP:
+        Change(editor, repeat, DELETE_MAP[cmd])
 
 @vim_parser('cdy<>')
 def Change(editor, repeat, cmd):
@@ -1179,18 +1227,20 @@ def Change(editor, repeat, cmd):
             editor.PushColumn()
             editor.SelectLines(repeat)
         else:
-            motion_function = GetMotion(editor, motion_cmd)
+            # The count is handed to the motion so that it is done in a
+            # single step instead of repeating the motion count times.
+            motion_function = GetMotion(editor, motion_cmd,
+                                        repeat if repeat > 1 else None)
             if motion_function is None:
                 # Invalid motion; cancel operation
                 return ret(InvalidOp)
 
             editor.PushCaret()
             editor.PushColumn()
-            for i in range(repeat):
-                if motion_function() == NeedMore:
-                    # This motion is incomplete .. (catch on first iteration)
-                    editor.Deselect()
-                    return ret(NeedMore)
+            if motion_function() == NeedMore:
+                # This motion is incomplete ..
+                editor.Deselect()
+                return ret(NeedMore)
             editor.StartSelection()
             editor.PopCaret()
             editor.EndSelection()
@@ -1199,15 +1249,7 @@ def Change(editor, repeat, cmd):
                 line_motion = True
                 editor.SelectFullLines()
 
-    cmd_map = {
-            'y': editor.YankSelection,
-            'd': editor.DeleteSelection,
-            'c': editor.ChangeSelection,
-            '<': editor.DedentSelection,
-            '>': editor.IndentSelection,
-          }
-
-    cmd_map[cmd]()
+    CallEditor(editor, CHANGE_MAP[cmd])
 
     restore_x = cmd in ('y', '<', '>') or cmd == 'd' and line_motion
     editor.PopColumn(restore_x)
@@ -1290,14 +1332,8 @@ def FindChar(editor, repeat, cmd):
         return NeedMore
 
     cmd, char = cmd
-    cmd_map = {
-            'f' : editor.FindNextChar,
-            'F' : editor.FindPrevChar,
-            't' : editor.FindTillNextChar,
-            'T' : editor.FindTillPrevChar,
-          }
-    if cmd in cmd_map:
-        cmd_map[cmd](char, repeat)
+    if cmd in FIND_MAP:
+        CallEditor(editor, FIND_MAP[cmd], char, repeat)
         editor.SetFindCharCmd(cmd, char)
 
 @vim_parser(',;', is_motion=True)
@@ -1413,6 +1449,10 @@ HANDLERS = (
     Mark, Jump, Ex, Reg, NavExtra, RegexSearch,
     )
 MOTION_HANDLERS = [h for h in HANDLERS if h.is_motion]
+
+# Command dispatch tables built from the handlers above
+DISPATCH = BuildDispatch(HANDLERS)
+MOTION_DISPATCH = BuildDispatch(MOTION_HANDLERS)
 # HACK: The following is a sign of improper design! but doing it properly
 #       would probably require yet another huge rewrite of this module.
 #       So watch out if things get out of control with many such hacks.
@@ -42,9 +42,13 @@ Currently provides:
  - check the document in either idle time or in a background thread
 
 @author: Rob McMullen
-@version: 1.2
+@version: 1.3
 
 Changelog::
+    1.3:
+        - Cache dictionary lookups in a shared LRU cache
+        - Check large ranges on a background thread
+        - Skip idle processing when nothing has changed
     1.2:
         - Rewrote as a standalone class rather than a static mixin
     1.1:
@@ -55,7 +59,12 @@ Changelog::
 """
 
 import os
+import re
 import locale
+import threading
+import queue
+import weakref
+import collections
 import wx
 import wx.stc
 import imp
@@ -76,6 +85,62 @@ except:
     import traceback
     traceback.print_exc()
 
+# Matches a run of alphabetic characters
+WORD_RE = re.compile(r'[^\W\d_]+')
+
+class WordCache(object):
+    """Thread safe least recently used cache of dictionary lookups"""
+    def __init__(self, size=8192):
+        self._size = size
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get the cached value for key or None if it is not cached"""
+        with self._lock:
+            value = self._data.get(key, None)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Cache a value, dropping the least recently used if full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self._size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached values"""
+        with self._lock:
+            self._data.clear()
+
+class SpellWorker(threading.Thread):
+    """Background thread that checks large ranges of text.  Results are
+    handed back to the checker on the main thread.
+    """
+    def __init__(self):
+        super(SpellWorker, self).__init__()
+        self._jobs = queue.Queue()
+        self.daemon = True
+        self.start()
+
+    def queueJob(self, checker, generation, start, end, text):
+        self._jobs.put((weakref.ref(checker), generation, start, end, text))
+
+    def run(self):
+        while True:
+            ref, generation, start, end, text = self._jobs.get()
+            checker = ref()
+            if checker is None or generation < checker._cleared:
+                continue # Indicators were cleared since the job was queued
+            try:
+                words = checker.findMisspelled(text, start)
+            except Exception:
+                continue
+            wx.CallAfter(checker._onRangeChecked, generation, start, end, words)
+
 class STCSpellCheck(object):
     """Spell checking for use with wx.StyledTextControl.
     
@@ -100,6 +165,12 @@ class STCSpellCheck(object):
     # Class attributes to act as default values
     _spelling_lang = None
     _spelling_dict = None
+
+    # Shared by all instances. Enchant dictionaries are not safe to use
+    # from more than one thread at a time.
+    _word_cache = WordCache()
+    _dict_lock = threading.Lock()
+    _worker = None
     
     def __init__(self, stc, *args, **kwargs):
         """Mixin must be initialized using this constructor.
@@ -131,6 +202,13 @@ class STCSpellCheck(object):
         
         self._spelling_last_idle_line = -1
         self.dirty_range_count_per_idle = 5
+        # Ranges longer than this are checked on the background thread
+        self.thread_threshold = 4096
+        # Each edit and clearAll gets a new generation, the recent edits are
+        # kept so that background results can be moved past them.
+        self._generation = 0
+        self._cleared = 0
+        self._edits = collections.deque(maxlen=256) # (generation, pos, delta)
         
         self._no_update = False
         self._last_block = -1
@@ -295,8 +373,124 @@ class STCSpellCheck(object):
     
     def clearAll(self):
         """Clear the stc of all spelling indicators."""
+        self._generation += 1
+        self._cleared = self._generation
+        self._last_block = -1
         self.stc.StartStyling(0, self._spelling_indicator_mask)
         self.stc.SetStyling(self.stc.GetLength(), 0)
+
+    def addToDictionary(self, word):
+        """Permanently add a word to the users dictionary"""
+        if self._spelling_dict:
+            with self._dict_lock:
+                self._spelling_dict.add(word)
+            self._word_cache.clear()
+
+    def ignoreWord(self, word):
+        """Ignore a word for the rest of the session"""
+        if self._spelling_dict:
+            with self._dict_lock:
+                self._spelling_dict.add_to_session(word)
+            self._word_cache.clear()
+
+    def isWordCorrect(self, word):
+        """Check the spelling of a single word using the lookup cache.
+        Safe to call from a background thread.
+        """
+        spell = self._spelling_dict
+        if not spell:
+            return True
+        key = (self._spelling_lang, word)
+        result = self._word_cache.get(key)
+        if result is None:
+            with self._dict_lock:
+                result = bool(spell.check(word))
+            self._word_cache.set(key, result)
+        return result
+
+    def findMisspelled(self, text, start):
+        """Find the misspelled words in a block of text.  Safe to call from
+        a background thread as the stc is not accessed.
+
+        @param text: unicode text of the range
+        @param start: stc position of the first character of text
+        @return: list of (position, length) tuples in stc (utf-8) positions
+        """
+        words = list()
+        max_index = len(text)
+        # Positions in the stc are utf-8 byte offsets.  The offsets are
+        # computed in a single pass by only encoding the text between the
+        # previous and the current misspelled word.
+        ascii = text.isascii()
+        last_index = 0
+        last_pos = start
+        unicode_index = 0
+        while unicode_index < max_index:
+            start_index, end_index = self.findNextWord(text, unicode_index, max_index)
+            if end_index < 0:
+                break
+            if end_index - start_index >= self._spelling_word_size and \
+               not self.isWordCorrect(text[start_index:end_index]):
+                if ascii:
+                    last_pos = start + start_index
+                    raw_count = end_index - start_index
+                else:
+                    last_pos += len(text[last_index:start_index].encode('utf-8'))
+                    raw_count = len(text[start_index:end_index].encode('utf-8'))
+                words.append((last_pos, raw_count))
+                last_pos += raw_count
+                last_index = end_index
+            unicode_index = end_index
+        return words
+
+    def _applyIndicators(self, start, end, words):
+        """Replace the spelling indicators in a range with the given
+        misspelled words.
+        """
+        mask = self._spelling_indicator_mask
+        self.stc.StartStyling(start, mask)
+        self.stc.SetStyling(end - start, 0)
+        for pos, raw_count in words:
+            if self._spell_check_region(pos):
+                if self._spelling_debug:
+                    print(("styling (%d,%d) to %d" % (pos, pos + raw_count, mask)))
+                self.stc.StartStyling(pos, mask)
+                self.stc.SetStyling(raw_count, mask)
+
+    def _onRangeChecked(self, generation, start, end, words):
+        """Apply the results of a background check. The range is moved past
+        the edits made since the check was queued, results are only thrown
+        away if an edit touched the range itself.
+        """
+        if not self.stc or generation < self._cleared:
+            return
+
+        edits = [edit for edit in self._edits if edit[0] > generation]
+        if generation < self._generation and \
+           (not edits or edits[0][0] != generation + 1):
+            stale = True # Edits are no longer in the log
+        else:
+            stale = False
+            shift = 0
+            for gen, pos, delta in edits:
+                if pos > end:
+                    continue
+                elif pos + max(0, -delta) < start:
+                    shift += delta
+                    start += delta
+                    end += delta
+                else:
+                    stale = True
+                    break
+
+        if stale:
+            # Recheck the visible area
+            self._last_block = -1
+            return
+
+        if shift:
+            words = [(pos + shift, count) for pos, count in words]
+        self._applyIndicators(start, end, words)
     
     def checkRange(self, start, end):
         """Perform a spell check over a range of text in the document.
@@ -304,7 +498,8 @@ class STCSpellCheck(object):
         This is the main spell checking routine -- it loops over the range
         of text using the L{findNextWord} method to break the text into
         words to check.  Misspelled words are highlighted using the current
-        indicator.
+        indicator.  Large ranges are checked on a background thread and the
+        indicators are updated when the check completes.
         
         @param start: starting position
         @param end: last position to check
@@ -313,54 +508,19 @@ class STCSpellCheck(object):
         if not spell:
             return
         
-        # Remove any old spelling indicators
-        mask = self._spelling_indicator_mask
         count = end - start
         if count <= 0:
             if self._spelling_debug:
                 print(("No need to check range: start=%d end=%d count=%d" % (start, end, count)))
             return
-        self.stc.StartStyling(start, mask)
-        self.stc.SetStyling(count, 0)
         
         text = self.stc.GetTextRange(start, end) # note: returns unicode
-        unicode_index = 0
-        max_index = len(text)
-        
-        last_index = 0 # last character in text a valid raw byte position
-        last_pos = start # raw byte position corresponding to last_index
-        while unicode_index < max_index:
-            start_index, end_index = self.findNextWord(text, unicode_index, max_index)
-            if end_index >= 0:
-                if end_index - start_index >= self._spelling_word_size:
-                    if self._spelling_debug:
-                        print(("checking %s at text[%d:%d]" % (repr(text[start_index:end_index]), start_index, end_index)))
-                    if not spell.check(text[start_index:end_index]):
-                        # Because unicode characters are stored as utf-8 in the
-                        # stc and the positions in the stc correspond to the
-                        # raw bytes, not the number of unicode characters, we
-                        # have to find out the offset to the unicode chars in
-                        # terms of raw bytes.
-                        
-                        # find the number of raw bytes from the last calculated
-                        # styling position to the start of the word
-                        last_pos += len(text[last_index:start_index].encode('utf-8'))
-                        
-                        # find the length of the word in raw bytes
-                        raw_count = len(text[start_index:end_index].encode('utf-8'))
-                        
-                        if self._spell_check_region(last_pos):
-                            if self._spelling_debug:
-                                print(("styling text[%d:%d] = (%d,%d) to %d" % (start_index, end_index, last_pos, last_pos + raw_count, mask)))
-                            self.stc.StartStyling(last_pos, mask)
-                            self.stc.SetStyling(raw_count, mask)
-                        elif self._spelling_debug:
-                            print(("not in valid spell check region.  styling position corresponding to text[%d:%d] = (%d,%d)" % (start_index, end_index, last_pos, last_pos + raw_count)))
-                        last_pos += raw_count
-                        last_index = end_index
-                unicode_index = end_index
-            else:
-                break
+        if count > self.thread_threshold:
+            if STCSpellCheck._worker is None:
+                STCSpellCheck._worker = SpellWorker()
+            STCSpellCheck._worker.queueJob(self, self._generation, start, end, text)
+        else:
+            self._applyIndicators(start, end, self.findMisspelled(text, start))
 
     def checkAll(self):
         """Perform a spell check on the entire document."""
@@ -411,13 +571,9 @@ class STCSpellCheck(object):
         @return: tuple indicating the word start and end indexes, or (-1, -1)
         indicating that the end of the array was reached and no word was found
         """
-        while index < length:
-            if utext[index].isalpha():
-                end = index + 1
-                while end < length and utext[end].isalpha():
-                    end += 1
-                return (index, end)
-            index += 1
+        match = WORD_RE.search(utext, index, length)
+        if match is not None:
+            return match.span()
         return (-1, -1)
     
     def startIdleProcessing(self):
@@ -466,7 +622,8 @@ class STCSpellCheck(object):
         occurrence when the number of lines on screen changes by resizing
         the window).
         """
-        self.processDirtyRanges()
+        if self.isDirty():
+            self.processDirtyRanges()
 
         self._spelling_last_idle_line = self.stc.GetFirstVisibleLine()
         curr_block = self._spelling_last_idle_line + self.stc.LinesOnScreen()
@@ -489,7 +646,8 @@ class STCSpellCheck(object):
         """
         spell = self._spelling_dict
         if spell and len(word) >= self._spelling_word_size:
-            words = spell.suggest(word)
+            with self._dict_lock:
+                words = spell.suggest(word)
             if self._spelling_debug:
                 print(("suggestions for %s: %s" % (word, words)))
             return words
@@ -518,9 +676,11 @@ class STCSpellCheck(object):
         updated when some idle time is available.
         
         """
+        self._generation += 1
         count = end - start
         if deleted:
             count = -count
+        self._edits.append((self._generation, start, count))
         if start == self.current_dirty_end:
             self.current_dirty_end = end
         elif start >= self.current_dirty_start and start < self.current_dirty_end:
@@ -582,6 +742,12 @@ class STCSpellCheck(object):
         else:
             self.dirty_ranges = []
     
+    def isDirty(self):
+        """Are there any modifications waiting to be spell checked"""
+        return self.current_dirty_start >= 0 or \
+               self.current_word_start > 0 or \
+               len(self.dirty_ranges) > 0
+
     def processDirtyRanges(self):
         cursor = self.stc.GetCurrentPos()
         
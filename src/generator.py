@@ -27,7 +27,11 @@ __revision__ = "$Revision: 70229 $"
 # Imports
 import wx
 import wx.stc
+import io
+import re
 import time
+import shutil
+import tempfile
 
 # Editra Libraries
 from src import ed_glob
@@ -44,6 +48,118 @@ _ = wx.GetTranslation
 
 FONT_FALLBACKS = "Trebuchet, Tahoma, sans-serif"
 
+STYLE_BLOCK = 65536     # Positions read from the buffer per GetStyledText call
+SPOOL_SIZE = 4194304    # Size of generated body kept in memory before spooling
+
+_RUN_RE = re.compile(b'(.)\\1*', re.DOTALL)
+_LINE_RE = re.compile(r'[^\n]*\n|[^\n]+')
+_MASKS = dict()
+
+# Character translation tables
+_TEX_MAP = str.maketrans({ "#" : "\\#", "$" : "\\$", "^" : "\\^",
+                           "%" : "\\%", "&" : "\\&", "_" : "\\_",
+                           "{" : "\\{", "}" : "\\}", "~" : "\\~",
+                           "\\": "$\\backslash$", "\n" : "\\\\\n",
+                           "@" : "$@$", "<" : "$<$", ">" : "$>$",
+                           "-" : "$-$", "|" : "$|$" })
+_RTF_MAP = str.maketrans({ "\t" : "\\tab ", "{" : "\\{", "}" : "\\}",
+                           "\\" : "\\\\", "\n" : "\\par\n",
+                           "\r" : "\\par\n" })
+
+# --------------------------------------------------------------------------#
+# Style Run Extraction
+
+def SplitStyledBytes(data, mask=0xff):
+    """Split a block of styled bytes as returned by GetStyledText into runs
+    of text that share the same style.
+    @param data: bytes of interleaved character and style bytes
+    @keyword mask: bit mask to apply to the style bytes
+    @return: generator of (style id, utf-8 encoded bytes) tuples
+
+    """
+    text = data[0::2]
+    styles = data[1::2]
+    if mask != 0xff:
+        table = _MASKS.get(mask)
+        if table is None:
+            table = bytes(val & mask for val in range(256))
+            _MASKS[mask] = table
+        styles = styles.translate(table)
+
+    for match in _RUN_RE.finditer(styles):
+        start, end = match.span()
+        yield styles[start], text[start:end]
+
+def IterStyleRuns(stc, start=0, end=-1, blocksize=STYLE_BLOCK, smooth=False):
+    """Iterate over the text of a buffer as runs of text that share the same
+    style. The styled text is fetched from the control in large blocks
+    instead of querying the style and text of each position.
+    @param stc: EditraStc
+    @keyword start: document position to start at
+    @keyword end: document position to stop at (-1 for end of document)
+    @keyword blocksize: number of positions to read from the buffer at a time
+    @keyword smooth: treat a single position of the default style (0)
+                     between two runs of the same style as part of them
+    @return: generator of (style id, unicode string) tuples
+
+    """
+    if end < 0:
+        end = stc.GetLength()
+    mask = (1 << (stc.GetStyleBits() or 8)) - 1
+
+    # Runs can continue across blocks and a block boundary may fall in the
+    # middle of a multibyte character so the text is only decoded once the
+    # style changes.
+    last_id = None
+    pending = list()
+    gap = None # single default styled position after the pending run
+    while start < end:
+        stop = min(start + blocksize, end)
+        data = bytes(stc.GetStyledText(start, stop))
+        for style_id, raw in SplitStyledBytes(data, mask):
+            if gap is not None:
+                if style_id == last_id:
+                    pending.append(gap)
+                else:
+                    yield last_id, b''.join(pending).decode('utf-8', 'replace')
+                    last_id = 0
+                    pending = [gap]
+                gap = None
+            elif smooth and style_id == 0 and len(raw) == 1 and last_id:
+                gap = raw
+                continue
+
+            if style_id != last_id:
+                if pending:
+                    yield last_id, b''.join(pending).decode('utf-8', 'replace')
+                last_id = style_id
+                pending = list()
+            pending.append(raw)
+        start = stop
+
+    if pending:
+        yield last_id, b''.join(pending).decode('utf-8', 'replace')
+    if gap is not None:
+        yield 0, gap.decode('utf-8', 'replace')
+
+def WriteSpooled(stream, write_head, write_body, tail=''):
+    """Write a document whose header can only be generated after its body
+    (i.e the style definitions used by the body) to a stream. The body is
+    spooled to a temporary file once it grows larger than SPOOL_SIZE.
+    @param stream: file like object to write the document to
+    @param write_head: callable(write) that writes the documents header
+    @param write_body: callable(write) that writes the documents body
+    @keyword tail: string to write after the body
+
+    """
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+',
+                                       encoding='utf-8') as body:
+        write_body(body.write)
+        write_head(stream.write)
+        body.seek(0)
+        shutil.copyfileobj(body, stream)
+    stream.write(tail)
+
 # --------------------------------------------------------------------------#
 # Plugin Interface
 
@@ -155,28 +271,15 @@ class Html(plugin.Plugin):
         self.stc = None
         self.head = wx.EmptyString
         self.css = dict()
-        self.body = wx.EmptyString
 
     def __str__(self):
         """Returns the string of html
         @return: string version of html object
 
         """
-        # Assemble the embedded html
-        style = "<style type=\"text/css\">\n%s</style>"
-        css = wx.EmptyString
-        for key in self.css:
-            css += str(self.css[key]) + "\n"
-        css = css % self.stc.GetFontDictionary()
-        style = style % css
-
-        # Insert the css into the head
-        head = self.head.replace('</head>', style + "\n</head>")
-
-        # Assemble the body of the html
-        html = "<html>\n%s\n%s\n</html>"
-        html = html % (head, self.body)
-        return html
+        buff = io.StringIO()
+        self.Write(self.stc, buff)
+        return buff.getvalue()
 
     def Unicode(self):
         """Returns the html as Unicode
@@ -191,10 +294,38 @@ class Html(plugin.Plugin):
 
         """
         self.stc = stc_ctrl
-        self.head = self.GenerateHead()
-        self.body = self.GenerateBody()
         return ("html", self.__str__())
 
+    def Write(self, stc_ctrl, stream):
+        """Generates the document and writes it to the given stream
+        @param stc_ctrl: text control to get text from
+        @param stream: file like object to write the html to
+
+        """
+        self.stc = stc_ctrl
+        self.css = dict()
+        self.head = self.GenerateHead()
+        WriteSpooled(stream, self.WriteHead, self.WriteBody, "\n</html>")
+
+    def WriteHead(self, write):
+        """Writes the html head block with the css for the styles used
+        in the body inserted into it.
+        @param write: callable to write the output with
+
+        """
+        # Assemble the embedded css
+        style = "<style type=\"text/css\">\n%s</style>"
+        css = wx.EmptyString
+        for key in self.css:
+            css += str(self.css[key]) + "\n"
+        css = css % self.stc.GetFontDictionary()
+        style = style % css
+
+        # Insert the css into the head
+        write("<html>\n")
+        write(self.head.replace('</head>', style + "\n</head>"))
+        write("\n")
+
     def GenerateHead(self):
         """Generates the html head block
         @return: html header information
@@ -208,68 +339,52 @@ class Html(plugin.Plugin):
                               ed_glob.VERSION)
 
     def GenerateBody(self):
-        """Generates the body of the html from the stc's content. To do
-        this it does a character by character parse of the stc to determine
-        style regions and generate css and and styled spans of html in order
-        to generate an 'exact' html representation of the stc's window.
+        """Generates the body of the html from the stc's content.
         @return: the body section of the html generated from the text control
+        @see: L{WriteBody}
 
         """
-        html = list()
-        parse_pos = 0
-        style_start = 0
-        style_end = 0
-        last_pos = self.stc.GetLineEndPosition(self.stc.GetLineCount()) + 1
+        buff = io.StringIO()
+        self.WriteBody(buff.write)
+        return buff.getvalue()
 
-        # Get Document start point info
-        last_id = self.stc.GetStyleAt(parse_pos)
-        tag = self.stc.FindTagById(last_id)
-        if tag != wx.EmptyString:
-            s_item = StyleItem()
-            s_item.SetAttrFromStr(self.stc.GetStyleByName(tag))
-            self.css[tag] = CssItem(tag.split('_')[0], s_item)
+    def WriteBody(self, write):
+        """Writes the body of the html from the stc's content. The text is
+        split into style runs to generate css and styled spans of html in
+        order to generate an 'exact' html representation of the stc's window.
+        @param write: callable to write the output with
 
-        # Optimizations
+        """
         stc = self.stc
-        GetStyleAt = stc.GetStyleAt
-
-        # Build Html
-        while parse_pos < last_pos:
-            parse_pos += 1
-            curr_id = GetStyleAt(parse_pos)
-            style_end = parse_pos
-            # If style region has changed close section
-            if curr_id == 0 and GetStyleAt(parse_pos + 1) == last_id:
-                curr_id = last_id
-
-            if curr_id != last_id or parse_pos == last_pos:
-                tmp = stc.GetTextRange(style_start, style_end)
-                tmp = self.TransformText(tmp)
-                if tmp.isspace() or tag in ["default_style", "operator_style"]:
-                    html.append(tmp)
-                else:
-                    tmp2 = "<span class=\"%s\">%s</span>"
-                    html.append(tmp2 % (tag.split('_')[0], tmp))
-
-                last_id = curr_id
-                style_start = style_end
-                tag = stc.FindTagById(last_id)
+        tags = dict()
+        empty = True
+
+        write("<body class=\"default\">\n<pre>\n")
+        for style_id, text in IterStyleRuns(stc, smooth=True):
+            empty = False
+            tag = tags.get(style_id)
+            if tag is None:
+                tag = stc.FindTagById(style_id)
+                tags[style_id] = tag
                 if tag not in self.css:
                     s_item = StyleItem()
                     s_item.SetAttrFromStr(stc.GetStyleByName(tag))
                     self.css[tag] = CssItem(tag.split('_')[0], s_item)
 
-        # Case for unstyled documents
-        if len(html) == 0:
+            text = self.TransformText(text)
+            if text.isspace() or tag in ("default_style", "operator_style"):
+                write(text)
+            else:
+                write("<span class=\"%s\">%s</span>" % (tag.split('_')[0], text))
+
+        # Case for empty documents
+        if empty:
             s_item = StyleItem()
             s_item.SetAttrFromStr(stc.GetStyleByName('default_style'))
             self.css['default_style'] = CssItem('default', s_item)
-            html.append(self.TransformText(stc.GetText()))
         else:
             self.OptimizeCss()
-
-        return "<body class=\"default\">\n<pre>\n%s\n</pre>\n</body>" % \
-                                                                   "".join(html)
+        write("\n</pre>\n</body>")
 
     def GetId(self):
         """Returns the menu identifier for the HTML generator
@@ -534,92 +649,77 @@ class LaTeX(plugin.Plugin):
     def GenDoc(self):
         """Generates the document body of the LaTeX document
         @returns: the main body of the reference document marked up with latex
+        @see: L{WriteDoc}
 
         """
-        tex = list()
-        tmp = ''
-        start = parse_pos = 0
-        last_pos = self._stc.GetLineEndPosition(self._stc.GetLineCount())
-
-        # Define the default style
-        self.RegisterStyleCmd('default_style', \
-                              self._stc.GetItemByName('default_style'))
+        buff = io.StringIO()
+        self.WriteDoc(buff.write)
+        return buff.getvalue()
 
-        # Get Document start point info
-        last_id = self._stc.GetStyleAt(parse_pos)
-        tmp = self.TransformText(self._stc.GetTextRange(parse_pos,
-                                                        parse_pos + 1))
-        tag = self._stc.FindTagById(last_id)
-        if tag != wx.EmptyString:
-            self.RegisterStyleCmd(tag, self._stc.GetItemByName(tag))
+    def WriteDoc(self, write):
+        """Writes the document body of the LaTeX document. A styling command
+        is emitted for each line of each style run.
+        @param write: callable to write the output with
 
-        # Optimizations
+        """
         stc = self._stc
-        GetStyleAt = stc.GetStyleAt
-        GetTextRange = stc.GetTextRange
+        tags = dict()
         TransformText = self.TransformText
 
-        # Build LaTeX
-        for parse_pos in range(last_pos + 1):
-            curr_id = GetStyleAt(parse_pos)
-            if parse_pos > 1:
-                # This is the performance bottleneck, changing the text
-                # collection to when the style changes is much faster as
-                # it only needs to be done once per style section instead
-                # of once per character. Doing that however causes problems
-                # with the style and resulting document formatting.
-                tmp = TransformText(GetTextRange((parse_pos - 1), parse_pos))
-
-            if curr_id == 0 and GetStyleAt(parse_pos + 1) == last_id:
-                curr_id = last_id
-
-            # If style region has changed close section
-            if curr_id != last_id or tmp[-1] == "\n":
-                tmp_tex = TransformText(GetTextRange(start, parse_pos))
-#                 tmp_tex = u"".join(tmp)
+        # Define the default style
+        self.RegisterStyleCmd('default_style',
+                              stc.GetItemByName('default_style'))
+
+        write("\\begin{document}\n")
+        for style_id, text in IterStyleRuns(stc, smooth=True):
+            tag = tags.get(style_id)
+            if tag is None:
+                tag = stc.FindTagById(style_id)
+                tags[style_id] = tag
+                if tag not in [None, wx.EmptyString]:
+                    self.RegisterStyleCmd(tag, stc.GetItemByName(tag))
+
+            cmd = self.CreateCmdName(tag or wx.EmptyString)
+            if cmd == wx.EmptyString:
+                cmd = "defaultstyle"
+
+            for line in _LINE_RE.findall(text):
+                tmp_tex = TransformText(line)
                 if tag == "operator_style" or \
                    (tag == "default_style" and \
                     tmp_tex.isspace() and len(tmp_tex) <= 2):
-                    tex.append(tmp_tex)
+                    write(tmp_tex)
+                elif tmp_tex.endswith("\\\\\n"):
+                    write("\\%s{%s}\\\\\n" % (cmd, tmp_tex[:-3]))
                 else:
-                    if "\\\\\n" in tmp_tex:
-                        tmp_tex = tmp_tex.replace("\\\\\n", "")
-                        tmp2 = "\\%s{%s}\\\\\n"
-                    else:
-                        tmp2 = "\\%s{%s}"
-
-                    cmd = self.CreateCmdName(tag)
-                    if cmd in [None, wx.EmptyString]:
-                        cmd = "defaultstyle"
-                    tex.append(tmp2 % (cmd, tmp_tex))
-
-                last_id = curr_id
-                tag = stc.FindTagById(last_id)
-                if tag not in [None, wx.EmptyString]:
-                    self.RegisterStyleCmd(tag, stc.GetItemByName(tag))
-                tmp = list()
-                start = parse_pos
-
-        # Case for unstyled documents
-        if tex == wx.EmptyString:
-            tex.append(self.TransformText(stc.GetText()))
-        return "\\begin{document}\n%s\n\\end{document}" % "".join(tex)
+                    write("\\%s{%s}" % (cmd, tmp_tex))
+        write("\n\\end{document}")
 
     def Generate(self, stc_doc):
         """Generates the LaTeX document
         @param stc_doc: text control to generate latex from
         @return: the reference document marked up in LaTeX.
 
+        """
+        buff = io.StringIO()
+        self.Write(stc_doc, buff)
+        return ("tex", buff.getvalue())
+
+    def Write(self, stc_doc, stream):
+        """Generates the LaTeX document and writes it to the given stream
+        @param stc_doc: text control to generate latex from
+        @param stream: file like object to write the document to
+
         """
         self._stc = stc_doc
+        self._cmds = dict()
         default_si = self._stc.GetItemByName('default_style')
         self._dstyle.SetBack(default_si.GetBack().split(',')[0])
         self._dstyle.SetFore(default_si.GetFore().split(',')[0])
         self._dstyle.SetFace(default_si.GetFace().split(',')[0])
         self._dstyle.SetSize(default_si.GetSize().split(',')[0])
-        body = self.GenDoc()
-        preamble = self.GenPreamble()
-        return ("tex", "".join([preamble, body]))
+        WriteSpooled(stream, lambda write: write(self.GenPreamble()),
+                     self.WriteDoc)
 
     def GenPreamble(self):
         """Generates the Preamble of the document
@@ -741,17 +841,7 @@ class LaTeX(plugin.Plugin):
         @return: txt with all special characters transformed
 
         """
-        ch_map = { "#" : "\\#", "$" : "\\$", "^" : "\\^",
-                   "%" : "\\%", "&" : "\\&", "_" : "\\_",
-                   "{" : "\\{", "}" : "\\}", "~" : "\\~",
-                   "\\": "$\\backslash$", "\n" : "\\\\\n",
-                   "@" : "$@$", "<" : "$<$", ">" : "$>$",
-                   "-" : "$-$", "|" : "$|$"
-                 }
-        tmp = list()
-        for char in txt:
-            tmp.append(ch_map.get(char, char))
-        return ''.join(tmp)
+        return txt.translate(_TEX_MAP)
 
 #-----------------------------------------------------------------------------#
 
@@ -794,54 +884,56 @@ class Rtf(plugin.Plugin):
         if self._stc is None:
             return ''
 
+        buff = io.StringIO()
+        self.Write(self._stc, buff)
+        return buff.getvalue()
+
+    def _WriteHead(self, write):
+        """Writes the rtf header and color table
+        @param write: callable to write the output with
+
+        """
+        write("{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 %s;}}" % \
+              self._stc.GetDefaultFont().GetFaceName())
+        write(str(self._colortbl))
+
+    def _WriteRtf(self, write):
+        """Writes the rtf body of the document, one section per style run
+        @param write: callable to write the output with
+
+        """
         # Optimizations
         stc = self._stc
-        def_fore = stc.GetDefaultForeColour(as_hex=True)
-        self._colortbl.AddColor(def_fore)
-        def_back = stc.GetDefaultBackColour(as_hex=True)
-        self._colortbl.AddColor(def_back)
-        last_pos = stc.GetLineEndPosition(stc.GetLineCount())
-        parse_pos = 0
-        last_id = None
+        AddColor = self._colortbl.AddColor
+        GetColorIndex = self._colortbl.GetColorIndex
+        TransformText = self.TransformText
+        AddColor(stc.GetDefaultForeColour(as_hex=True))
+        AddColor(stc.GetDefaultBackColour(as_hex=True))
+        items = dict()
         last_fore = None
         last_back = None
-        start = end = 0
-        tmp_txt = list()
         font_tmp = "\\f0"
         fore_tmp = "\\cf%d"
         back_tmp = "\\cb%d"
-        AddColor = self._colortbl.AddColor
-        GetColorIndex = self._colortbl.GetColorIndex
-        GetStyleAt = stc.GetStyleAt
 
-        # Parse all characters/style bytes in document
-        for parse_pos in range(last_pos + 1):
-            sty_id = GetStyleAt(parse_pos)
-            end = parse_pos
-
-            # If style has changed build the previous section
-            if sty_id != last_id:
-                tag = stc.FindTagById(last_id)
-                s_item = stc.GetItemByName(tag)
+        for style_id, text in IterStyleRuns(stc):
+            s_item = items.get(style_id)
+            if s_item is None:
+                s_item = stc.GetItemByName(stc.FindTagById(style_id))
+                items[style_id] = s_item
                 AddColor(s_item.GetFore())
                 AddColor(s_item.GetBack())
-                tplate = font_tmp
-                fid = GetColorIndex(s_item.GetFore())
-                if fid != last_fore:
-                    last_fore = fid
-                    tplate = tplate + (fore_tmp % fid)
-                bid = GetColorIndex(s_item.GetBack())
-                if bid != last_back:
-                    last_back = bid
-                    tplate = tplate + (back_tmp % bid)
-                tmp_txt.append(tplate + " " + \
-                               self.TransformText(stc.GetTextRange(start, end)))
-                start = end
-            last_id = sty_id
-
-        head = "{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 %s;}}" % \
-                stc.GetDefaultFont().GetFaceName()
-        return "%s%s%s}" % (head, self._colortbl, "".join(tmp_txt))
+
+            tplate = font_tmp
+            fid = GetColorIndex(s_item.GetFore())
+            if fid != last_fore:
+                last_fore = fid
+                tplate = tplate + (fore_tmp % fid)
+            bid = GetColorIndex(s_item.GetBack())
+            if bid != last_back:
+                last_back = bid
+                tplate = tplate + (back_tmp % bid)
+            write(tplate + " " + TransformText(text))
 
     #---- End Protected Member Functions ----#
 
@@ -855,6 +947,16 @@ class Rtf(plugin.Plugin):
         self._stc = stc_doc
         return ('rtf', self._GenRtf())
 
+    def Write(self, stc_doc, stream):
+        """Generates the RTF document and writes it to the given stream
+        @param stc_doc: document to generate text from
+        @param stream: file like object to write the document to
+
+        """
+        self._stc = stc_doc
+        self._colortbl = RtfColorTbl()
+        WriteSpooled(stream, self._WriteHead, self._WriteRtf, "}")
+
     def GetId(self):
         """Implements the GeneratorI's GetId function by returning
         the identifier for this generator.
@@ -878,13 +980,7 @@ class Rtf(plugin.Plugin):
         @param text: text to transform
         @return: text with all special characters transformed
         """
-        chmap = { "\t" : "\\tab ", "{" : "\\{", "}" : "\\}",
-                  "\\" : "\\\\", "\n" : "\\par\n", "\r" : "\\par\n"}
-        text = text.replace('\r\n', '\n')
-        tmp = ''
-        for char in text:
-            tmp = tmp + chmap.get(char, char)
-        return tmp
+        return text.replace('\r\n', '\n').translate(_RTF_MAP)
 
 #-----------------------------------------------------------------------------#
 
@@ -777,6 +777,9 @@ class DocGenPanel(wx.Panel):
         at_cb = wx.CheckBox(self, ed_glob.ID_PREF_AUTOTRIM,
                             _("Automatically trim whitespace on save"))
         at_cb.SetValue(Profile_Get('AUTO_TRIM_WS', 'bool', False))
+        atm_cb = wx.CheckBox(self, ed_glob.ID_PREF_AUTOTRIM_MOD,
+                             _("Only trim lines modified since last save"))
+        atm_cb.SetValue(Profile_Get('AUTO_TRIM_WS_MODIFIED', 'bool', False))
         ut_cb = wx.CheckBox(self, ed_glob.ID_PREF_TABS,
                             _("Use Tabs Instead of Spaces"))
         ut_cb.SetValue(Profile_Get('USETABS', 'bool', False))
@@ -840,6 +843,7 @@ class DocGenPanel(wx.Panel):
         sizer.AddMany([((10, 10), 0), ((10, 10), 0),
                        (wx.StaticText(self, label=_("Format") + ": "),
                         0, wx.ALIGN_CENTER_VERTICAL), (at_cb, 0),
+                       ((5, 5), 0), (atm_cb, 0),
                        ((5, 5), 0), (ut_cb, 0),
                        ((5, 5), 0), (bsu_cb, 0),
                        ((5, 5), 0), (tabsz, 0),
@@ -910,6 +914,7 @@ class DocGenPanel(wx.Panel):
                     ed_glob.ID_SHOW_LN, ed_glob.ID_SHOW_WS,
                     ed_glob.ID_WORD_WRAP, ed_glob.ID_PREF_AALIAS,
                     ed_glob.ID_PREF_INDENTW, ed_glob.ID_PREF_AUTOTRIM,
+                    ed_glob.ID_PREF_AUTOTRIM_MOD,
                     ed_glob.ID_PREF_VIRT_SPACE, ed_glob.ID_PREF_CARET_WIDTH):
 
             e_value = evt.EventObject.GetValue()
@@ -49,6 +49,7 @@ _DEFAULTS = {
            'AUTO_COMP_EX': False,           # Use extended autocompletion
            'AUTO_INDENT': True,             # Use Auto Indent
            'AUTO_TRIM_WS': False,           # Trim whitespace on save
+           'AUTO_TRIM_WS_MODIFIED': False,  # Only trim lines changed since save
            'AUTO_RELOAD': False,            # Automatically reload files?
            'BRACKETHL': True,               # Use bracket highlighting
            'BSUNINDENT': True,              # Backspace Unindents
@@ -82,12 +83,14 @@ _DEFAULTS = {
            'OPEN_NW': False,                # Open files in new windows
            'PRINT_MODE': PRINT_BLACK_WHITE,     # Printer rendering mode
            'PROXY_SETTINGS': dict(),        # Proxy Server Settings
+           'REPLACE_BACKUP': True,          # Backup files for replace in files
            'REPORTER': True,                # Error Reporter is Active
            'SAVE_POS': True,                # Remember Carat positions
            'SAVE_SESSION': False,           # Load previous session on startup
            'SEARCH_LOC': list(),            # Recent Search Locations
            'SEARCH_FILTER': '',             # Last used search filter
            'SESSION_KEY': '',               # Ipc Session Server Key
+           'SESSION_LAZY_LOAD': True,       # Load session files on demand
            'SET_WPOS': True,                # Remember window position
            'SET_WSIZE': True,               # Remember mainwindow size on exit
            'SHOW_EDGE': True,               # Show Edge Guide
@@ -127,7 +127,7 @@ def AutoIndenter(estc, pos, ichar):
     else:
         tabw = estc.GetIndent()
 
-    i_space = indent / tabw
+    i_space = indent // tabw
     end_spaces = ((indent - (tabw * i_space)) * " ")
 
     tokens = [_f for _f in text.strip().split() if _f]
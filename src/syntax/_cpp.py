@@ -203,7 +203,8 @@ def AutoIndenter(estc, pos, ichar):
     """
     rtxt = ''
     line = estc.GetCurrentLine()
-    text = estc.GetTextRange(estc.PositionFromLine(line), pos)
+    spos = estc.PositionFromLine(line)
+    text = estc.GetTextRange(spos, pos)
     eolch = estc.GetEOLChar()
 
     indent = estc.GetLineIndentation(line)
@@ -212,14 +213,17 @@ def AutoIndenter(estc, pos, ichar):
     else:
         tabw = estc.GetIndent()
 
-    i_space = indent / tabw
+    i_space = indent // tabw
     ndent = eolch + ichar * i_space
     rtxt = ndent + ((indent - (tabw * i_space)) * ' ')
 
     cdef_pat = re.compile('(public|private|protected)\s*\:')
     case_pat = re.compile('(case\s+.+|default)\:')
     text = text.strip()
-    if text.endswith('{') or cdef_pat.match(text) or case_pat.match(text):
+    # Indent a level if the innermost open brace was opened on this line
+    bpos = estc.GetOpenBracket(pos)
+    if (bpos >= spos and estc.GetCharAt(bpos) == ord('{')) or \
+       cdef_pat.match(text) or case_pat.match(text):
         rtxt += ichar
 
     # Put text in the buffer
@@ -203,7 +203,7 @@ def AutoIndenter(estc, pos, ichar):
     """
     rtxt = ''
     line = estc.GetCurrentLine()
-    text = estc.GetTextRange(estc.PositionFromLine(line), pos)
+    spos = estc.PositionFromLine(line)
     eolch = estc.GetEOLChar()
 
     indent = estc.GetLineIndentation(line)
@@ -212,11 +212,13 @@ def AutoIndenter(estc, pos, ichar):
     else:
         tabw = estc.GetIndent()
 
-    i_space = indent / tabw
+    i_space = indent // tabw
     ndent = eolch + ichar * i_space
     rtxt = ndent + ((indent - (tabw * i_space)) * ' ')
 
-    if text.endswith('{'):
+    # Indent a level if the innermost open brace was opened on this line
+    bpos = estc.GetOpenBracket(pos)
+    if bpos >= spos and estc.GetCharAt(bpos) == ord('{'):
         rtxt += ichar
 
     # Put text in the buffer
@@ -260,7 +260,7 @@ def AutoIndenter(estc, pos, ichar):
 
     # Standard indent to match previous line
     indent = estc.GetLineIndentation(line)
-    levels = indent / tabw
+    levels = indent // tabw
     end_spaces = ((indent - (tabw * levels)) * " ")
     rtxt = eolch + (ichar * levels) + end_spaces
 
@@ -276,9 +276,14 @@ def AutoIndenter(estc, pos, ichar):
                not tagval.endswith("?>"):
                 # Cursor is after an opening tag so we need to indent more
                 # First match to the starting tag
-                levels = (tagstart / tabw) # Add an extra level
+                levels = (tagstart // tabw) # Add an extra level
                 end_spaces = ((tagstart - (tabw * levels)) * " ")
                 rtxt = eolch + (ichar * (levels+1)) + end_spaces
+    else:
+        # Indent a level after an open brace in embedded script and style
+        bpos = estc.GetOpenBracket(pos)
+        if bpos >= spos and estc.GetCharAt(bpos) == ord('{'):
+            rtxt += ichar
 
     # Put text in the buffer
     estc.AddText(rtxt)
@@ -163,7 +163,7 @@ def AutoIndenter(estc, pos, ichar):
     else:
         tabw = estc.GetIndent()
 
-    i_space = indent / tabw
+    i_space = indent // tabw
     ndent = eolch + ichar * i_space
     rtxt = ndent + ((indent - (tabw * i_space)) * ' ')
 
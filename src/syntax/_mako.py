@@ -21,11 +21,11 @@ __revision__ = "$Revision: 68798 $"
 # Imports
 import wx.stc as stc
 from pygments.token import Token
-from pygments.lexers import get_lexer_by_name
 
 # Local Imports
 from . import synglob
 from . import syndata
+from . import synlex
 
 #-----------------------------------------------------------------------------#
 # Style Id's
@@ -96,27 +96,13 @@ def StyleText(stc, start, end):
     @param end: end position
 
     """
-    cpos = 0
-    stc.StartStyling(cpos, 0x1f)
-    lexer = get_lexer_by_name("html+mako")
-    doctxt = stc.GetTextRange(0, end)
-    wineol = stc.GetEOLChar() == "\r\n"
-    for token, txt in lexer.get_tokens(doctxt):
-#        print token, txt
-        style = TOKEN_MAP.get(token, STC_MAKO_DEFAULT)
-        if style == STC_MAKO_PREPROCESSOR and txt.startswith('#'):
-            style = STC_MAKO_COMMENT
-#        elif style == STC_MAKO_STRING and txt[-1] not in '"\'':
-#            style = STC_MAKO_STRINGEOL
-
-        tlen = len(txt)
-        if wineol and "\n" in txt:
-            tlen += txt.count("\n")
-
-        if tlen:
-            stc.SetStyling(tlen, style)
-        cpos += tlen
-        stc.StartStyling(cpos, 0x1f)
+    LEXER.StyleText(stc, start, end)
+
+def _StyleHook(token, txt, style):
+    """Style preprocessor comments as comments"""
+    if style == STC_MAKO_PREPROCESSOR and txt.startswith('#'):
+        style = STC_MAKO_COMMENT
+    return style
 
 #-----------------------------------------------------------------------------#
 
@@ -131,4 +117,7 @@ TOKEN_MAP = { Token.Literal.String : STC_MAKO_STRING,
               Token.Name.Attribute : STC_MAKO_ATTRIBUTE,
               Token.String.Interpol : STC_MAKO_SCALAR,
               Token.Name.Tag : STC_MAKO_TAG }
+
+LEXER = synlex.PygmentsLexer("html+mako", TOKEN_MAP, STC_MAKO_DEFAULT,
+                             _StyleHook)
               
\ No newline at end of file
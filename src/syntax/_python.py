@@ -129,25 +129,9 @@ def AutoIndenter(estc, pos, ichar):
         return
 
     # In case of open bracket: Indent next to open bracket
-    def BackTrack(tmp_text, tline):
-        bcount = [ tmp_text.count(brac) for brac in ")}]({[" ]
-        bRecurse = False
-        for idx, val in enumerate(bcount[:3]):
-            if val > bcount[idx+3]:
-                bRecurse = True
-                break
-        if bRecurse:
-            tline = tline - 1
-            if tline < 0:
-                return tmp_text
-            spos = estc.PositionFromLine(tline)
-            tmp_text = estc.GetTextRange(spos, pos)
-            BackTrack(tmp_text, tline)
-        return tmp_text
-    text = BackTrack(text, line)
-    pos = PosOpenBracket(text)
-    if pos > -1:
-        rval = eolch + (pos + 1) * " "
+    bpos = estc.GetOpenBracket(pos)
+    if bpos > -1:
+        rval = eolch + (estc.GetColumn(bpos) + 1) * " "
         estc.AddText(rval)
         return
 
@@ -157,7 +141,7 @@ def AutoIndenter(estc, pos, ichar):
     else:
         tabw = estc.GetIndent()
 
-    i_space = indent / tabw
+    i_space = indent // tabw
     end_spaces = ((indent - (tabw * i_space)) * " ")
 
     tokens = [_f for _f in text.strip().split() if _f]
@@ -168,13 +152,14 @@ def AutoIndenter(estc, pos, ichar):
         elif tokens[-1].endswith("\\"):
             i_space += 1
         elif len(tokens[-1]) and tokens[-1][-1] in "}])":
-            ptok = tokens[-1][-1]
-            paren_pos = pos - (len(text) - text.rfind(ptok))
-            oparen, cparen = estc.GetBracePair(paren_pos)
-            if cparen >= 0: # Found matching bracket
-                line = estc.LineFromPosition(cparen)
+            # Match the indentation of the line the bracket was opened on
+            tail = text[len(text.rstrip()) - 1:]
+            paren_pos = pos - len(tail.encode('utf-8'))
+            oparen = estc.GetMatchingBracket(paren_pos)
+            if oparen >= 0: # Found matching bracket
+                line = estc.LineFromPosition(oparen)
                 indent = estc.GetLineIndentation(line)
-                i_space = indent / tabw
+                i_space = indent // tabw
                 end_spaces = ((indent - (tabw * i_space)) * " ")
         elif tokens[0] in UNINDENT_KW:
             i_space = max(i_space - 1, 0)
@@ -200,39 +185,4 @@ def KeywordString():
     """
     return PY_KW[1]
 
-def PosOpenBracket(text):
-    """Returns the position of the right most open bracket in text.
-    Brackets inside strings are ignored. In case of no open bracket
-    the returned value is -1
-    @param text: The line preceding the new line to be indented.
-    @return res: The position of right most open bracket.
-    @note: Used by AutoIndenter
-
-    """
-    # Store positions of '(', '[','{', ')', ']', '}'
-    brackets = [[], [], [], [], [], []]
-    quotes = "'" + '"'
-    in_string = False
-    for pos, char in enumerate(text):
-        if in_string:
-            in_string = not char == quote
-        else:
-            if char == '#':
-                break
-            typ = '([{)]}'.find(char)
-            if typ > -1:
-                brackets[typ].append(pos)
-            else:
-                typ = quotes.find(char)
-                if typ > -1:
-                    in_string = True
-                    quote = quotes[typ]
-    res = -1
-    for typ in range(3):
-        opn, cls = brackets[typ], brackets[typ+3]
-        nopn, ncls = len(opn), len(cls)
-        if nopn > ncls:
-            res = max(res, opn[nopn - ncls - 1])
-    return res
-
 #---- End Syntax Modules Internal Functions ----#
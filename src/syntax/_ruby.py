@@ -117,7 +117,8 @@ def AutoIndenter(estc, pos, ichar):
     """
     rtxt = ''
     line = estc.GetCurrentLine()
-    text = estc.GetTextRange(estc.PositionFromLine(line), pos)
+    spos = estc.PositionFromLine(line)
+    text = estc.GetTextRange(spos, pos)
     eolch = estc.GetEOLChar()
 
     indent = estc.GetLineIndentation(line)
@@ -126,13 +127,16 @@ def AutoIndenter(estc, pos, ichar):
     else:
         tabw = estc.GetIndent()
 
-    i_space = indent / tabw
+    i_space = indent // tabw
     ndent = eolch + ichar * i_space
     rtxt = ndent + ((indent - (tabw * i_space)) * ' ')
 
     def_pat = re.compile('\s*(class|def)\s+[a-zA-Z_][a-zA-Z0-9_]*')
     text = text.strip()
-    if text.endswith('{') or def_pat.match(text):
+    # Indent a level if the innermost open brace was opened on this line
+    bpos = estc.GetOpenBracket(pos)
+    if (bpos >= spos and estc.GetCharAt(bpos) == ord('{')) or \
+       def_pat.match(text):
         rtxt += ichar
 
     # Put text in the buffer
@@ -29,6 +29,7 @@ import re
 # Local Imports
 from . import synglob
 from . import syndata
+from . import synlex
 
 #-----------------------------------------------------------------------------#
 # Style Id's
@@ -109,16 +110,7 @@ def StyleText(stc, start, end):
     @param end: end position
 
     """
-
-    for index, token, txt in lexer.get_tokens_unprocessed(stc.GetTextRange(0, end)):
-#        print index, token, txt
-        style = TOKEN_MAP.get(token, STC_XTEXT_DEFAULT)
-
-#        print "Text=%s, len=%s" % (txt, len(txt))
-        stc.StartStyling(index, 0x1f)
-        tlen = len(txt)
-        if tlen:
-            stc.SetStyling(len(txt), style)
+    LEXER.StyleText(stc, start, end)
 
 def AutoIndenter(estc, pos, ichar):
     """Auto indent xtext code.
@@ -152,7 +144,7 @@ def AutoIndenter(estc, pos, ichar):
     else:
         tabw = estc.GetIndent()
 
-    i_space = indent / tabw
+    i_space = indent // tabw
     end_spaces = ((indent - (tabw * i_space)) * " ")
 
     if text.endswith(":"):
@@ -248,6 +240,7 @@ class XTextLexer(RegexLexer):
     }
 
 lexer = XTextLexer()
+LEXER = synlex.PygmentsLexer(lexer, TOKEN_MAP, STC_XTEXT_DEFAULT)
 
 if __name__=='__main__':
     import codecs, sys
@@ -0,0 +1,886 @@
+###############################################################################
+# Name: synlex.py                                                             #
+# Purpose: Incremental container lexer for pygments based syntax modules      #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Incremental container lexing for the syntax modules that style their text
+with a pygments lexer.
+
+The state of the pygments lexer (its state stack) at the first token
+boundary of each line is saved as a checkpoint in the line state of the
+buffer. When the buffer asks for text to be styled the lexer is restarted
+from the nearest checkpoint before the first unstyled position instead of
+from the start of the document, and stops again once its state matches the
+checkpoint that was saved for a line after the modified text. The styles are
+applied to the buffer in bulk.
+
+Rules that can match over line ends (comments and strings that span lines,
+lookaheads) can look at text far past the token they produce, and whether
+they match can change when that text is edited. For each rule that can
+match a newline the lexer finds how far ahead it looked, and every
+checkpoint records the last position that was looked at to lex up to it.
+Lexing is only restarted from a checkpoint when that position is before the
+modified text.
+
+Both plain RegexLexer's and template lexers that delegate the text that is
+not template markup to a root lexer (DelegatingLexer) are supported.
+
+@summary: Incremental container lexer for pygments lexers
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id: $"
+__revision__ = "$Revision: $"
+
+__all__ = ['PygmentsLexer',]
+
+#-----------------------------------------------------------------------------#
+# Imports
+import sys
+import bisect
+import collections
+import wx.stc as stc
+from pygments.lexer import RegexLexer, DelegatingLexer
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Text, Error, _TokenType
+
+try:
+    from re import _parser as sre_parse
+    from re import _compiler as sre_compile
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_compile
+    import sre_constants
+
+#-----------------------------------------------------------------------------#
+# Globals
+
+STYLE_MASK = 0x1f
+
+# Amount of text past the end of the range being styled that is passed to
+# the lexer so that rules that look ahead see more than the visible text.
+LEX_LOOKAHEAD = 4096
+
+# Checkpoints are stored in the line state as an id into _STATES offset by
+# STATE_BASE so they do not clash with the states of other lexers. Only the
+# MAX_STATES most recently used checkpoints are kept, lines whose checkpoint
+# was dropped are restarted from an earlier line.
+STATE_BASE = 1 << 28
+STATE_RANGE = 1 << 28
+MAX_STATES = 1 << 15
+_STATES = collections.OrderedDict() # state id -> checkpoint
+_STATE_IDS = dict()                 # checkpoint -> state id
+_NEXT_STATE = 0
+
+_STYLE_BYTES = [ bytes((style,)) for style in range(256) ]
+
+# Regular expression elements for the rule checks
+_CHARS = (sre_constants.LITERAL, sre_constants.NOT_LITERAL,
+          sre_constants.ANY, sre_constants.IN)
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) + \
+           tuple(getattr(sre_constants, name)
+                 for name in ('POSSESSIVE_REPEAT',)
+                 if hasattr(sre_constants, name))
+_ASSERTS = (sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+_ATOMIC = getattr(sre_constants, 'ATOMIC_GROUP', None)
+_EOL_CATEGORIES = ('CATEGORY_SPACE', 'CATEGORY_NOT_DIGIT',
+                   'CATEGORY_NOT_WORD', 'CATEGORY_LINEBREAK',
+                   'CATEGORY_UNI_SPACE', 'CATEGORY_UNI_NOT_DIGIT',
+                   'CATEGORY_UNI_NOT_WORD', 'CATEGORY_UNI_LINEBREAK',
+                   'CATEGORY_LOC_NOT_WORD')
+_EOL = ord('\n')
+
+# Reach tables of the lexer classes that have been checked
+_REACH = dict()
+
+#-----------------------------------------------------------------------------#
+
+def _GetEolToken():
+    """Get the token that RegexLexer's give to a newline that none of the
+    rules matched. This differs between versions of pygments.
+    @return: pygments token
+
+    """
+    class EolLexer(RegexLexer):
+        tokens = {'root': [('x', Text)]}
+    return list(EolLexer().get_tokens_unprocessed('\n'))[0][1]
+
+EOL_TOKEN = _GetEolToken()
+
+def _CharMatchesEol(op, av, flags):
+    """Can a single character element of a regular expression match a
+    newline.
+    @param op: sre opcode
+    @param av: opcode arguments
+    @param flags: regular expression flags
+    @return: bool
+
+    """
+    if op is sre_constants.LITERAL:
+        return av == _EOL
+    elif op is sre_constants.NOT_LITERAL:
+        return av != _EOL
+    elif op is sre_constants.ANY:
+        return bool(flags & sre_constants.SRE_FLAG_DOTALL)
+
+    # Character set
+    match = False
+    negate = False
+    for iop, iav in av:
+        if iop is sre_constants.NEGATE:
+            negate = True
+        elif iop is sre_constants.LITERAL:
+            match = match or iav == _EOL
+        elif iop is sre_constants.RANGE:
+            match = match or iav[0] <= _EOL <= iav[1]
+        elif iop is sre_constants.CATEGORY:
+            match = match or str(iav) in _EOL_CATEGORIES
+    return match != negate
+
+def _CanMatchEol(items, flags, behind=False, skip=0):
+    """Can an element of a parsed regular expression match a newline
+    @param items: parsed pattern (list of (op, av))
+    @param flags: regular expression flags
+    @keyword behind: only check the elements in lookbehinds
+    @keyword skip: do not check lookbehinds of at most this many characters
+    @return: bool
+
+    """
+    for op, av in items:
+        if op in _CHARS:
+            if not behind and _CharMatchesEol(op, av, flags):
+                return True
+        elif op in _REPEATS:
+            if _CanMatchEol(av[2], flags, behind, skip):
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if _CanMatchEol(av[-1], (flags | av[1]) & ~av[2], behind,
+                            skip):
+                return True
+        elif op is sre_constants.BRANCH:
+            if any(_CanMatchEol(alt, flags, behind, skip)
+                   for alt in av[1]):
+                return True
+        elif op in _ASSERTS:
+            if behind and av[0] < 0 and av[1].getwidth()[1] <= skip:
+                continue
+            if _CanMatchEol(av[1], flags, behind and av[0] >= 0, skip):
+                return True
+        elif op is sre_constants.GROUPREF:
+            if not behind:
+                return True
+        elif op is sre_constants.GROUPREF_EXISTS:
+            if any(_CanMatchEol(alt, flags, behind, skip)
+                   for alt in av[1:] if alt):
+                return True
+        elif op is _ATOMIC:
+            if _CanMatchEol(av, flags, behind, skip):
+                return True
+    return False
+
+def _Prefix(items, state, after=None):
+    """Build the parsed regular expression that matches the text that a
+    regular expression can consume before looking at the next character.
+    It matches more than the regular expression can so that it can be
+    used to find how far the regular expression looks ahead.
+    @param items: parsed pattern (list of (op, av))
+    @param state: parser state of the pattern
+    @keyword after: the elements that follow the items in the pattern
+                    or None if that is not known
+    @return: list of (op, av)
+
+    """
+    SubPattern = sre_parse.SubPattern
+    items = list(items)
+    if not items:
+        return [(sre_constants.ASSERT_NOT, (1, SubPattern(state, [])))]
+
+    op, av = items[0]
+    rest = items[1:]
+    follow = None if after is None else rest + after
+    if op in _CHARS:
+        first = list()
+    elif op in _REPEATS:
+        least, most, body = av
+        if most == 0:
+            first = list()
+        elif op is sre_constants.MIN_REPEAT and follow is not None:
+            # A lazy repeat only goes on where the rest of the pattern
+            # does not match.
+            more = SubPattern(state,
+                              [(sre_constants.ASSERT_NOT,
+                                (1, SubPattern(state, follow)))] + list(body))
+            if most != sre_constants.MAXREPEAT:
+                most -= least
+            lazy = [(sre_constants.MAX_REPEAT, (least, least, body)),
+                    (sre_constants.MAX_REPEAT, (0, most, more))]
+            first = lazy + \
+                    [(sre_constants.BRANCH,
+                      (None, [ SubPattern(state, _Prefix(body, state)),
+                               SubPattern(state,
+                                          _Prefix(rest, state, after)) ]))]
+            if least:
+                first = [(sre_constants.BRANCH,
+                          (None, [ SubPattern(state, first),
+                                   SubPattern(state,
+                                     [(sre_constants.MAX_REPEAT,
+                                       (0, least - 1, body))] +
+                                     _Prefix(body, state)) ]))]
+            return first
+        else:
+            if most != sre_constants.MAXREPEAT:
+                most -= 1
+            first = [(sre_constants.MAX_REPEAT, (0, most, body))] + \
+                    _Prefix(body, state)
+    elif op is sre_constants.SUBPATTERN:
+        first = [(sre_constants.SUBPATTERN,
+                  (None,) + av[1:-1] +
+                  (SubPattern(state, _Prefix(av[-1], state, follow)),))]
+    elif op is sre_constants.BRANCH:
+        first = [(sre_constants.BRANCH,
+                  (None, [ SubPattern(state, _Prefix(alt, state, follow))
+                           for alt in av[1] ]))]
+    elif op is sre_constants.GROUPREF_EXISTS:
+        first = [(sre_constants.BRANCH,
+                  (None, [ SubPattern(state,
+                                      _Prefix(alt or [], state, follow))
+                           for alt in av[1:] ]))]
+    elif op is _ATOMIC:
+        first = _Prefix(av, state, list())
+    elif op is sre_constants.GROUPREF:
+        # The text of the group is not known here
+        first = sre_parse.parse('(?s:.*)').data
+    elif op in _ASSERTS and av[0] >= 0:
+        # Lookaheads look at the text without moving on
+        first = _Prefix(av[1], state, list())
+        if rest:
+            first = [(sre_constants.BRANCH,
+                      (None, [ SubPattern(state, first),
+                               SubPattern(state,
+                                          _Prefix(rest, state, after)) ]))]
+        return first
+    else:
+        # Other zero width elements
+        if rest:
+            return _Prefix(rest, state, after)
+        return list()
+
+    if not rest:
+        return first
+    return [(sre_constants.BRANCH,
+             (None, [ SubPattern(state, first),
+                      SubPattern(state, [items[0]] +
+                                        _Prefix(rest, state, after)) ]))]
+
+def _GetReach(regex):
+    """Get the function that checks if a regular expression could look at
+    the character at a given position when matching from another one.
+    @param regex: compiled regular expression
+    @return: match function (text, pos, endpos) or None if the regular
+             expression can not match a newline
+
+    """
+    parsed = sre_parse.parse(regex.pattern, regex.flags)
+    if not _CanMatchEol(parsed, parsed.state.flags):
+        return None
+
+    state = parsed.state
+    items = _Prefix(parsed, state, list()) + \
+            [(sre_constants.AT, sre_constants.AT_END_STRING)]
+    return sre_compile.compile(sre_parse.SubPattern(state, items),
+                               regex.flags).match
+
+def _GetReachTable(lexer, joined=False):
+    """Get the reach checks for the rules of a RegexLexer. The table has
+    a list for each state with the reach check of each rule.
+    @param lexer: RegexLexer instance
+    @keyword joined: the lexer lexes text joined from pieces (the root lexer
+                     of a template lexer) so the character before a line
+                     start is not always the line end
+    @return: dict of state -> list or None if the lexer can not be lexed
+             incrementally
+
+    """
+    key = (type(lexer), joined)
+    if key not in _REACH:
+        # Lexing is only restarted at or after a line start, where a single
+        # character lookbehind only sees the unmodified line end before it.
+        skip = 0 if joined else 1
+        table = dict()
+        try:
+            for name, rules in lexer._tokens.items():
+                table[name] = reaches = list()
+                for rexmatch, action, new_state in rules:
+                    regex = rexmatch.__self__
+                    parsed = sre_parse.parse(regex.pattern, regex.flags)
+                    if _CanMatchEol(parsed, parsed.state.flags, True, skip):
+                        # Looks behind over line ends
+                        raise ValueError(regex.pattern)
+                    reaches.append(_GetReach(regex))
+        except Exception:
+            table = None
+        _REACH[key] = table
+    return _REACH[key]
+
+def _GetExtent(reach, text, pos, first):
+    """Find the last position that a rule that starts matching at a
+    position could have looked at.
+    @param reach: reach check of the rule
+    @param text: string
+    @param pos: position the rule was matched at
+    @param first: a position the rule is known to look at
+    @return: position (len(text) if it looks at all of the text)
+
+    """
+    textlen = len(text)
+    low = first
+    step = 64
+    high = low + step
+    while high < textlen and reach(text, pos, high):
+        low = high
+        step *= 2
+        high = low + step
+
+    if high >= textlen:
+        if reach(text, pos, textlen):
+            return textlen
+        high = textlen
+
+    while high - low > 1:
+        mid = (low + high) // 2
+        if reach(text, pos, mid):
+            low = mid
+        else:
+            high = mid
+    return low
+
+#-----------------------------------------------------------------------------#
+
+def _GetStateId(checkpoint):
+    """Get the line state value for a checkpoint
+    @param checkpoint: hashable tuple
+    @return: int
+
+    """
+    global _NEXT_STATE
+    sid = _STATE_IDS.get(checkpoint, None)
+    if sid is not None:
+        _STATES.move_to_end(sid)
+        return sid
+
+    # Ids are not reused while the checkpoint they were given to is kept
+    sid = STATE_BASE + _NEXT_STATE
+    while sid in _STATES:
+        _NEXT_STATE = (_NEXT_STATE + 1) % STATE_RANGE
+        sid = STATE_BASE + _NEXT_STATE
+    _NEXT_STATE = (_NEXT_STATE + 1) % STATE_RANGE
+    _STATES[sid] = checkpoint
+    _STATE_IDS[checkpoint] = sid
+    if len(_STATES) > MAX_STATES:
+        old = _STATES.popitem(last=False)[1]
+        del _STATE_IDS[old]
+    return sid
+
+def _GetCheckpoint(sid):
+    """Get the checkpoint stored in a line state value
+    @param sid: line state value
+    @return: tuple or None
+
+    """
+    checkpoint = _STATES.get(sid, None)
+    if checkpoint is not None:
+        _STATES.move_to_end(sid)
+    return checkpoint
+
+#-----------------------------------------------------------------------------#
+
+class _StateRunner(object):
+    """Runs a pygments RegexLexer from a saved state stack. The same rules
+    are applied as in RegexLexer.get_tokens_unprocessed but the state stack
+    is kept on the runner so it can be checkpointed. The runner also keeps
+    track of the last position that the rules it tried have looked at.
+
+    """
+    def __init__(self, lexer, stack, reach=0, needle=None, trace=False):
+        """Create the runner
+        @param lexer: RegexLexer instance
+        @param stack: state stack to start in
+        @keyword reach: last position looked at before the start position
+        @keyword needle: token of text that can be split at any point
+                         (the text a template lexer delegates)
+        @keyword trace: keep the reach after the rules at each position
+                        have been tried (see GetReachBefore)
+
+        """
+        super(_StateRunner, self).__init__()
+
+        # Attributes
+        self.lexer = lexer
+        self.stack = list(stack)
+        self.reach = reach
+        self.needle = needle
+        self.points = list() # (mark index, position, stack, reach)
+        self.trace = list() if trace else None # (position, reach)
+
+    def GetReachBefore(self, pos):
+        """Get the last position looked at by the rules that were tried at
+        the positions before the given one. Only available when the runner
+        was created with trace enabled.
+        @param pos: position
+        @return: position
+
+        """
+        idx = bisect.bisect_left(self.trace, (pos,)) - 1
+        if idx < 0:
+            return 0
+        return self.trace[idx][1]
+
+    def Tokens(self, text, pos, marks):
+        """Generate the tokens of the text starting at the given position.
+        The state at the first token boundary at or after each of the
+        marks is added to the points list.
+        @param text: string
+        @param pos: position to start lexing at
+        @param marks: sorted list of positions (line starts)
+
+        """
+        lexer = self.lexer
+        needle = self.needle
+        tokendefs = lexer._tokens
+        reachdefs = _GetReachTable(lexer)
+        statestack = self.stack
+        statetokens = tokendefs[statestack[-1]]
+        statereach = reachdefs[statestack[-1]]
+        points = self.points
+        nmarks = len(marks)
+        midx = bisect.bisect_right(marks, pos)
+        nextmark = marks[midx] if midx < nmarks else sys.maxsize
+        textlen = len(text)
+        lineend = -1
+        trace = self.trace
+        while True:
+            tried = pos
+            for (rexmatch, action, new_state), reach in zip(statetokens,
+                                                            statereach):
+                m = rexmatch(text, pos)
+                if reach is not None and (m is None or action is not needle):
+                    # Find how far past the end of the line the rule looked
+                    if pos > lineend:
+                        lineend = text.find('\n', pos)
+                        if lineend == -1:
+                            lineend = textlen - 1
+                    first = max(lineend, self.reach) + 1
+                    if first <= textlen and reach(text, pos, first):
+                        self.reach = _GetExtent(reach, text, pos, first)
+                if m:
+                    if action is None:
+                        pass
+                    elif type(action) is _TokenType:
+                        yield pos, action, m.group()
+                    else:
+                        for item in action(lexer, m):
+                            yield item
+                    pos = m.end()
+                    if new_state is not None:
+                        # state transition
+                        if isinstance(new_state, tuple):
+                            for state in new_state:
+                                if state == '#pop':
+                                    statestack.pop()
+                                elif state == '#push':
+                                    statestack.append(statestack[-1])
+                                else:
+                                    statestack.append(state)
+                        elif isinstance(new_state, int):
+                            # pop
+                            del statestack[new_state:]
+                        elif new_state == '#push':
+                            statestack.append(statestack[-1])
+                        else:
+                            assert False, "wrong state def: %r" % new_state
+                        statetokens = tokendefs[statestack[-1]]
+                        statereach = reachdefs[statestack[-1]]
+                    break
+            else:
+                if pos >= textlen:
+                    return
+                elif text[pos] == '\n':
+                    # at EOL, reset state to "root"
+                    statestack[:] = ['root']
+                    statetokens = tokendefs['root']
+                    statereach = reachdefs['root']
+                    yield pos, EOL_TOKEN, '\n'
+                else:
+                    yield pos, Error, text[pos]
+                pos += 1
+
+            if trace is not None:
+                trace.append((tried, self.reach))
+            if pos >= nextmark:
+                while midx + 1 < nmarks and marks[midx + 1] <= pos:
+                    midx += 1
+                points.append((midx, pos, tuple(statestack),
+                               max(self.reach, pos)))
+                midx += 1
+                nextmark = marks[midx] if midx < nmarks else sys.maxsize
+
+#-----------------------------------------------------------------------------#
+
+class PygmentsLexer(object):
+    """Container lexer that styles a buffer with a pygments lexer. An
+    instance is registered as the StyleText feature of a syntax module.
+
+    """
+    def __init__(self, lexer, token_map, default=0, style_hook=None):
+        """Create the lexer
+        @param lexer: pygments lexer instance or name of the lexer
+        @param token_map: dict of pygments token -> style id
+        @keyword default: style id for tokens not in the token map
+        @keyword style_hook: callable(token, text, style) -> style to adjust
+                             the style of a token
+
+        """
+        super(PygmentsLexer, self).__init__()
+
+        # Attributes
+        self._lexer = lexer
+        self._tokmap = token_map
+        self._default = default
+        self._hook = style_hook
+        self._incremental = None
+
+    def __call__(self, buff, start, end):
+        """StyleText feature entry point"""
+        self.StyleText(buff, start, end)
+
+    #---- Implementation ----#
+
+    def _GetRestart(self, buff, start, initial):
+        """Find the checkpoint to restart lexing from
+        @param buff: EditraBaseStc
+        @param start: first position that needs to be styled
+        @param initial: state to use when starting from the top
+        @return: (line, position, state, reach)
+
+        """
+        line = buff.LineFromPosition(start)
+        while line > 0:
+            checkpoint = _GetCheckpoint(buff.GetLineState(line))
+            if checkpoint is not None and checkpoint[0] is self:
+                # The text that was looked at to lex up to the checkpoint
+                # must all be before the modified text.
+                lstart = buff.PositionFromLine(line)
+                if lstart + checkpoint[3] < start:
+                    return (line, lstart + checkpoint[1], checkpoint[2],
+                            lstart + checkpoint[3])
+            line -= 1
+        return 0, 0, initial, 0
+
+    def _GetStyle(self, token, txt):
+        """Get the style id for a token"""
+        style = self._tokmap.get(token, self._default)
+        if self._hook is not None:
+            style = self._hook(token, txt, style)
+        return style
+
+    def _LexDelegating(self, buff, text, lexstart, rstart, marks, state,
+                       reach):
+        """Lex the text with a template lexer. The template markup is lexed
+        first and the remaining text is then lexed with the root lexer as a
+        whole, the same as DelegatingLexer does.
+        @return: (runs, points) runs is a list of (start, end, style) and
+                 points is a dict of mark index -> (position, state, reach)
+
+        """
+        lexer = self.GetLexer()
+        needle = lexer.needle
+        lang = _StateRunner(lexer.language_lexer, state[0], reach, needle,
+                            trace=True)
+        runs = list()
+        parts = list()
+        segments = list() # (buffer position, text position)
+        buflen = 0
+        rbuf = None       # buffer position of rstart
+        safe = dict()     # mark index -> (language state, reach)
+        nmarks = len(marks)
+        for idx, token, txt in lang.Tokens(text, lexstart, marks):
+            tlen = len(txt)
+            if token is needle:
+                if rbuf is None and idx + tlen > rstart:
+                    rbuf = buflen + max(0, rstart - idx)
+                # Other text in the root state is passed through unchanged
+                # so the lines inside of it are safe places to restart.
+                if lang.stack == ['root']:
+                    midx = bisect.bisect_right(marks, idx)
+                    while midx < nmarks and marks[midx] < idx + tlen:
+                        safe[midx] = (('root',), lang.reach)
+                        midx += 1
+                segments.append((buflen, idx))
+                parts.append(txt)
+                buflen += tlen
+            elif tlen:
+                runs.append((idx, idx + tlen, self._GetStyle(token, txt)))
+
+        for midx, pos, lstate, lreach in lang.points:
+            if pos == marks[midx]:
+                safe[midx] = (lstate, lreach)
+
+        # Map the text positions to positions in the root lexers buffer
+        bufpos = [ seg[0] for seg in segments ]
+        textpos = [ seg[1] for seg in segments ]
+        def ToBuffer(pos):
+            sidx = bisect.bisect_right(textpos, pos) - 1
+            if sidx < 0:
+                return 0
+            return min(bufpos[sidx] + pos - textpos[sidx],
+                       bufpos[sidx + 1] if sidx + 1 < len(bufpos) else buflen)
+
+        def ToText(pos):
+            if pos >= buflen:
+                return len(text)
+            sidx = bisect.bisect_right(bufpos, pos) - 1
+            return textpos[sidx] + pos - bufpos[sidx]
+
+        if rbuf is None:
+            rbuf = buflen
+        buffer = ''.join(parts)
+        bmarks = [ ToBuffer(mark) for mark in marks ]
+        root = _StateRunner(lexer.root_lexer, state[1], ToBuffer(reach))
+        for idx, token, txt in root.Tokens(buffer, rbuf, bmarks):
+            if not txt:
+                continue
+
+            # Tokens can span several pieces of the buffer
+            style = self._GetStyle(token, txt)
+            tend = idx + len(txt)
+            sidx = bisect.bisect_right(bufpos, idx) - 1
+            while idx < tend:
+                send = bufpos[sidx + 1] if sidx + 1 < len(bufpos) else buflen
+                pend = min(tend, send)
+                tpos = textpos[sidx] + idx - bufpos[sidx]
+                runs.append((tpos, tpos + pend - idx, style))
+                idx = pend
+                sidx += 1
+        runs.sort()
+
+        # The language lexer is restarted at the line start but the styles
+        # are only set from the checkpoint on, so the checkpoint must cover
+        # what the rules tried between the two looked at.
+        points = dict()
+        for midx, bpos, rstate, rreach in root.points:
+            if midx in safe and bpos < buflen:
+                lstate, lreach = safe[midx]
+                pos = ToText(bpos)
+                points[midx] = (pos, (lstate, rstate),
+                                max(pos, lreach, lang.GetReachBefore(pos),
+                                    ToText(rreach)))
+        return runs, points
+
+    def _SetStyles(self, buff, text, bstart, first, last, runs):
+        """Apply the styles for a range of the text to the buffer
+        @param buff: EditraBaseStc
+        @param text: string
+        @param bstart: buffer position of first
+        @param first: first position in text to style
+        @param last: end position in text to style
+        @param runs: sorted list of (start, end, style)
+
+        """
+        ascii = text.isascii()
+        default = _STYLE_BYTES[self._default]
+        styles = list()
+        pos = first
+        for rstart, rend, style in runs:
+            if rend <= pos:
+                continue
+            elif rstart >= last:
+                break
+
+            rstart = max(rstart, pos)
+            rend = min(rend, last)
+            if rstart > pos:
+                # Text the lexer did not produce a token for
+                glen = rstart - pos if ascii \
+                       else len(text[pos:rstart].encode('utf-8'))
+                styles.append(default * glen)
+            rlen = rend - rstart if ascii \
+                   else len(text[rstart:rend].encode('utf-8'))
+            styles.append(_STYLE_BYTES[style] * rlen)
+            pos = rend
+
+        if pos < last:
+            glen = last - pos if ascii \
+                   else len(text[pos:last].encode('utf-8'))
+            styles.append(default * glen)
+
+        styles = b''.join(styles)
+        buff.StartStyling(bstart, STYLE_MASK)
+        if styles:
+            buff.SetStyleBytes(len(styles), styles)
+
+    #---- Public Api ----#
+
+    def GetLexer(self):
+        """Get the pygments lexer
+        @return: pygments Lexer
+
+        """
+        if isinstance(self._lexer, str):
+            self._lexer = get_lexer_by_name(self._lexer)
+        return self._lexer
+
+    def IsIncremental(self):
+        """Can the lexer be restarted from a checkpoint
+        @return: bool
+
+        """
+        if self._incremental is None:
+            lexer = self.GetLexer()
+            if isinstance(lexer, DelegatingLexer):
+                lexers = ((lexer.root_lexer, True),
+                          (lexer.language_lexer, False))
+            else:
+                lexers = ((lexer, False),)
+            self._incremental = all(isinstance(sub, RegexLexer) and
+                                    _GetReachTable(sub, joined) is not None
+                                    for sub, joined in lexers)
+        return self._incremental
+
+    def StyleText(self, buff, start, end):
+        """Style the text
+        @param buff: Styled text control instance
+        @param start: first position that needs to be styled
+        @param end: end position
+
+        """
+        lexer = self.GetLexer()
+        if not self.IsIncremental():
+            # Restyle everything up to the end position
+            text = buff.GetTextRange(0, end)
+            runs = list()
+            for idx, token, txt in lexer.get_tokens_unprocessed(text):
+                if txt:
+                    runs.append((idx, idx + len(txt),
+                                 self._GetStyle(token, txt)))
+            self._SetStyles(buff, text, 0, 0, len(text), runs)
+            return
+
+        delegating = isinstance(lexer, DelegatingLexer)
+        initial = (('root',), ('root',)) if delegating else ('root',)
+        line, rpos, state, reach = self._GetRestart(buff, start, initial)
+
+        # The previous line is included so rules that look behind see the
+        # same text as when lexing from the top.
+        lstart = buff.PositionFromLine(line)
+        context = buff.GetTextRange(buff.PositionFromLine(max(0, line - 1)),
+                                    lstart)
+        head = buff.GetTextRange(lstart, rpos)
+        body = buff.GetTextRange(rpos, end)
+        lexend = buff.GetLength()
+        if end + LEX_LOOKAHEAD < lexend:
+            lexend = max(end, buff.PositionFromLine(
+                                buff.LineFromPosition(end + LEX_LOOKAHEAD)))
+        text = context + head + body + buff.GetTextRange(end, lexend)
+        lexstart = len(context)
+        rstart = lexstart + len(head)
+        tend = rstart + len(body)
+        ascii = text.isascii()
+        truncated = lexend < buff.GetLength()
+        reach = rstart + len(buff.GetTextRange(rpos, max(rpos, reach)))
+
+        # Line starts from the restart line to the end of the range
+        eol = '\r' if buff.GetEOLMode() == stc.STC_EOL_CR else '\n'
+        marks = list()
+        idx = text.find(eol, rstart, tend)
+        while idx != -1:
+            marks.append(idx + 1)
+            idx = text.find(eol, idx + 1, tend)
+        lline = buff.LineFromPosition(end)
+        if line + len(marks) != lline:
+            # Mixed line endings, do not save any checkpoints
+            marks = list()
+
+        # Lexing can stop when the state matches the saved state of a line
+        # after all the text that was modified, as long as the styles up to
+        # the end position are still those of the last run.
+        dirty, valid = buff.GetContainerStyleRange()
+        converge = dirty >= 0 and end <= valid
+
+        def ToBytes(first, last):
+            if ascii:
+                return last - first
+            return len(text[first:last].encode('utf-8'))
+
+        def GetStateId(midx, pos, cstate, creach):
+            # Checkpoints of lines whose lexing looked at text past the
+            # end of the lexed text can not be restarted from.
+            if truncated and creach >= len(text):
+                return 0
+            mark = marks[midx]
+            return _GetStateId((self, ToBytes(mark, pos), cstate,
+                                ToBytes(mark, creach)))
+
+        stop = None
+        checkpoints = list() # (mark index, state id)
+        if delegating:
+            runs, points = self._LexDelegating(buff, text, lexstart, rstart,
+                                               marks, state, reach)
+            points = sorted(points.items())
+        else:
+            runner = _StateRunner(lexer, state, reach)
+            points = runner.points
+            runs = list()
+            npoints = 0
+            for idx, token, txt in runner.Tokens(text, rstart, marks):
+                if idx >= tend:
+                    break
+                elif len(points) > npoints:
+                    npoints = len(points)
+                    midx, pos, cstate, creach = points[-1]
+                    if converge and pos <= tend:
+                        lpos = rpos + ToBytes(rstart, marks[midx])
+                        sid = GetStateId(midx, pos, cstate, creach)
+                        if sid and lpos > dirty and \
+                           buff.GetLineState(line + midx + 1) == sid:
+                            stop = pos
+                            break
+                if txt:
+                    runs.append((idx, idx + len(txt),
+                                 self._GetStyle(token, txt)))
+            points = [ (point[0], point[1:]) for point in points ]
+
+        # Save the checkpoints up to where lexing stopped
+        bpos = rpos
+        last = rstart
+        for midx, (pos, cstate, creach) in points:
+            if pos > tend or (stop is not None and pos >= stop):
+                break
+            lpos = bpos + ToBytes(last, marks[midx])
+            bpos, last = lpos, marks[midx]
+            sid = GetStateId(midx, pos, cstate, creach)
+            if sid and converge and stop is None and lpos > dirty and \
+               buff.GetLineState(line + midx + 1) == sid:
+                stop = pos
+                break
+            if sid:
+                checkpoints.append((midx, sid))
+
+        # Clear the lines that had no checkpoint
+        nlines = len(marks)
+        if stop is not None:
+            nlines = bisect.bisect_right(marks, stop) - 1
+        saved = dict(checkpoints)
+        for midx in range(nlines):
+            buff.SetLineState(line + midx + 1, saved.get(midx, 0))
+
+        self._SetStyles(buff, text, rpos, rstart,
+                        tend if stop is None else stop, runs)
+        if stop is not None:
+            # The remaining styles are unchanged from the last run
+            buff.StartStyling(end, STYLE_MASK)
@@ -51,3 +51,16 @@ class ArtProviderTest(unittest.TestCase):
 
         bmp = ap.GetBitmap(str(-1), wx.ART_MENU)
         self.assertTrue(bmp.IsNull())
+
+    def testBitmapCache(self):
+        """Test that created bitmaps are cached until the theme changes"""
+        ap = ed_art.EditraArt()
+        cache = ed_art.BitmapCache()
+        bmp = ap.CreateBitmap(str(ed_glob.ID_COPY), wx.ART_MENU, (16, 16))
+        self.assertTrue(bmp.IsOk())
+        self.assertTrue(ap.CreateBitmap(str(ed_glob.ID_COPY),
+                                        wx.ART_MENU, (16, 16)) is bmp)
+
+        cache.Clear()
+        self.assertFalse(ap.CreateBitmap(str(ed_glob.ID_COPY),
+                                         wx.ART_MENU, (16, 16)) is bmp)
@@ -16,6 +16,8 @@ __revision__ = "$Revision: 61142 $"
 # Imports
 import wx
 import os
+import shutil
+import tempfile
 import unittest
 
 # Module to test
@@ -42,6 +44,33 @@ class DocMgrTest(unittest.TestCase):
         book = self.mgr.GetBook()
         self.assertTrue(book is None, "book == %s" % book)
 
+    def testBookLog(self):
+        """Test that records are appended to the book and reloaded"""
+        tdir = tempfile.mkdtemp()
+        try:
+            book = os.path.join(tdir, 'positions')
+            mgr = doctools.DocPositionMgr()
+            mgr.InitPositionCache(book)
+            mgr.AddRecord((book, 10))
+            mgr.AddRecord((book, 30))
+            mgr.WriteBook()
+
+            mgr2 = doctools.DocPositionMgr()
+            mgr2.InitPositionCache(book)
+            self.assertEqual(mgr2.GetPos(book), 30)
+        finally:
+            shutil.rmtree(tdir)
+
+    def testMaxRecords(self):
+        """Test that the least recently used records are dropped"""
+        mgr = doctools.DocPositionMgr()
+        limit = doctools.DocPositionMgr.MAX_RECORDS
+        for num in range(limit + 2):
+            mgr.AddRecord(('file%d.py' % num, num + 1))
+        self.assertEqual(mgr.GetPos('file0.py'), 0)
+        self.assertEqual(mgr.GetPos('file1.py'), 0)
+        self.assertEqual(mgr.GetPos('file2.py'), 3)
+
     def testGetPos(self):
         """Test fetching file positions from the manager."""
         self.assertEqual(self.mgr.GetPos('test2.py'), 100)
@@ -21,6 +21,10 @@ import common
 # Module to test
 import ed_glob
 import ed_basestc
+import ed_stc
+from syntax import _django
+from syntax import _mako
+from syntax import _s
 
 #-----------------------------------------------------------------------------#
 # Test Class
@@ -56,6 +60,98 @@ class EdBaseStcTest(unittest.TestCase):
                         repr((cpos, self.stc.CurrentLine))) # cursor position should be same line
         # TODO: add tests for indent
 
+    def testApplyEdits(self):
+        """Test applying a list of replacements to the buffer"""
+        text = "caf\u00e9 foo\nbar foo\n"
+        self.stc.SetText(text)
+        self.stc.MarkerAdd(1, 0)
+        edits = [(5, 8, "spam"), (13, 16, "\u00e9gg")]
+        delta = self.stc.ApplyEdits(edits)
+        self.assertEqual(self.stc.GetText(), "caf\u00e9 spam\nbar \u00e9gg\n")
+        self.assertEqual(delta, 2)
+        self.assertEqual(self.stc.MarkerNext(0, 1), 1) # marker kept
+        self.stc.Undo() # single undo action
+        self.assertEqual(self.stc.GetText(), text)
+
+    def testTrimWhitespace(self):
+        """Test finding and removing trailing whitespace"""
+        text = "caf\u00e9  \r\nbar\t\n\n  baz \t"
+        edits = ed_stc.GetTrailingWhitespace(text)
+        self.assertEqual(edits, [(4, 6, ''), (11, 12, ''), (19, 21, '')])
+        self.stc.SetText(text)
+        self.stc.ApplyEdits(edits)
+        self.assertEqual(self.stc.GetText(), "caf\u00e9\r\nbar\n\n  baz")
+        self.assertEqual(ed_stc.GetTrailingWhitespace("a\nb\n"), list())
+
+    def testContainerLexer(self):
+        """Test that incremental container lexing matches a full restyle"""
+        def GetStyles(buff):
+            buff.Colourise(0, -1)
+            return [ buff.GetStyleAt(pos) for pos in range(buff.GetLength()) ]
+
+        text = '<p class="a">{{ x }}</p>\n{% if y %}\n<b>hi</b>\n{% endif %}\n'
+        self.stc.SetText(text * 50)
+        self.stc.ConfigureLexer('django')
+        GetStyles(self.stc)
+        pos = self.stc.PositionFromLine(120)
+        self.stc.InsertText(pos, '<i class="c">{# z #}</i>\n')
+
+        fresh = ed_basestc.EditraBaseStc(self.frame)
+        fresh.SetText(self.stc.GetText())
+        fresh.ConfigureLexer('django')
+        self.assertEqual(GetStyles(self.stc), GetStyles(fresh))
+        fresh.Destroy()
+
+    def testContainerLexerSpan(self):
+        """Test closing a comment or string lines after where it starts"""
+        def GetStyles(buff):
+            buff.Colourise(0, -1)
+            return [ buff.GetStyleAt(pos) for pos in range(buff.GetLength()) ]
+
+        for lang, text, closer, module in \
+            (('django', '<p>{{ x }}</p>\n<!-- a\n', ' -->', _django),
+             ('django', '<ul>\n{# <li>a</li>\n', ' #}', _django),
+             ('mako', '<p>${ x }</p>\n<%doc>\n', '</%doc>', _mako),
+             ('s', 'x <- "a\n', '"', _s)):
+            self.stc.SetText(text + "<b>y</b>\nz <- f(1)\n" * 5)
+            self.stc.ConfigureLexer(lang)
+            GetStyles(self.stc)
+            pos = self.stc.GetLineEndPosition(5)
+            for char in closer:
+                self.stc.InsertText(pos, char)
+                pos += 1
+                fresh = ed_basestc.EditraBaseStc(self.frame)
+                fresh.SetText(self.stc.GetText())
+                fresh.ConfigureLexer(lang)
+                self.assertEqual(GetStyles(self.stc), GetStyles(fresh))
+                fresh.Destroy()
+
+            # Styles match a lex of the whole text with pygments
+            lexer = module.LEXER
+            text = self.stc.GetText()
+            styles = list()
+            for idx, token, txt in \
+                lexer.GetLexer().get_tokens_unprocessed(text):
+                styles.extend([lexer._GetStyle(token, txt)] *
+                              len(txt.encode('utf-8')))
+            self.assertEqual(GetStyles(self.stc), styles)
+
+    def testBracketIndex(self):
+        """Test finding open and matching brackets in code"""
+        self.stc.SetText("x = foo(a, '(', # (\n        [1, 2,\n")
+        self.stc.ConfigureLexer('py')
+        end = self.stc.GetLength()
+        self.assertEqual(self.stc.GetOpenBracket(end), 28)
+        self.assertEqual(self.stc.GetBracketDepth(end), 2)
+        self.assertEqual(self.stc.GetOpenBracket(28), 7)
+
+        # Index follows modifications of the buffer
+        self.stc.InsertText(end, "3])")
+        self.assertEqual(self.stc.GetOpenBracket(end + 3), -1)
+        self.assertEqual(self.stc.GetMatchingBracket(end + 1), 28)
+        self.assertEqual(self.stc.GetMatchingBracket(end + 2), 7)
+        self.assertEqual(self.stc.GetMatchingBracket(12), -1)
+
     def testGetEOLChar(self):
         """Test that correct eol character is returned"""
         fresh_stc = ed_basestc.EditraBaseStc(self.frame)
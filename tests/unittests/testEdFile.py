@@ -71,6 +71,13 @@ class EdFileTest(unittest.TestCase):
         self.assertFalse(self.file.HasBom())
         self.assertTrue(len(txt))
 
+    def testReadGenerator(self):
+        """Test reading the file in chunks"""
+        txt = self.file.Read()
+        fileobj = ed_txt.EdFile(self.file.GetPath())
+        self.assertEqual("".join(fileobj.ReadGenerator(64)), txt)
+        self.assertFalse(fileobj.GetEOLInfo() is None)
+
     def testReadNonPrintChars(self):
         """Test reading a plain text file that has a non printable
         character in it.
@@ -111,6 +118,31 @@ class EdFileTest(unittest.TestCase):
         tmp = tmp.decode('utf-8')
         self.assertEqual(txt, tmp)
 
+    def testAtomicWrite(self):
+        """Test writing a file through a temporary file"""
+        path = common.GetTempFilePath('atomic_write.txt')
+        with open(path, 'wb') as handle:
+            handle.write(b'old text')
+        os.chmod(path, 0o640)
+
+        calls = list()
+        data = b'x' * (ed_txt.WRITE_CHUNK_SIZE + 10)
+        ed_txt.AtomicWrite(path, data, lambda done, total: calls.append(done))
+        self.assertEqual(common.GetFileContents(path), data)
+        self.assertEqual(calls, [ed_txt.WRITE_CHUNK_SIZE, len(data)])
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+
+        # New files get the same mode as open gives them
+        path = common.GetTempFilePath('atomic_write_new.txt')
+        if os.path.exists(path):
+            os.remove(path)
+        ed_txt.AtomicWrite(path, b'new text')
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o666 & ~umask)
+        self.assertFalse([fname for fname in os.listdir(os.path.dirname(path))
+                          if fname.endswith('.edtmp')])
+
     def testWriteUTF16File(self):
         """Test that input and output bytes match"""
         fobj = ed_txt.EdFile(self.path_utf16)
@@ -214,3 +246,36 @@ class EdFileTest(unittest.TestCase):
         uni = ed_txt.DecodeString(test, 'utf-8')
         self.assertTrue(isinstance(uni, str), "Failed decode")
 
+
+    def testEncodingCache(self):
+        """Test caching the encoding of a file"""
+        path = common.MakeTempFile('enc_cache.txt')
+        cache = ed_txt.EncodingCache()
+        cache.Set(path, 'utf-8', True, None)
+        self.assertEqual(cache.Get(path), ('utf-8', True, None))
+
+        # Entries are invalid once the file changes
+        with open(path, 'ab') as handle:
+            handle.write(b'changed')
+        self.assertTrue(cache.Get(path) is None)
+
+    def testGuessEncodingBytes(self):
+        """Test guessing the encoding of a sample of bytes"""
+        sample = 'abc\u00e9'.encode('utf-8')
+        # A character split at the end of the sample is not an error
+        self.assertEqual(ed_txt.GuessEncodingBytes(sample[:-1]),
+                         ed_txt.GuessEncodingBytes(sample))
+        self.assertTrue(ed_txt.GuessEncodingBytes(sample) is not None)
+
+    def testEOLCounter(self):
+        """Test counting the line endings of text fed in chunks"""
+        counter = ed_txt.EOLCounter()
+        for chunk in ("one\r", "\ntwo\r\nthree\n", "four\r"):
+            counter.Feed(chunk)
+        counter.Finish()
+        self.assertEqual((counter.lf, counter.crlf, counter.cr), (1, 2, 1))
+        self.assertEqual(counter.GetFirstEOL(), '\r\n')
+        self.assertTrue(counter.IsMixed())
+
+        self.file.Read()
+        self.assertFalse(self.file.GetEOLInfo() is None)
@@ -18,6 +18,9 @@ __revision__ = "$Revision:  $"
 import unittest
 import unicodedata
 
+# Local modules
+import common
+
 # Module to test
 import ed_search
 
@@ -217,6 +220,43 @@ class EdSearchEngineTest(unittest.TestCase):
         val = search.Find()
         self.assertTrue(val is not None)
 
+    def testResultRecords(self):
+        """Test collecting structured results of an in memory search"""
+        self._def_eng.SetQuery("multiline")
+        self._def_eng.SetSearchPool(POOL2)
+        self._def_eng.SetSearchBuffer(self)
+        self._def_eng.SetResultFormatter(self._def_eng.FormatRecord)
+        model = ed_search.SearchResultModel()
+        for record in self._def_eng.FindAllLines():
+            model.AddRecord(*record)
+
+        # One file header row and a row for each matching line
+        self.assertEqual(model.GetRecordCount(), 3)
+        self.assertEqual(model.GetRowCount(), 4)
+        self.assertEqual(model.GetRow(0), (0, -1))
+        self.assertEqual(model.GetRow(2), (0, 1))
+        fname, lnum, start, end, buff = model.GetRecord(1)
+        self.assertEqual((lnum, start, end), (1, 41, 50))
+        self.assertTrue(buff() is self)
+        self.assertEqual(model.GetLineText(2), "as doing multiline replaces.")
+
+    def testSearchInFileEncoding(self):
+        """Test that files are searched and shown in their own encoding"""
+        path = common.GetTempFilePath('search_latin1.txt')
+        with open(path, 'wb') as handle:
+            handle.write("# -*- coding: latin-1 -*-\nsome caf\u00e9 text\n"
+                         .encode('latin-1'))
+        self._def_eng.SetQuery("caf\u00e9")
+        self._def_eng.SetResultFormatter(self._def_eng.FormatRecord)
+        model = ed_search.SearchResultModel()
+        for record in self._def_eng.SearchInFile(path):
+            if record[0] is not None:
+                model.AddRecord(*record)
+        self.assertEqual(model.GetRecordCount(), 1)
+        self.assertEqual(model.GetRecord(0)[1:4], (1, 5, 9))
+        self.assertEqual(model.GetLineText(0), "some caf\u00e9 text")
+        common.CleanTempDir()
+
 #-----------------------------------------------------------------------------#
 
 if __name__ == '__main__':
@@ -74,6 +74,23 @@ class EdSessionMgrTest(unittest.TestCase):
         self.assertTrue('foobar' in sessions)
         self.assertTrue('__default' in sessions)
 
+    def testSessionRecords(self):
+        """Test saving and streaming session records with buffer state"""
+        records = [dict(path='foo.py', caret=10, folds=[2, 8],
+                        encoding='utf-8', lang_id=1),
+                   'bar.py']
+        self.assertTrue(self._mgr.SaveSession('records', records))
+        loaded = list(self._mgr.IterSession('records'))
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded[0], records[0])
+        self.assertEqual(loaded[1], dict(path='bar.py'))
+
+        # Sessions in the old format are read as plain path records
+        dsession = self._mgr.DefaultSession
+        loaded = list(self._mgr.IterSession(dsession))
+        self.assertEqual(len(loaded), 8)
+        self.assertTrue(all('path' in rec for rec in loaded))
+
     def testPathFromSessionName(self):
         path = self._mgr.PathFromSessionName('foobar')
         self.assertTrue(path.endswith(self._mgr.SessionExtension))
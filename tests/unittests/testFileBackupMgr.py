@@ -38,6 +38,49 @@ class FileBackupMgrTest(unittest.TestCase):
 
     #---- Tests ----#
 
+    def testChunkedBackup(self):
+        """Test writing and restoring a chunked backup"""
+        store = ebmlib.ChunkStore(common.GetTempFilePath("chunks"))
+        data = b''.join([b"line %d\n" % num for num in range(50000)])
+        self.assertTrue(len(ebmlib.SplitChunks(data)) > 1)
+        self.assertTrue(self.bkup.WriteChunkedBackup(self.path, data, store,
+                                                     dict(encoding='utf-8')))
+        # Unchanged text writes nothing
+        self.assertFalse(self.bkup.WriteChunkedBackup(self.path, data, store,
+                                                      dict(encoding='utf-8')))
+
+        edited = data[:1000] + b"new line\n" + data[1000:]
+        self.assertTrue(self.bkup.WriteChunkedBackup(self.path, edited, store))
+        text, info = self.bkup.ReadChunkedBackup(self.path, store)
+        self.assertEqual(text, edited)
+        self.assertEqual(info, dict())
+
+        # Only the user can read the backup and its chunks
+        if wx.Platform != '__WXMSW__':
+            paths = [self.bkup.GetBackupFilename(self.path)]
+            paths.extend([os.path.join(root, fname)
+                          for root, dirs, files in os.walk(store.path)
+                          for fname in files])
+            for path in paths:
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+    def testPruneChunkStore(self):
+        """Test that pruning keeps the chunks of existing backups"""
+        store = ebmlib.ChunkStore(common.GetTempFilePath("chunks"))
+        data = b''.join([b"line %d\n" % num for num in range(50000)])
+        self.assertTrue(self.bkup.WriteChunkedBackup(self.path, data, store))
+        self.assertEqual(len(store.GetManifests()), 1)
+        store.Prune(-1)
+        self.assertEqual(self.bkup.ReadChunkedBackup(self.path, store)[0], data)
+
+        # Chunks are removed once the backup is gone
+        self.assertTrue(self.bkup.RemoveChunkedBackup(self.path, store))
+        self.assertFalse(self.bkup.RemoveChunkedBackup(self.path, store))
+        self.assertEqual(store.GetManifests(), list())
+        store.Prune(-1)
+        self.assertEqual([fname for root, dirs, files in os.walk(store.path)
+                          for fname in files], list())
+
     def testGetBackupFilename(self):
         """Test getting the backup file name"""
         fname = self.bkup.GetBackupFilename(self.path)
@@ -80,6 +80,19 @@ class FileUtilTest(unittest.TestCase):
             self.assertEqual(path, ebmlib.GetAbsPath(spath).lower(), 
                               "Missing win32api extension modules?")
 
+    def testGetDirectoryObject(self):
+        """Test getting the snapshot of a directory"""
+        ebmlib.MakeNewFolder(self.tdir, 'subdir')
+        ebmlib.MakeNewFile(self.tdir, 'file.txt')
+        ebmlib.MakeNewFile(self.tdir, '.hidden')
+        dobj = ebmlib.GetDirectoryObject(self.tdir, False, False)
+        names = dict((fobj.Name, fobj) for fobj in dobj.Files)
+        self.assertTrue('.hidden' not in names)
+        self.assertTrue(isinstance(names['subdir'], ebmlib.Directory))
+        self.assertFalse(isinstance(names['file.txt'], ebmlib.Directory))
+        self.assertEqual(names['file.txt'].ModTime,
+                         ebmlib.GetFileModTime(names['file.txt'].Path))
+
     def testGetFileExtension(self):
         """Test getting a files extension"""
         ext = ebmlib.GetFileExtension('hello.txt')
@@ -195,3 +208,16 @@ class FileUtilTest(unittest.TestCase):
             prog = 'ping'
         exe = ebmlib.Which(prog)
         self.assertNotEqual(exe, None)
+
+    def testFileStateSeeded(self):
+        """Test that a FileState given a modtime reports changes from it"""
+        mtime = ebmlib.GetFileModTime(self.fpath)
+        state = ebmlib.FileState(self.fpath)
+        self.assertEqual(state.Update(), (False, False, False))
+        state = ebmlib.FileState(self.fpath, mtime)
+        self.assertEqual(state.Update(), (False, False, False))
+        state = ebmlib.FileState(self.fpath, mtime - 10)
+        self.assertEqual(state.Update(), (True, False, False))
+        self.assertEqual(state.ModTime, mtime)
+        state = ebmlib.FileState(self.fpath + '.gone', mtime)
+        self.assertEqual(state.Update(), (False, True, False))
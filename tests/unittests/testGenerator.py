@@ -0,0 +1,128 @@
+###############################################################################
+# Name: testGenerator.py                                                      #
+# Purpose: Unit tests for the style run extraction of the generators          #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittest cases for the style run functions of the generator module"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id: $"
+__revision__ = "$Revision: $"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import unittest
+
+# Local modules
+import common
+
+# Module to test
+import generator
+
+#-----------------------------------------------------------------------------#
+
+class StyledBuffer(object):
+    """Stand in for the text control that only provides what the style
+    run functions use.
+
+    """
+    def __init__(self, text, styles, bits=8):
+        """@param text: unicode string
+        @param styles: style of each byte of the utf-8 encoded text
+
+        """
+        super(StyledBuffer, self).__init__()
+        self.data = text.encode('utf-8')
+        self.styles = bytes(styles)
+        self.bits = bits
+        assert len(self.data) == len(self.styles)
+
+    def GetLength(self):
+        return len(self.data)
+
+    def GetStyleBits(self):
+        return self.bits
+
+    def GetStyledText(self, start, end):
+        styled = bytearray()
+        for pos in range(start, end):
+            styled.append(self.data[pos])
+            styled.append(self.styles[pos])
+        return styled
+
+#-----------------------------------------------------------------------------#
+# Test Class
+
+class GeneratorTest(unittest.TestCase):
+    """Tests for the style run extraction of the generators"""
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    #---- Utility Functions ----#
+
+    def Runs(self, buff, **kwargs):
+        """Get the runs of a buffer read with each block size"""
+        runs = list(generator.IterStyleRuns(buff, **kwargs))
+        for blocksize in range(1, buff.GetLength() + 1):
+            self.assertEqual(list(generator.IterStyleRuns(buff,
+                                                          blocksize=blocksize,
+                                                          **kwargs)), runs)
+        return runs
+
+    #---- Unittests Test Cases ----#
+
+    def testSplitStyledBytes(self):
+        """Test splitting styled bytes into style runs"""
+        data = bytes(bytearray(b'a\x01b\x01 \x00c\x02'))
+        self.assertEqual(list(generator.SplitStyledBytes(data)),
+                         [(1, b'ab'), (0, b' '), (2, b'c')])
+        self.assertEqual(list(generator.SplitStyledBytes(b'')), list())
+
+        # Bits outside of the mask are ignored
+        data = bytes(bytearray(b'a\x21b\x01c\x41'))
+        self.assertEqual(list(generator.SplitStyledBytes(data, 0x1f)),
+                         [(1, b'abc')])
+        self.assertEqual(list(generator.SplitStyledBytes(data)),
+                         [(0x21, b'a'), (1, b'b'), (0x41, b'c')])
+
+    def testIterStyleRuns(self):
+        """Test iterating over the style runs of a buffer"""
+        buff = StyledBuffer("ab cd", [1, 1, 2, 2, 2])
+        self.assertEqual(self.Runs(buff), [(1, "ab"), (2, " cd")])
+        self.assertEqual(list(generator.IterStyleRuns(buff, 1, 4)),
+                         [(1, "b"), (2, " c")])
+        self.assertEqual(list(generator.IterStyleRuns(StyledBuffer("", []))),
+                         list())
+
+        # Multibyte characters split by the block boundaries
+        buff = StyledBuffer("xé€", [1, 1, 1, 3, 3, 3])
+        self.assertEqual(self.Runs(buff), [(1, "xé"), (3, "€")])
+
+        # Style bits above the buffers style bits are masked out
+        buff = StyledBuffer("abc", [0x21, 1, 2], bits=5)
+        self.assertEqual(self.Runs(buff), [(1, "ab"), (2, "c")])
+
+    def testIterStyleRunsSmooth(self):
+        """Test that single default styled positions inside of a run are
+        made part of the run.
+
+        """
+        buff = StyledBuffer("ab cd", [3, 3, 0, 3, 3])
+        self.assertEqual(self.Runs(buff, smooth=True), [(3, "ab cd")])
+        self.assertEqual(self.Runs(buff),
+                         [(3, "ab"), (0, " "), (3, "cd")])
+
+        # Only a single position and only between runs of the same style
+        buff = StyledBuffer("ab  cd e", [3, 3, 0, 0, 3, 3, 0, 4])
+        self.assertEqual(self.Runs(buff, smooth=True),
+                         [(3, "ab"), (0, "  "), (3, "cd"), (0, " "),
+                          (4, "e")])
+        buff = StyledBuffer(" ab ", [0, 3, 3, 0])
+        self.assertEqual(self.Runs(buff, smooth=True),
+                         [(0, " "), (3, "ab"), (0, " ")])
@@ -0,0 +1,78 @@
+###############################################################################
+# Name: testKeyBinder.py                                                      #
+# Purpose: Unit tests for the menu key binding registry                       #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittest cases for testing ed_menu.KeyBinder"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id: $"
+__revision__ = "$Revision: $"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import unittest
+
+# Local modules
+import common
+
+# Module to test
+import ed_glob
+import ed_menu
+
+#-----------------------------------------------------------------------------#
+# Test Class
+
+class KeyBinderTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ed_glob.CONFIG['CACHE_DIR']
+        ed_glob.CONFIG['CACHE_DIR'] = common.GetTempDir()
+        self.binder = ed_menu.KeyBinder()
+        self.binder.LoadDefaults()
+
+    def tearDown(self):
+        ed_glob.CONFIG['CACHE_DIR'] = self.cache
+        self.binder.LoadDefaults()
+        common.CleanTempDir()
+
+    #---- Test Cases ----#
+
+    def testFindMenuId(self):
+        """Test looking up the item that keys are bound to"""
+        self.assertEqual(self.binder.FindMenuId(('Ctrl', 'S')), ed_glob.ID_SAVE)
+        self.assertEqual(self.binder.FindMenuId(('ctrl', 's')), ed_glob.ID_SAVE)
+        self.assertEqual(self.binder.FindMenuId(('Shift', 'Ctrl', 'S')),
+                         ed_glob.ID_SAVEAS)
+        self.assertEqual(self.binder.FindMenuId(('Ctrl', 'Alt', 'F12')), -1)
+
+    def testSetBinding(self):
+        """Test that rebinding keys updates the index"""
+        self.binder.SetBinding(ed_glob.ID_SAVEAS, 'Ctrl+S')
+        self.assertEqual(self.binder.FindMenuId(('Ctrl', 'S')),
+                         ed_glob.ID_SAVEAS)
+        self.assertTrue(self.binder.GetRawBinding(ed_glob.ID_SAVE) is None)
+        self.assertEqual(self.binder.FindMenuId(('Ctrl', 'Shift', 'S')), -1)
+
+        self.binder.SetBinding(ed_glob.ID_SAVEAS, '')
+        self.assertEqual(self.binder.FindMenuId(('Ctrl', 'S')), -1)
+
+    def testLoadKeyProfileFile(self):
+        """Test loading a key profile from its text and compiled forms"""
+        path = common.GetTempFilePath('test.ekeys')
+        with open(path, 'w') as handle:
+            handle.write("ID_SAVE=Ctrl+K\nID_OPEN=Ctrl+K\nID_CUT=Alt+X\n")
+
+        # Second load is from the compiled profile
+        for attempt in range(2):
+            self.binder.LoadKeyProfileFile(path)
+            self.assertEqual(self.binder.GetCurrentProfile(), 'test')
+            self.assertEqual(self.binder.GetCurrentProfileDict(),
+                             {ed_glob.ID_OPEN: ('Ctrl', 'K'),
+                              ed_glob.ID_CUT: ('Alt', 'X')})
+            self.assertEqual(self.binder.FindMenuId(('Ctrl', 'K')),
+                             ed_glob.ID_OPEN)
+            self.assertTrue(os.path.exists(ed_menu._GetCompiledPath(path)))
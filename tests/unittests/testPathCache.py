@@ -0,0 +1,55 @@
+###############################################################################
+# Name: testPathCache.py                                                      #
+# Purpose: Unit tests for the command bar path completion cache               #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittest cases for testing ed_cmdbar.PathCache"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id: $"
+__revision__ = "$Revision: $"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import unittest
+
+# Local modules
+import common
+
+# Module to test
+import ed_cmdbar
+
+#-----------------------------------------------------------------------------#
+# Test Class
+
+class PathCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ed_cmdbar.PathCache()
+        self.path = common.GetTempDir()
+        os.mkdir(os.path.join(self.path, 'subdir'))
+        common.MakeTempFile('file.txt')
+
+    def tearDown(self):
+        self.cache.Invalidate(self.path)
+        common.CleanTempDir()
+
+    def testGetListing(self):
+        """Test getting directory listings from the cache"""
+        listing = self.cache.GetListing(self.path)
+        self.assertTrue(('subdir', True) in listing)
+        self.assertTrue(('file.txt', False) in listing)
+
+        # Listing is reused until the directory is invalidated
+        self.assertTrue(self.cache.GetCachedListing(self.path) is listing)
+        self.assertTrue(self.cache.GetListing(self.path) is listing)
+        self.cache.Invalidate(self.path)
+        self.assertTrue(self.cache.GetCachedListing(self.path) is None)
+        self.assertFalse(self.cache.GetListing(self.path) is listing)
+
+        # Missing directories raise an error
+        self.assertRaises(OSError, self.cache.GetListing,
+                          os.path.join(self.path, 'missing'))
@@ -217,6 +217,18 @@ class SearchEngineTest(unittest.TestCase):
         val = search.Find()
         self.assertTrue(val is not None)
 
+    def testReplaceAll(self):
+        """Test replacing all matches in a string"""
+        self._def_eng.SetQuery("test")
+        text, count = self._def_eng.ReplaceAll(POOL2, "check")
+        self.assertEqual(count, 1)
+        self.assertTrue(text.startswith("Multiline check pool"))
+
+        self._regex_eng.SetQuery(r"doing (\w+)")
+        text, count = self._regex_eng.ReplaceAll(POOL2, r"\1 doing")
+        self.assertEqual(count, 2)
+        self.assertTrue("for multiline doing searches" in text)
+
 #-----------------------------------------------------------------------------#
 
 if __name__ == '__main__':
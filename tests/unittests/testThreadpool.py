@@ -60,3 +60,40 @@ class ThreadpoolTest(unittest.TestCase):
         maxwait = sum([j[0] for j in jobs])
         time.sleep(maxwait) # wait for the jobs to finish
         self.assertTrue(len(jobs) == len(self._completed), repr(self._completed))
+
+    def testJobResult(self):
+        """Test getting the result and errors of a job"""
+        future = self.pool.QueueJob(lambda x: x * 2, 21)
+        self.assertEqual(future.GetResult(5), 42)
+        self.assertTrue(future.IsDone())
+
+        def fail():
+            raise ValueError("failed")
+        future = self.pool.QueueJob(fail)
+        self.assertRaises(ValueError, future.GetResult, 5)
+        self.assertTrue(isinstance(future.GetError(), ValueError))
+
+    def testPriority(self):
+        """Test that interactive jobs are not held up by background jobs"""
+        for idx in range(self._threads * 2):
+            self.pool.SubmitJob(ebmlib.PRIORITY_BACKGROUND, doWork, 0.5,
+                                idx, self.notifyDone)
+        future = self.pool.SubmitJob(ebmlib.PRIORITY_INTERACTIVE, doWork, 0,
+                                     'interactive', self.notifyDone)
+        future.GetResult(5)
+        self.assertEqual(self._completed, ['interactive'])
+
+    def testCancelJob(self):
+        """Test cancelling a queued job"""
+        for idx in range(self._threads):
+            self.pool.SubmitJob(ebmlib.PRIORITY_INTERACTIVE, doWork, 0.5,
+                                idx, self.notifyDone)
+        future = self.pool.QueueJob(doWork, 0, 'cancelled', self.notifyDone)
+        self.assertTrue(future.Cancel())
+        # Finished and out of the queue without waiting for a thread
+        self.assertTrue(future.IsDone())
+        self.assertEqual(self.pool.GetQueueDepth(ebmlib.PRIORITY_LOAD), 0)
+        self.assertRaises(ebmlib.JobCancelledError, future.GetResult, 0)
+        self.pool.Shutdown()
+        self.assertFalse('cancelled' in self._completed)
+        self.assertEqual(self.pool.GetStats()['jobs'][ebmlib.PRIORITY_LOAD]['cancelled'], 1)
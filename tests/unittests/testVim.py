@@ -0,0 +1,73 @@
+###############################################################################
+# Name: testVim.py                                                            #
+# Purpose: Unit tests for the vi emulation                                    #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittest cases for testing ed_vim"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id: $"
+__revision__ = "$Revision: $"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import unittest
+
+# Local modules
+import common
+
+# Module to test
+import ed_glob
+import ed_keyh
+import ed_stc
+import ed_vim
+
+#-----------------------------------------------------------------------------#
+# Test Class
+
+class VimTest(unittest.TestCase):
+    def setUp(self):
+        ed_glob.CONFIG['STYLES_DIR'] = common.GetStylesDir()
+        self.frame = common.TestFrame(None)
+        self.stc = ed_stc.EditraStc(self.frame)
+        self.stc.SetText("\n".join([ "line %d" % num for num in range(20) ]))
+        self.handler = ed_keyh.ViKeyHandler(self.stc, use_normal_default=True)
+
+    def tearDown(self):
+        self.frame.Destroy()
+
+    def _Keys(self, keys):
+        """Replay a sequence of keystrokes"""
+        for key in keys:
+            self.handler.ProcessKey(ord(key))
+
+    #---- Test Cases ----#
+
+    def testGetHandler(self):
+        """Test that the dispatch table matches the handler order"""
+        for handler in ed_vim.HANDLERS:
+            for char in handler.start_chars:
+                first = [ h for h in ed_vim.HANDLERS if char in h.start_chars ]
+                self.assertTrue(ed_vim.GetHandler(char) is first[0])
+        self.assertTrue(ed_vim.GetHandler('12') is None)
+        self.assertTrue(ed_vim.GetHandler('w', ed_vim.MOTION_HANDLERS) \
+                        is ed_vim.Words)
+        self.assertTrue(ed_vim.GetHandler('d', ed_vim.MOTION_HANDLERS) is None)
+
+    def testCountedCommands(self):
+        """Test counted motions and edits"""
+        self._Keys("5j")
+        self.assertEqual(self.stc.GetCurrentLine(), 5)
+        self._Keys("2k")
+        self.assertEqual(self.stc.GetCurrentLine(), 3)
+        self._Keys("100j")
+        self.assertEqual(self.stc.GetCurrentLine(), 19)
+        self._Keys("gg3dd")
+        self.assertEqual(self.stc.GetLineCount(), 17)
+        self.assertEqual(self.stc.GetLine(0), "line 3\n")
+        self._Keys(".")
+        self.assertEqual(self.stc.GetLineCount(), 14)
+        self.assertEqual(self.stc.GetLine(0), "line 6\n")